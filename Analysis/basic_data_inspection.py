@@ -3,6 +3,8 @@
 from abc import ABC, abstractmethod
 import pandas as pd
 
+from source.data_profiler import get_data_profiler
+
 # defining abstract class for implementing  multiple  strategies with using  strategy pattern
 
 class DataInspectionStrategy(ABC):
@@ -15,18 +17,27 @@ class DataInspectionStrategy(ABC):
 #type of strategies
 
 class DatatypesInspectionStrategy(DataInspectionStrategy):
-    def inspect(self, df: pd.DataFrame):
+    def inspect(self, df: pd.DataFrame) -> pd.DataFrame:
+        # from the shared profile, inspecting the same (or appended) data again is a cache lookup
+        info = get_data_profiler().profile(df).info()
         print("\n data types and non-null counts")
-        print(df.info())
+        print(info)
+        return info
 
 
 class SummaryStatisticsInspection(DataInspectionStrategy):
     def inspect(self, df: pd.DataFrame):
+        """(numerical, categorical) summaries, quantiles are exact unless the profile was extended by appended rows"""
+        profile = get_data_profiler().profile(df)
+        numerical = profile.describe()
+        categorical = profile.describe_categorical()
+
         print("\n summary statistics - numerical columns")
-        print(df.describe())
+        print(numerical)
         
         print("\n summary statistics - categorical columns")
-        print(df.describe(include=['object']))
+        print(categorical)
+        return numerical, categorical
 
 
 class DataInspector:
@@ -37,4 +48,4 @@ class DataInspector:
         self.strategy = strategy
 
     def execute_strategy(self, df:pd.DataFrame):
-        self.strategy.inspect(df)                
+        return self.strategy.inspect(df)                
@@ -3,6 +3,10 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+from Analysis.large_data_plots import (
+    ReservoirSampler, box_stats, draw_hexbin, draw_histogram2d, hexbin_counts, histogram2d, new_figure, save_figure,
+)
+
 class BivariateAnalysis(ABC):
     def analyze(self, df: pd.DataFrame, feature1: str, feature2: str):
         pass
@@ -34,6 +38,62 @@ class CategoricalVsNumericalBivariateAnalysis(BivariateAnalysis):
         plt.show()
 
 
+class LargeNumericalVsNumericalBivariateAnalysis(BivariateAnalysis):
+    """
+    density of two numerical features saved to a file - kind "hist2d" or
+    "hexbin" counts every row into bins in numpy, "scatter" draws a
+    reservoir sample of sample_size rows
+    """
+
+    def __init__(self, kind: str = "hist2d", bins: int = 100, gridsize: int = 50, sample_size: int = 5_000,
+                 output_dir: str = "plots"):
+        if kind not in ("hist2d", "hexbin", "scatter"):
+            raise ValueError(f"unknown kind {kind}, expected hist2d, hexbin or scatter")
+        self.kind = kind
+        self.bins = bins
+        self.gridsize = gridsize
+        self.sample_size = sample_size
+        self.output_dir = output_dir
+
+    def analyze(self, df: pd.DataFrame, feature1: str, feature2: str) -> str:
+        fig = new_figure()
+        ax = fig.subplots()
+
+        if self.kind == "scatter":
+            sample = ReservoirSampler(self.sample_size).update(df[[feature1, feature2]]).sample
+            ax.scatter(sample[feature1], sample[feature2], s=4, alpha=0.5)
+            ax.set_title(f"Bivariate analysis between {feature1} vs {feature2} ({len(sample)} sampled rows)")
+        else:
+            if self.kind == "hexbin":
+                mappable = draw_hexbin(ax, *hexbin_counts(df[feature1], df[feature2], self.gridsize))
+            else:
+                mappable = draw_histogram2d(ax, *histogram2d(df[feature1], df[feature2], self.bins))
+            fig.colorbar(mappable, ax=ax, label="rows")
+            ax.set_title(f"Bivariate analysis between {feature1} vs {feature2}")
+
+        ax.set_xlabel(feature1)
+        ax.set_ylabel(feature2)
+        return save_figure(fig, self.output_dir, f"{self.kind}_{feature1}_vs_{feature2}")
+
+
+class LargeCategoricalVsNumericalBivariateAnalysis(BivariateAnalysis):
+    """box plots drawn from per category groupby quartiles and whiskers instead of the raw values, saved to a file"""
+
+    def __init__(self, max_categories: int = 30, output_dir: str = "plots"):
+        self.max_categories = max_categories
+        self.output_dir = output_dir
+
+    def analyze(self, df: pd.DataFrame, feature1: str, feature2: str) -> str:
+        fig = new_figure()
+        ax = fig.subplots()
+        ax.bxp(box_stats(df, feature1, feature2, self.max_categories), showfliers=False)
+        ax.set_title(f"Bivariate analysis between {feature1} vs {feature2}")
+        ax.set_xlabel(feature1)
+        ax.set_ylabel(feature2)
+        ax.tick_params(axis="x", labelrotation=45)
+        return save_figure(fig, self.output_dir, f"box_{feature1}_vs_{feature2}")
+
+
 
 class BivariateAnalyzer:
     def __init__(self,strategy):
@@ -43,4 +103,4 @@ class BivariateAnalyzer:
         self.strategy = strategy
 
     def execute_strategy(self, df: pd.DataFrame , feature1:str, feature2:str):
-        self.strategy.analyze(df,feature1,feature2)            
\ No newline at end of file
+        return self.strategy.analyze(df,feature1,feature2)            
\ No newline at end of file
@@ -0,0 +1,187 @@
+"""
+numpy aggregates for plotting data too large to draw point by point
+
+everything is reduced to a fixed size (bins, hexagons, a sample, row blocks)
+before matplotlib sees it, so drawing costs the same for a thousand rows or
+a hundred million. figures are bare matplotlib Figures saved through the agg
+canvas, pyplot and the notebook backend are never touched
+"""
+import math
+import os
+import re
+
+import numpy as np
+import pandas as pd
+from matplotlib.collections import PolyCollection
+from matplotlib.colors import LogNorm
+from matplotlib.figure import Figure
+
+
+def new_figure(figsize=(12, 8), **kwargs) -> Figure:
+    # not registered with pyplot, nothing is shown and nothing has to be closed
+    kwargs.setdefault("layout", "constrained")
+    return Figure(figsize=figsize, **kwargs)
+
+
+def save_figure(fig: Figure, output_dir: str, name: str, dpi: int = 100) -> str:
+    os.makedirs(output_dir, exist_ok=True)
+    slug = re.sub(r"[^a-z0-9.-]+", "_", name.lower()).strip("_")
+    path = os.path.join(output_dir, f"{slug}.png")
+    fig.savefig(path, dpi=dpi, bbox_inches="tight")
+    return path
+
+
+def _finite(*columns):
+    """the columns as float arrays, restricted to the rows where all of them are finite"""
+    arrays = [np.asarray(column, dtype=np.float64) for column in columns]
+    keep = np.logical_and.reduce([np.isfinite(array) for array in arrays])
+    return [array[keep] for array in arrays]
+
+
+def histogram(values, bins: int = 50):
+    """(counts, edges) over the finite values"""
+    (values,) = _finite(values)
+    return np.histogram(values, bins=bins)
+
+
+def histogram2d(x, y, bins: int = 100):
+    """(counts, x_edges, y_edges) over the rows where both are finite, counts[i, j] is x bin i, y bin j"""
+    x, y = _finite(x, y)
+    return np.histogram2d(x, y, bins=bins)
+
+
+def hexbin_counts(x, y, gridsize: int = 50):
+    """
+    (centres, counts, (sx, sy)) of the non empty hexagons, the binning
+    matplotlib's hexbin does (two offset rectangular lattices, nearest
+    centre wins), sx and sy are the lattice spacings
+    """
+    x, y = _finite(x, y)
+    nx, ny = gridsize, max(int(gridsize / math.sqrt(3)), 1)
+    if len(x) == 0:
+        return np.empty((0, 2)), np.empty(0), (1.0, 1.0)
+    xmin, xmax = x.min(), x.max()
+    ymin, ymax = y.min(), y.max()
+    sx = (xmax - xmin) / nx or 1.0
+    sy = (ymax - ymin) / ny or 1.0
+
+    ix, iy = (x - xmin) / sx, (y - ymin) / sy
+    ix1, iy1 = np.round(ix), np.round(iy)
+    ix2, iy2 = np.floor(ix), np.floor(iy)
+    on_first = (ix - ix1) ** 2 + 3.0 * (iy - iy1) ** 2 < (ix - ix2 - 0.5) ** 2 + 3.0 * (iy - iy2 - 0.5) ** 2
+
+    # first lattice has (nx + 1) x (ny + 1) centres on the grid points, the second nx x ny in the cell middles
+    first = np.bincount((ix1 * (ny + 1) + iy1)[on_first].astype(np.int64), minlength=(nx + 1) * (ny + 1))
+    second = np.bincount((ix2 * ny + iy2)[~on_first].astype(np.int64), minlength=(nx + 1) * ny)
+    i1, j1 = np.divmod(np.arange(len(first)), ny + 1)
+    i2, j2 = np.divmod(np.arange(len(second)), ny)
+
+    centres = np.concatenate([
+        np.column_stack([xmin + i1 * sx, ymin + j1 * sy]),
+        np.column_stack([xmin + (i2 + 0.5) * sx, ymin + (j2 + 0.5) * sy]),
+    ])
+    counts = np.concatenate([first, second]).astype(np.float64)
+    keep = counts > 0
+    return centres[keep], counts[keep], (sx, sy)
+
+
+def draw_hexbin(ax, centres, counts, spacing):
+    """draw hexbin_counts output, one polygon per non empty hexagon"""
+    sx, sy = spacing
+    hexagon = np.array([[0.5, -0.5], [0.5, 0.5], [0.0, 1.0], [-0.5, 0.5], [-0.5, -0.5], [0.0, -1.0]]) * [sx, sy / 3]
+    collection = PolyCollection(centres[:, None, :] + hexagon, norm=LogNorm(), cmap="viridis")
+    collection.set_array(counts)
+    ax.add_collection(collection)
+    ax.autoscale_view()
+    return collection
+
+
+def draw_histogram2d(ax, counts, x_edges, y_edges):
+    """counts on a log colour scale, empty cells left blank"""
+    masked = np.ma.masked_equal(counts.T, 0)
+    return ax.pcolormesh(x_edges, y_edges, masked, norm=LogNorm(), cmap="viridis")
+
+
+class ReservoirSampler:
+    """
+    a uniform sample of at most size rows from everything passed to update
+
+    every row gets a random key and the rows with the size smallest keys are
+    kept, which draws the same distribution as reservoir sampling but a whole
+    chunk at a time. memory stays at size rows however many chunks come in
+    """
+
+    def __init__(self, size: int = 5_000, seed: int = 0):
+        self.size = size
+        self.rng = np.random.default_rng(seed)
+        self.keys = np.empty(0)
+        self.rows = None
+
+    def update(self, chunk: pd.DataFrame) -> "ReservoirSampler":
+        keys = self.rng.random(len(chunk))
+        if self.rows is not None and len(self.keys) == self.size:
+            # only rows beating the current largest kept key can get in
+            candidates = keys < self.keys.max()
+            chunk, keys = chunk[candidates], keys[candidates]
+
+        rows = chunk if self.rows is None else pd.concat([self.rows, chunk])
+        keys = np.concatenate([self.keys, keys])
+        if len(keys) > self.size:
+            keep = np.argpartition(keys, self.size - 1)[: self.size]
+            rows, keys = rows.iloc[keep], keys[keep]
+        self.rows, self.keys = rows, keys
+        return self
+
+    @property
+    def sample(self) -> pd.DataFrame:
+        return self.rows if self.rows is not None else pd.DataFrame()
+
+
+def missing_blocks(df: pd.DataFrame, n_blocks: int = 200):
+    """
+    (fractions, block_starts), the share of missing values of every column
+    in n_blocks contiguous row blocks, a n_blocks x columns summary of where
+    the gaps are instead of one cell per value
+    """
+    starts = np.unique(np.linspace(0, len(df), min(n_blocks, max(len(df), 1)), endpoint=False).astype(np.int64))
+    if len(df) == 0:
+        return np.zeros((0, df.shape[1])), starts
+    mask = df.isna().to_numpy()
+    sizes = np.diff(np.append(starts, len(df)))
+    return np.add.reduceat(mask, starts, axis=0) / sizes[:, None], starts
+
+
+def box_stats(df: pd.DataFrame, category: str, value: str, max_categories: int = 30) -> list:
+    """
+    per category box plot statistics for Axes.bxp - quartiles, median and
+    whiskers at the most extreme values within 1.5 IQR - from groupby
+    aggregates, outliers are not drawn. the max_categories most frequent
+    categories are kept
+    """
+    data = df[[category, value]].dropna()
+    top = data[category].value_counts().index[:max_categories]
+    data = data[data[category].isin(top)]
+    grouped = data.groupby(category, observed=True)[value]
+
+    quartiles = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+    iqr = quartiles[0.75] - quartiles[0.25]
+    lower = data[category].map(quartiles[0.25] - 1.5 * iqr).astype(np.float64)
+    upper = data[category].map(quartiles[0.75] + 1.5 * iqr).astype(np.float64)
+    values = data[value].astype(np.float64)
+    low_whisker = values.where(values >= lower).groupby(data[category], observed=True).min()
+    high_whisker = values.where(values <= upper).groupby(data[category], observed=True).max()
+    counts = grouped.size()
+
+    return [
+        {
+            "label": str(name),
+            "q1": quartiles.loc[name, 0.25],
+            "med": quartiles.loc[name, 0.5],
+            "q3": quartiles.loc[name, 0.75],
+            "whislo": low_whisker.loc[name],
+            "whishi": high_whisker.loc[name],
+            "fliers": [],
+            "n": int(counts.loc[name]),
+        }
+        for name in quartiles.index
+    ]
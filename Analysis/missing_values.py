@@ -1,13 +1,18 @@
 from abc import ABC, abstractmethod
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+from Analysis.large_data_plots import missing_blocks, new_figure, save_figure
+from source.data_profiler import get_data_profiler
+
 
 class MissingValuesInspection(ABC):
     def analyze(self, df:pd.DataFrame):
-        self.identify_missing_values(df)
+        missing_values = self.identify_missing_values(df)
         self.visualize_missing_values(df)
+        return missing_values
 
 
     @abstractmethod
@@ -23,17 +28,48 @@ class SimpleMissingValues(MissingValuesInspection):
     def identify_missing_values(self, df):
         print("\n missing values ")
 
-        missing_values = df.isnull().sum()
+        missing_values = get_data_profiler().profile(df).missing()
 
-        print(missing_values[missing_values>0])
+        print(missing_values)
+        return missing_values
 
 
     def visualize_missing_values(self, df):
         print("\n visualizing missing values")
 
         plt.figure(figsize=(10,5))
-        sns.heatmap(df.isnull(), cmap='viridis',cbar=False,annot=True)
+        # no annot, one text label per value is what made this hang
+        sns.heatmap(df.isnull(), cmap='viridis',cbar=False)
         plt.title("missing values heatmap")
         plt.show()
-        
-                        
\ No newline at end of file
+
+
+class LargeMissingValues(SimpleMissingValues):
+    """
+    missingness of the columns with gaps as a row block x column heatmap of
+    missing fractions (missing_blocks) instead of one cell per value, saved
+    to a file
+    """
+
+    def __init__(self, n_blocks: int = 200, output_dir: str = "plots"):
+        self.n_blocks = n_blocks
+        self.output_dir = output_dir
+
+    def visualize_missing_values(self, df):
+        columns = list(get_data_profiler().profile(df).missing().index)
+        if not columns:
+            print("\n no missing values to visualize")
+            return None
+
+        fractions, starts = missing_blocks(df[columns], self.n_blocks)
+        fig = new_figure(figsize=(max(10, 0.3 * len(columns)), 6))
+        ax = fig.subplots()
+        image = ax.imshow(fractions, aspect="auto", cmap="viridis", vmin=0, vmax=1, interpolation="nearest")
+        fig.colorbar(image, ax=ax, label="missing fraction")
+        ax.set_xticks(range(len(columns)), columns, rotation=90)
+        ticks = np.linspace(0, len(starts) - 1, min(len(starts), 10)).astype(int)
+        ax.set_yticks(ticks, starts[ticks])
+        ax.set_ylabel("first row of block")
+        ax.set_title("missing values by row block")
+        return save_figure(fig, self.output_dir, "missing_values")
+
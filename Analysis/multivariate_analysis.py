@@ -1,17 +1,23 @@
+import warnings
 from abc import ABC , abstractmethod
 
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+from Analysis.large_data_plots import draw_histogram2d, histogram, histogram2d, new_figure, save_figure
+from source.data_profiler import get_data_profiler
+
 
 class MultivariateAnalysis(ABC):
 
     def analyze(self,df:pd.DataFrame):
         
 
-        self.generate_correlation_heatmap(df)
-        self.generate_pairplot(df)
+        heatmap = self.generate_correlation_heatmap(df)
+        pairplot = self.generate_pairplot(df)
+        return heatmap, pairplot
 
     @abstractmethod
     def generate_correlation_heatmap(self,df:pd.DataFrame):
@@ -25,17 +31,81 @@ class MultivariateAnalysis(ABC):
 class SimpleMultiveriateAnalysis(MultivariateAnalysis):
     def generate_correlation_heatmap(self, df):
 
+        # pairwise complete like df.corr(), kept up to date incrementally by the shared profiler
+        correlation = get_data_profiler().profile(df).correlation()
+
         plt.figure(figsize=(12,8))
-        sns.heatmap(df.corr(), annot=True, fmt=".2f", cmap="viridis")
+        sns.heatmap(correlation, annot=True, fmt=".2f", cmap="viridis")
         plt.title("correlation heatmap")
         plt.show()
 
 
     def generate_pairplot(self,df):
 
-        plt.figure(figsize=(12,8))
-        sns.pairplot(df)
-        plt.subtitle("pair plot of selected figures",y=1.02)
-        plt.show()     
+        # pairplot makes its own figure, the title goes on that one
+        grid = sns.pairplot(df)
+        grid.figure.suptitle("pair plot of selected figures",y=1.02)
+        plt.show()
+
+
+class LargeMultivariateAnalysis(MultivariateAnalysis):
+    """
+    correlation heatmap from the shared profile and a pair plot of numpy
+    binned histograms (1d on the diagonal, 2d elsewhere), both saved to files
+
+    the pair plot grows with the square of the column count, it draws the
+    given columns or the first max_columns numeric ones
+    """
+
+    def __init__(self, bins: int = 50, output_dir: str = "plots", max_columns: int = 8, columns: list = None):
+        self.bins = bins
+        self.output_dir = output_dir
+        self.max_columns = max_columns
+        self.columns = columns
+
+    def generate_correlation_heatmap(self, df: pd.DataFrame) -> str:
+        correlation = get_data_profiler().profile(df).correlation()
+        columns = list(correlation.columns)
+
+        fig = new_figure()
+        ax = fig.subplots()
+        image = ax.imshow(correlation.to_numpy(), cmap="viridis", vmin=-1, vmax=1)
+        fig.colorbar(image, ax=ax)
+        ax.set_xticks(range(len(columns)), columns, rotation=90)
+        ax.set_yticks(range(len(columns)), columns)
+        if len(columns) <= 20:
+            # annotations are unreadable past that anyway
+            for (i, j), value in np.ndenumerate(correlation.to_numpy()):
+                ax.text(j, i, f"{value:.2f}", ha="center", va="center", fontsize=8)
+        ax.set_title("correlation heatmap")
+        return save_figure(fig, self.output_dir, "correlation_heatmap")
+
+    def generate_pairplot(self, df: pd.DataFrame) -> str:
+        columns = self.columns or list(df.select_dtypes(include="number").columns)
+        if len(columns) > self.max_columns:
+            warnings.warn(
+                f"pair plot limited to {self.max_columns} of {len(columns)} columns, dropped {columns[self.max_columns:]}. "
+                "pass columns to choose them or raise max_columns"
+            )
+            columns = columns[:self.max_columns]
+        k = len(columns)
+
+        fig = new_figure(figsize=(2.5 * k, 2.5 * k))
+        axes = fig.subplots(k, k, squeeze=False)
+        for i, row in enumerate(columns):
+            for j, column in enumerate(columns):
+                ax = axes[i, j]
+                if i == j:
+                    counts, edges = histogram(df[column], self.bins)
+                    ax.stairs(counts, edges, fill=True)
+                else:
+                    draw_histogram2d(ax, *histogram2d(df[column], df[row], self.bins))
+                ax.tick_params(axis="x", labelrotation=45)
+                if i == k - 1:
+                    ax.set_xlabel(column)
+                if j == 0:
+                    ax.set_ylabel(row)
+        fig.suptitle("pair plot of selected figures")
+        return save_figure(fig, self.output_dir, "pair_plot")     
 
 
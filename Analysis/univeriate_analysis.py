@@ -3,6 +3,8 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+from Analysis.large_data_plots import histogram, new_figure, save_figure
+
 
 class UniveriateAnalysis(ABC):
     @abstractmethod
@@ -34,6 +36,45 @@ class CategoricalUniveriateAnalysis(UniveriateAnalysis):
         plt.show()
 
 
+class LargeNumericalUniveriateAnalysis(UniveriateAnalysis):
+    """histogram binned in numpy and saved to a file, histplot's kde does not scale to millions of rows"""
+
+    def __init__(self, bins: int = 50, output_dir: str = "plots"):
+        self.bins = bins
+        self.output_dir = output_dir
+
+    def analyze(self, df: pd.DataFrame, feature: str) -> str:
+        counts, edges = histogram(df[feature], self.bins)
+
+        fig = new_figure()
+        ax = fig.subplots()
+        ax.stairs(counts, edges, fill=True)
+        ax.set_title(f"Distribution of {feature}:")
+        ax.set_xlabel(feature)
+        ax.set_ylabel("frequency")
+        return save_figure(fig, self.output_dir, f"distribution_{feature}")
+
+
+class LargeCategoricalUniveriateAnalysis(UniveriateAnalysis):
+    """bar chart of the top_n most frequent categories from value_counts, saved to a file"""
+
+    def __init__(self, top_n: int = 30, output_dir: str = "plots"):
+        self.top_n = top_n
+        self.output_dir = output_dir
+
+    def analyze(self, df: pd.DataFrame, feature: str) -> str:
+        counts = df[feature].value_counts().head(self.top_n)
+
+        fig = new_figure()
+        ax = fig.subplots()
+        ax.bar(counts.index.astype(str), counts.to_numpy())
+        ax.set_title(f"Distribution of {feature}:")
+        ax.set_xlabel(feature)
+        ax.set_ylabel("count")
+        ax.tick_params(axis="x", labelrotation=45)
+        return save_figure(fig, self.output_dir, f"distribution_{feature}")
+
+
 class UniveriateAnalyzer:
     def __init__(self, strategy: UniveriateAnalysis):
         self.strategy = strategy
@@ -42,4 +83,4 @@ class UniveriateAnalyzer:
         self.strategy = strategy
 
     def execute_strategy(self, df: pd.DataFrame , feature: str):
-        self.strategy.analyze(df, feature)                
+        return self.strategy.analyze(df, feature)                
@@ -0,0 +1,78 @@
+"""
+time request decoding on its own: the json -> DataFrame -> numpy path the
+predictor step used against InputSchema for json split/records, .npy and arrow
+
+run from the repo root:
+    python -m benchmarks.bench_decoding --batch-sizes 1 100 10000
+"""
+import argparse
+import io
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from source.request_decoding import InputSchema
+
+
+def legacy_decode(body: str, columns: list) -> np.ndarray:
+    # the decoding the predictor step did before the compiled schema
+    data = json.loads(body)
+    data.pop("columns", None)
+    data.pop("index", None)
+    df = pd.DataFrame(data["data"], columns=columns)
+    return df.to_numpy()
+
+
+def best_of(func, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default="Data/AmesHousing.csv")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 100, 10_000])
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.data).select_dtypes(include="number").drop(columns=["SalePrice"])
+    schema = InputSchema(list(df.columns))
+
+    print(f"{'batch':>8} {'legacy ms':>10} {'split ms':>9} {'records ms':>11} {'npy ms':>8} {'arrow ms':>9}")
+    for batch_size in args.batch_sizes:
+        batch = df.sample(n=batch_size, replace=True, random_state=0).reset_index(drop=True)
+        split_body = batch.to_json(orient="split", index=False)
+        records_body = json.dumps({"dataframe_records": json.loads(batch.to_json(orient="records"))})
+        buffer = io.BytesIO()
+        np.save(buffer, batch.to_numpy(dtype=np.float64))
+        npy_body = buffer.getvalue()
+
+        try:
+            import pyarrow as pa
+
+            sink = pa.BufferOutputStream()
+            table = pa.Table.from_pandas(batch, preserve_index=False)
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            arrow_body = sink.getvalue().to_pybytes()
+            arrow = f"{best_of(lambda: schema.decode_arrow(arrow_body), args.repeats) * 1e3:>9.3f}"
+        except ImportError:
+            arrow = f"{'-':>9}"
+
+        legacy = best_of(lambda: legacy_decode(split_body, schema.columns), args.repeats)
+        split = best_of(lambda: schema.decode_json(split_body), args.repeats)
+        records = best_of(lambda: schema.decode_json(records_body), args.repeats)
+        npy = best_of(lambda: schema.decode_npy(npy_body), args.repeats)
+        assert np.allclose(schema.decode_json(split_body), legacy_decode(split_body, schema.columns), equal_nan=True)
+        assert np.allclose(schema.decode_json(records_body), schema.decode_npy(npy_body), equal_nan=True)
+        print(f"{batch_size:>8} {legacy * 1e3:>10.3f} {split * 1e3:>9.3f} {records * 1e3:>11.3f} {npy * 1e3:>8.3f} {arrow}")
+
+
+if __name__ == "__main__":
+    main()
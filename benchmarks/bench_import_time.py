@@ -0,0 +1,66 @@
+"""
+cold import cost of the modules a serving container loads, measured with
+python -X importtime in a fresh interpreter per run
+
+run from the repo root:
+    python -m benchmarks.bench_import_time --repeats 5
+"""
+import argparse
+import re
+import subprocess
+import sys
+
+DEFAULT_MODULES = [
+    "source.inference_engine",
+    "source.request_decoding",
+    "source.prediction_server",
+    "source.outlier_detection",
+    "source.handle_missing_values",
+    "source.feature_engineering",
+]
+
+HEAVY_PACKAGES = ["pandas", "sklearn", "scipy", "matplotlib", "seaborn", "zenml", "mlflow"]
+
+# "import time:      self |  cumulative | <indent>package"
+LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)")
+
+
+def import_profile(module: str) -> tuple:
+    """total microseconds, cumulative microseconds per direct import of the module and the heavy packages loaded"""
+    code = f"import sys, {module}; print(','.join(p for p in {HEAVY_PACKAGES!r} if p in sys.modules))"
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, check=True)
+
+    total, direct = 0, {}
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if not match:
+            continue
+        # one space of indent is a top level import, three are the imports it made itself
+        depth = len(match.group(3))
+        if depth == 1:
+            total += int(match.group(2))
+        elif depth == 3:
+            direct[match.group(4)] = int(match.group(2))
+    loaded = [p for p in result.stdout.strip().split(",") if p]
+    return total, direct, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--top", type=int, default=3, help="heaviest direct imports to show per module")
+    args = parser.parse_args()
+
+    print(f"{'module':32} {'import ms':>10}  heavy packages loaded / heaviest imports")
+    for module in args.modules:
+        # the fastest run is the least disturbed by the rest of the machine
+        runs = [import_profile(module) for _ in range(args.repeats)]
+        total, direct, loaded = min(runs, key=lambda run: run[0])
+        heaviest = sorted(direct.items(), key=lambda item: item[1], reverse=True)[:args.top]
+        print(f"{module:32} {total / 1e3:10.1f}  {loaded or '-'}")
+        print(f"{'':32} {'':10}  " + ", ".join(f"{name} {us / 1e3:.1f}ms" for name, us in heaviest))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+compare FillMissingValues against the previous column by column implementation
+
+run from the repo root:
+    python -m benchmarks.bench_imputation --replicate 1 100
+"""
+import argparse
+import logging
+import time
+
+import pandas as pd
+
+from source.handle_missing_values import FillMissingValues
+
+
+def legacy_fill(df: pd.DataFrame, method: str) -> pd.DataFrame:
+    # the implementation FillMissingValues.handle used before the single pass engine
+    df_cleaned = df.copy()
+    if method == "mean":
+        numerical_columns = df_cleaned.select_dtypes(include="number").columns
+        df_cleaned[numerical_columns] = df_cleaned[numerical_columns].fillna(df[numerical_columns].mean())
+    elif method == "median":
+        numerical_columns = df_cleaned.select_dtypes(include="number").columns
+        df_cleaned[numerical_columns] = df_cleaned[numerical_columns].fillna(df[numerical_columns].median())
+    elif method == "mode":
+        for column in df_cleaned.columns:
+            modes = df[column].mode()
+            if len(modes):
+                df_cleaned[column] = df_cleaned[column].fillna(modes.iloc[0])
+    return df_cleaned
+
+
+def best_of(func, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default="Data/AmesHousing.csv")
+    parser.add_argument("--replicate", type=int, nargs="+", default=[1, 100])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    base = pd.read_csv(args.data)
+
+    print(f"{'rows':>10} {'method':>8} {'legacy s':>10} {'engine s':>10} {'speedup':>8}")
+    for factor in args.replicate:
+        df = pd.concat([base] * factor, ignore_index=True)
+        for method in ("mean", "median", "mode"):
+            legacy = best_of(lambda: legacy_fill(df, method), args.repeats)
+            engine = best_of(lambda: FillMissingValues(method=method).handle(df), args.repeats)
+            print(f"{len(df):>10} {method:>8} {legacy:>10.4f} {engine:>10.4f} {legacy / engine:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+compare the compiled in-process engine with sklearn Pipeline.predict and,
+when --url points at a running mlflow server, the /invocations http call
+
+run from the repo root:
+    python -m benchmarks.bench_inference --batch-sizes 1 100 10000
+    python -m benchmarks.bench_inference --url http://127.0.0.1:8000/invocations
+"""
+import argparse
+import json
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+from sklearn.impute import SimpleImputer
+from sklearn.linear_model import LinearRegression
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder
+
+from source.inference_engine import CompiledLinearPipeline
+
+
+def train_pipeline(df: pd.DataFrame, target_column: str) -> Pipeline:
+    # same pipeline as model_building_step, trained here so no zenml stack is needed
+    x = df.drop(columns=[target_column])
+    categorical_col = x.select_dtypes(include=["object", "category", "string"]).columns
+    numerical_col = x.select_dtypes(exclude=["object", "category", "string"]).columns
+    preprocessor = ColumnTransformer(
+        transformers=[
+            ("num", SimpleImputer(strategy="mean"), numerical_col),
+            ("cat", Pipeline(steps=[
+                ("imputer", SimpleImputer(strategy="most_frequent")),
+                ("onehot", OneHotEncoder(handle_unknown="ignore")),
+            ]), categorical_col),
+        ],
+        sparse_threshold=1.0,
+    )
+    pipeline = Pipeline(steps=[("preprocessor", preprocessor), ("model", LinearRegression())])
+    return pipeline.fit(x, df[target_column])
+
+
+def best_of(func, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def http_predict(url: str, batch: pd.DataFrame):
+    import requests
+
+    payload = json.dumps({"dataframe_split": json.loads(batch.to_json(orient="split", index=False))})
+    response = requests.post(url, headers={"Content-Type": "application/json"}, data=payload)
+    response.raise_for_status()
+    return response.json()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default="Data/AmesHousing.csv")
+    parser.add_argument("--target", default="SalePrice")
+    parser.add_argument("--numeric-only", action="store_true", help="train on numeric columns like the training pipeline")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 100, 10_000])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--url", default=None, help="mlflow /invocations url to include in the comparison")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    df = pd.read_csv(args.data)
+    if args.numeric_only:
+        df = df.select_dtypes(include="number")
+    pipeline = train_pipeline(df, args.target)
+
+    start = time.perf_counter()
+    engine = CompiledLinearPipeline.from_pipeline(pipeline)
+    print(f"compiled pipeline in {(time.perf_counter() - start) * 1e3:.2f} ms")
+
+    features = df.drop(columns=[args.target])
+    print(f"{'batch':>8} {'sklearn ms':>11} {'engine ms':>10} {'speedup':>8} {'http ms':>9} {'max abs diff':>13}")
+    for batch_size in args.batch_sizes:
+        batch = features.sample(n=batch_size, replace=True, random_state=0).reset_index(drop=True)
+        numeric = batch[engine.numeric_columns].to_numpy(dtype=np.float64)
+        categorical = batch[engine.categorical_columns].to_numpy(dtype=object) if engine.categorical_columns else None
+
+        sklearn_s = best_of(lambda: pipeline.predict(batch), args.repeats)
+        engine_s = best_of(lambda: engine.predict(numeric, categorical), args.repeats)
+        difference = np.abs(pipeline.predict(batch) - engine.predict(numeric, categorical)).max()
+        http = f"{best_of(lambda: http_predict(args.url, batch), args.repeats) * 1e3:9.3f}" if args.url else f"{'-':>9}"
+        print(f"{batch_size:>8} {sklearn_s * 1e3:>11.3f} {engine_s * 1e3:>10.3f} {sklearn_s / engine_s:>7.1f}x {http} {difference:>13.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+cost of logging a DataFrame per step: the old f-string repr pattern against
+a lazy FrameSummary argument, with INFO enabled and disabled, next to the
+z-score detection the log line sits in front of
+
+run from the repo root:
+    python -m benchmarks.bench_logging --rows 1000000
+"""
+import argparse
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.bench_inference import best_of
+from source.log_config import TEXT_FORMAT, summarize
+from source.outlier_detection import OutlierDetector, ZScoreOutlierDetection
+
+
+def make_frame(rows: int, columns: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(rng.normal(size=(rows, columns)), columns=[f"feature_{i}" for i in range(columns)])
+    df.iloc[rng.integers(0, rows, size=rows // 100), 0] = np.nan
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--columns", type=int, default=20)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    df = make_frame(args.rows, args.columns)
+
+    # emitted records go to /dev/null so only building the message is measured
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    sink = logging.StreamHandler(open(os.devnull, "w"))
+    sink.setFormatter(logging.Formatter(TEXT_FORMAT))
+    root.addHandler(sink)
+
+    cases = {
+        "f-string repr": lambda: logging.info(f"start outlier detection step with dataset {df}"),
+        "lazy summary": lambda: logging.info("start outlier detection step with dataset %s", summarize(df)),
+    }
+
+    detector = OutlierDetector(ZScoreOutlierDetection(threshold=3))
+    root.setLevel(logging.WARNING)
+    detect_s = best_of(lambda: detector.detect(df), args.repeats)
+
+    print(f"{args.rows} rows x {args.columns} columns, z-score detect takes {detect_s * 1e3:.2f} ms")
+    print(f"{'log call':16} {'INFO on ms':>11} {'INFO off ms':>12} {'vs detect (on)':>15}")
+    for name, log in cases.items():
+        root.setLevel(logging.INFO)
+        enabled_s = best_of(log, args.repeats)
+        root.setLevel(logging.WARNING)
+        disabled_s = best_of(log, args.repeats)
+        print(f"{name:16} {enabled_s * 1e3:>11.3f} {disabled_s * 1e3:>12.4f} {enabled_s / detect_s:>14.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+load test the micro-batching server against the same server without batching
+
+trains the model_building_step pipeline on Ames, starts the server in process
+and fires `--clients` concurrent keep-alive clients at it:
+    python -m benchmarks.bench_serving --clients 200 --requests 20
+"""
+import argparse
+import asyncio
+import json
+import logging
+
+import pandas as pd
+
+from benchmarks.bench_inference import train_pipeline
+from source.prediction_server import MicroBatcher, PredictionServer, make_predict_fn, run_load
+from source.request_decoding import InputSchema
+
+
+async def measure(model, payload: bytes, args, max_batch_size: int, max_wait_ms: float) -> dict:
+    schema = InputSchema.from_model(model) if args.fast_decode else None
+    batcher = MicroBatcher(make_predict_fn(model, args.compile, schema=schema), max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+    server = PredictionServer(batcher, port=0, schema=schema)
+    await server.start()
+    try:
+        return await run_load("127.0.0.1", server.port, payload, args.clients, args.requests)
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default="Data/AmesHousing.csv")
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=20, help="requests per client")
+    parser.add_argument("--max-batch-size", type=int, default=256)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--compile", action="store_true")
+    parser.add_argument("--fast-decode", action="store_true", help="decode with the model's InputSchema")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    df = pd.read_csv(args.data).select_dtypes(include="number")
+    model = train_pipeline(df, "SalePrice")
+    record = json.loads(df.drop(columns=["SalePrice"]).head(1).to_json(orient="records"))
+    payload = json.dumps({"dataframe_records": record}).encode()
+
+    print(f"{'mode':>10} {'requests':>9} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for mode, batch_size, wait in (("unbatched", 1, 0.0), ("batched", args.max_batch_size, args.max_wait_ms)):
+        result = asyncio.run(measure(model, payload, args, batch_size, wait))
+        print(f"{mode:>10} {result['requests']:>9} {result['throughput_rps']:>9.0f} {result['p50_ms']:>8.2f} {result['p99_ms']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+time and memory profile every strategy class on 1x/10x/100x/1000x Ames data
+
+the scaled datasets are the original rows resampled with replacement and
+numeric columns jittered by 1% of their std, missing values stay missing.
+results go to a json file; --baseline compares against an earlier one and
+exits non zero when a case got slower than --threshold times its baseline
+
+run from the repo root:
+    python -m benchmarks.bench_suite --scales 1 10 100 --output bench.json
+    python -m benchmarks.bench_suite --scales 1 10 100 --baseline bench.json
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+
+import numpy as np
+import pandas as pd
+import sklearn
+
+from benchmarks.bench_inference import best_of
+from source.data_splitter import DataSplitter, SimpleTrainTestSpliter
+from source.feature_engineering import FeatureEngineer, LogTransformation, MinMaxScaling, OneHotEncoding, StandardScaling
+from source.handle_missing_values import DropMissingValues, FillMissingValues, MissingValuesHandler
+from source.inference_engine import CompiledLinearPipeline
+from source.ingest_data import ZipDataIngestor
+from source.model_building import LinearRegressionStrategy, ModelBuilder
+from source.model_evaluator import ModelEvaluator, RegressionModelEvaluation
+from source.outlier_detection import IQROutlierDetection, OutlierDetector, ZScoreOutlierDetection
+
+
+def make_scaled_data(df: pd.DataFrame, scale: int, seed: int = 0) -> pd.DataFrame:
+    """len(df) * scale rows resampled from df, numeric columns with gaussian noise"""
+    rng = np.random.default_rng(seed)
+    scaled = df.iloc[rng.integers(0, len(df), size=len(df) * scale)].reset_index(drop=True)
+
+    for column in scaled.select_dtypes(include="number").columns:
+        values = scaled[column].to_numpy(dtype=np.float64)
+        noisy = values + rng.normal(0, 0.01 * np.nanstd(values), size=len(values))
+        if pd.api.types.is_integer_dtype(scaled[column]):
+            # integer columns stay integer, rounding keeps counts and years plausible
+            scaled[column] = np.round(noisy).astype(scaled[column].dtype)
+        else:
+            scaled[column] = noisy
+    return scaled
+
+
+@contextlib.contextmanager
+def working_directory(path: str):
+    # ZipDataIngestor extracts into ./Extracted_data, keep that out of the repo
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def build_cases(df: pd.DataFrame, zip_path: str, target: str) -> list:
+    """(name, callable) for every strategy, inputs prepared up front so only the strategy is measured"""
+    numeric = df.select_dtypes(include="number")
+    filled = MissingValuesHandler(FillMissingValues(method="mean")).execute_strategy(numeric)
+    x_train, x_test, y_train, y_test = DataSplitter(SimpleTrainTestSpliter()).split(filled, target)
+    model = ModelBuilder(LinearRegressionStrategy()).build_and_train_model(x_train, y_train)
+    engine = CompiledLinearPipeline.from_pipeline(model)
+    x_test_matrix = x_test[engine.numeric_columns].to_numpy(dtype=np.float64)
+    zip_dir = os.path.dirname(zip_path)
+
+    def ingest():
+        with working_directory(zip_dir):
+            return ZipDataIngestor().ingest(zip_path)
+
+    cases = [("ZipDataIngestor", ingest)]
+    for method in ("mean", "median", "mode", "constant"):
+        cases.append((f"FillMissingValues[{method}]",
+                      lambda method=method: MissingValuesHandler(FillMissingValues(method=method, fill_value=0)).execute_strategy(df)))
+    cases += [
+        ("DropMissingValues", lambda: MissingValuesHandler(DropMissingValues(axis=0)).execute_strategy(df)),
+        ("LogTransformation", lambda: FeatureEngineer(LogTransformation(features=["Gr Liv Area", target])).apply_feature_engineering(filled)),
+        ("StandardScaling", lambda: FeatureEngineer(StandardScaling(features=["Gr Liv Area", target])).apply_feature_engineering(filled)),
+        ("MinMaxScaling", lambda: FeatureEngineer(MinMaxScaling(features=["Gr Liv Area", target])).apply_feature_engineering(filled)),
+        ("OneHotEncoding", lambda: FeatureEngineer(OneHotEncoding(features=["Neighborhood", "MS Zoning"])).apply_feature_engineering(df)),
+        ("ZScoreOutlierDetection", lambda: OutlierDetector(ZScoreOutlierDetection(threshold=3)).handle_outliers(filled, method="remove")),
+        ("IQROutlierDetection", lambda: OutlierDetector(IQROutlierDetection()).handle_outliers(filled, method="remove")),
+        ("SimpleTrainTestSpliter", lambda: DataSplitter(SimpleTrainTestSpliter()).split(filled, target)),
+        ("LinearRegressionStrategy", lambda: ModelBuilder(LinearRegressionStrategy()).build_and_train_model(x_train, y_train)),
+        ("RegressionModelEvaluation", lambda: ModelEvaluator(RegressionModelEvaluation()).evaluate(x_test, y_test, model)),
+        ("predict[sklearn]", lambda: model.predict(x_test)),
+        ("predict[compiled]", lambda: engine.predict(x_test_matrix)),
+    ]
+    return cases
+
+
+def peak_memory(func) -> int:
+    """peak bytes allocated while func runs, as seen by tracemalloc (numpy and python objects)"""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def compare(results: list, baseline: dict, threshold: float, min_seconds: float = 0.0) -> list:
+    """
+    print the ratio to the baseline per case, return the cases slower than
+    threshold times the baseline. cases under min_seconds are too noisy to flag
+    """
+    previous = {(r["case"], r["scale"]): r for r in baseline["results"]}
+    regressions = []
+    print(f"\n{'case':32} {'scale':>6} {'baseline s':>11} {'now s':>10} {'ratio':>7} {'peak MB ratio':>14}")
+    for result in results:
+        before = previous.get((result["case"], result["scale"]))
+        if before is None:
+            continue
+        ratio = result["seconds"] / before["seconds"] if before["seconds"] else float("inf")
+        memory_ratio = result["peak_bytes"] / before["peak_bytes"] if before["peak_bytes"] else float("inf")
+        regressed = ratio > threshold and result["seconds"] >= min_seconds
+        flag = "  <-- regression" if regressed else ""
+        print(f"{result['case']:32} {result['scale']:>6} {before['seconds']:>11.4f} {result['seconds']:>10.4f} "
+              f"{ratio:>6.2f}x {memory_ratio:>13.2f}x{flag}")
+        if regressed:
+            regressions.append(result)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default="Data/AmesHousing.csv")
+    parser.add_argument("--target", default="SalePrice")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--cases", nargs="+", default=None, help="only run cases whose name starts with one of these")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", default=None, help="earlier --output file to compare against")
+    parser.add_argument("--threshold", type=float, default=1.2, help="slowdown ratio reported as a regression")
+    parser.add_argument("--min-seconds", type=float, default=0.01, help="faster cases are compared but never flagged")
+    args = parser.parse_args()
+
+    # read before anything is written, --output and --baseline may be the same file
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    logging.getLogger().setLevel(logging.WARNING)
+    original = pd.read_csv(args.data)
+    results = []
+
+    for scale in args.scales:
+        df = make_scaled_data(original, scale)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            zip_path = os.path.join(tmp_dir, "ames.zip")
+            with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zip_file:
+                zip_file.writestr("AmesHousing.csv", df.to_csv(index=False))
+
+            for name, func in build_cases(df, zip_path, args.target):
+                if args.cases and not any(name.startswith(prefix) for prefix in args.cases):
+                    continue
+                # timing and memory are separate runs, tracemalloc slows python code down
+                seconds = best_of(func, args.repeats)
+                peak_bytes = peak_memory(func)
+                results.append({"case": name, "scale": scale, "rows": len(df), "seconds": seconds, "peak_bytes": peak_bytes})
+                print(f"{name:32} {scale:>5}x {len(df):>10} rows {seconds:>10.4f}s {peak_bytes / 1e6:>10.1f} MB", flush=True)
+
+    report = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "sklearn": sklearn.__version__,
+            "cpus": os.cpu_count(),
+            "repeats": args.repeats,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nwrote {len(results)} results to {args.output}")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold, args.min_seconds)
+        if regressions:
+            print(f"{len(regressions)} cases slower than {args.threshold}x their baseline")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+numpy only inference entry point for fast cold starts
+
+    python predict_engine.py compile model.joblib engine.bundle
+    python predict_engine.py predict engine.bundle input.json
+
+compile needs the training environment (joblib + sklearn), predict only
+imports numpy and reads the engine written by compile. a .bundle engine is
+memory mapped, any other extension is written/read as npz. input is a .npy
+matrix in the engine's numeric column order or a json payload
+(dataframe_split / dataframe_records / data) of numeric columns
+"""
+import argparse
+import json
+import sys
+
+import numpy as np
+
+from source.inference_engine import CompiledLinearPipeline
+from source.model_bundle import load_bundle, save_bundle
+
+
+def compile_model(model_path: str, engine_path: str):
+    import joblib
+
+    engine = CompiledLinearPipeline.from_pipeline(joblib.load(model_path))
+    if engine_path.endswith(".bundle"):
+        save_bundle(engine, engine_path)
+    else:
+        engine.save(engine_path)
+    print(f"compiled {len(engine.numeric_columns)} numeric and {len(engine.categorical_columns)} categorical columns to {engine_path}")
+
+
+def read_input(input_path: str, columns: list) -> np.ndarray:
+    if input_path.endswith(".npy"):
+        return np.load(input_path, allow_pickle=False)
+
+    with open(input_path) as f:
+        data = json.load(f)
+
+    records = data.get("dataframe_records") if isinstance(data, dict) else data
+    if records is not None:
+        nan = float("nan")
+        return np.array([[record.get(column, nan) for column in columns] for record in records], dtype=np.float64)
+
+    split = data.get("dataframe_split", data)
+    values = np.array(split["data"], dtype=np.float64)
+    given = split.get("columns", columns)
+    matrix = np.full((len(values), len(columns)), np.nan)
+    positions = {column: i for i, column in enumerate(columns)}
+    matrix[:, [positions[column] for column in given]] = values
+    return matrix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    compile_parser = commands.add_parser("compile", help="compile a joblib sklearn pipeline into an engine file")
+    compile_parser.add_argument("model_path")
+    compile_parser.add_argument("engine_path")
+    predict_parser = commands.add_parser("predict", help="score an input file with a compiled engine")
+    predict_parser.add_argument("engine_path")
+    predict_parser.add_argument("input_path")
+    args = parser.parse_args(argv)
+
+    if args.command == "compile":
+        compile_model(args.model_path, args.engine_path)
+        return
+
+    engine = load_bundle(args.engine_path) if args.engine_path.endswith(".bundle") else CompiledLinearPipeline.load(args.engine_path)
+    if engine.categorical_columns:
+        sys.exit("the engine has categorical columns, score it with run_server.py --compile instead")
+    predictions = engine.predict(read_input(args.input_path, engine.numeric_columns))
+    json.dump({"predictions": predictions.tolist()}, sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
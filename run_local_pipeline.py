@@ -0,0 +1,69 @@
+import click
+
+from source.dag_executor import LocalDagExecutor
+
+
+# columns every feature engineering strategy works on, only the log transform
+# touches the target, scaling or encoding SalePrice would change the scale the
+# metrics are reported on. the encoded columns are low cardinality ratings, the
+# z score outlier step drops the rows of rare categories so a column like
+# Neighborhood would lose most of the data
+STRATEGY_FEATURES = {
+    "log": ["Gr Liv Area", "SalePrice"],
+    "minmaxscaling": ["Gr Liv Area", "Lot Area", "Total Bsmt SF", "Garage Area"],
+    "standardscaling": ["Gr Liv Area", "Lot Area", "Total Bsmt SF", "Garage Area"],
+    "onehotencoding": ["Exter Qual", "Kitchen Qual"],
+}
+
+
+def build_training_dag(file_path: str, strategies: list, max_workers: int = None) -> LocalDagExecutor:
+    """
+    the training pipeline as a local dag, ingestion and missing values are
+    shared and every feature engineering strategy gets its own independent
+    engineer -> outliers -> split -> train -> evaluate branch
+    """
+    unknown = [strategy for strategy in strategies if strategy not in STRATEGY_FEATURES]
+    if unknown:
+        raise ValueError(f"unsupported feature engineering strategies {unknown}, expected one of {list(STRATEGY_FEATURES)}")
+
+    dag = LocalDagExecutor(max_workers=max_workers)
+    dag.add_step("ingest", "steps.data_ingestion_step:data_ingestion_step", file_path=file_path)
+    dag.add_step("missing_values", "steps.handle_missing_values_step:handle_missing_values_step",
+                 inputs={"df": "ingest"}, strategy="mean")
+
+    for strategy in strategies:
+        engineer = f"feature_engineering[{strategy}]"
+        outliers = f"outlier_detection[{strategy}]"
+        split = f"data_splitter[{strategy}]"
+        build = f"model_building[{strategy}]"
+
+        dag.add_step(engineer, "steps.feature_engineering_step:feature_engineering_step",
+                     inputs={"df": "missing_values"}, strategy=strategy, features=STRATEGY_FEATURES[strategy])
+        dag.add_step(outliers, "steps.outlier_detection_step:outlier_detection_step",
+                     inputs={"df": engineer}, column_name="SalePrice")
+        dag.add_step(split, "steps.data_splitter_step:data_splitter_step",
+                     inputs={"df": outliers}, target_column="SalePrice")
+        dag.add_step(build, "steps.model_building_step:model_building_step",
+                     inputs={"x_train": f"{split}:0", "y_train": f"{split}:2"})
+        dag.add_step(f"model_evaluator[{strategy}]", "steps.model_evaluator_step:model_evaluator_step",
+                     inputs={"trained_model": build, "x_test": f"{split}:1", "y_test": f"{split}:3"})
+    return dag
+
+
+@click.command()
+@click.option("--file-path", default="data/archive.zip")
+@click.option("--strategy", "strategies", multiple=True, default=["log"], type=click.Choice(list(STRATEGY_FEATURES)),
+              help="feature engineering strategy, repeat to train several branches in parallel")
+@click.option("--max-workers", default=None, type=int, help="worker processes, defaults to every core")
+def main(file_path, strategies, max_workers):
+    # run the training steps on a local process pool instead of the zenml orchestrator
+    dag = build_training_dag(file_path, list(strategies), max_workers)
+    results = dag.run()
+
+    for strategy in strategies:
+        metrics, _ = results[f"model_evaluator[{strategy}]"]
+        print(f"{strategy}: {metrics}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+import asyncio
+
+import click
+
+from source.prediction_server import MicroBatcher, PredictionServer, load_model, make_predict_fn
+from source.request_decoding import InputSchema
+
+
+@click.command()
+@click.option("--model-path", default=None, help="joblib file with the trained pipeline or a compiled .bundle, defaults to the zenml artifact")
+@click.option("--artifact-name", default="sklearn-pipeline", help="zenml artifact produced by model_building_step")
+@click.option("--host", default="127.0.0.1")
+@click.option("--port", default=8000, type=int)
+@click.option("--max-batch-size", default=64, type=int, help="rows scored together in one predict call")
+@click.option("--max-wait-ms", default=5.0, type=float, help="longest a request waits for its batch to fill")
+@click.option("--compile", "compile_model", is_flag=True, default=False, help="score with the compiled numpy engine")
+@click.option("--fast-decode", is_flag=True, default=False, help="decode requests with the model's input schema (numeric models), also accepts .npy and arrow bodies")
+def main(model_path, artifact_name, host, port, max_batch_size, max_wait_ms, compile_model, fast_decode):
+    """Serve the trained pipeline with micro-batching, same /invocations payloads as mlflow"""
+    model = load_model(model_path=model_path, artifact_name=artifact_name)
+    schema = InputSchema.from_model(model) if fast_decode else None
+    predict_fn = make_predict_fn(model, compile_model, schema=schema)
+    batcher = MicroBatcher(predict_fn, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+    server = PredictionServer(batcher, host=host, port=port, schema=schema)
+    asyncio.run(server.serve_forever())
+
+
+if __name__ == "__main__":
+    main()
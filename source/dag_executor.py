@@ -0,0 +1,211 @@
+import importlib
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Callable, Union
+
+import pandas as pd
+from source.log_config import configure_logging
+
+configure_logging()
+
+# name of the column a Series is stored under in its arrow file
+_SERIES_COLUMN = "__series__"
+
+
+class DagStep:
+    """
+    one node of the local dag
+
+    target is the step function or its import path "module:name", zenml
+    steps are unwrapped to their entrypoint so they run as plain functions.
+    inputs maps an argument to the step producing it, "split:1" picks the
+    second output of a step returning a tuple
+    """
+
+    def __init__(self, name: str, target: Union[str, Callable], inputs: dict = None, params: dict = None):
+        self.name = name
+        self.target = target
+        self.inputs = dict(inputs or {})
+        self.params = dict(params or {})
+
+    @property
+    def upstream(self) -> set:
+        return {ref.split(":")[0] for ref in self.inputs.values()}
+
+
+def _resolve(target: Union[str, Callable]) -> Callable:
+    # zenml's @step replaces the module attribute with a step object, so the plain
+    # function can not be pickled by reference, passing the import path avoids that
+    if isinstance(target, str):
+        module_name, _, attribute = target.partition(":")
+        target = getattr(importlib.import_module(module_name), attribute)
+    return getattr(target, "entrypoint", target)
+
+
+def _store(value: Any, path: str) -> tuple:
+    """write a step output, frames and series as uncompressed arrow files, the rest pickled"""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        from pyarrow import feather
+        import pyarrow as pa
+
+        is_series = isinstance(value, pd.Series)
+        frame = value.to_frame(_SERIES_COLUMN) if is_series else value
+        # the index is kept, x_test and y_test are matched on it later on
+        table = pa.Table.from_pandas(frame, preserve_index=True)
+        feather.write_feather(table, f"{path}.arrow", compression="uncompressed")
+        return ("series" if is_series else "frame", f"{path}.arrow", value.name if is_series else None)
+
+    with open(f"{path}.pkl", "wb") as f:
+        pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return ("pickle", f"{path}.pkl", None)
+
+
+def _load(ref: tuple) -> Any:
+    kind, path, name = ref
+    if kind == "pickle":
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+    from pyarrow import feather
+
+    # memory mapped, the columns are read straight from the page cache
+    frame = feather.read_table(path, memory_map=True).to_pandas()
+    if kind == "series":
+        return frame[_SERIES_COLUMN].rename(name)
+    return frame
+
+
+def _run_step(name: str, target, input_refs: dict, params: dict, artifact_dir: str) -> dict:
+    # runs in a worker process
+    start = time.perf_counter()
+    kwargs = {argument: _load(ref) for argument, ref in input_refs.items()}
+    load_seconds = time.perf_counter() - start
+
+    compute_start = time.perf_counter()
+    result = _resolve(target)(**kwargs, **params)
+    compute_seconds = time.perf_counter() - compute_start
+
+    store_start = time.perf_counter()
+    outputs = list(result) if isinstance(result, tuple) else [result]
+    refs = [_store(value, os.path.join(artifact_dir, f"{name}-{i}")) for i, value in enumerate(outputs)]
+
+    return {
+        "outputs": refs,
+        "tuple": isinstance(result, tuple),
+        "load_seconds": load_seconds,
+        "compute_seconds": compute_seconds,
+        "store_seconds": time.perf_counter() - store_start,
+        "wall_seconds": time.perf_counter() - start,
+    }
+
+
+class LocalDagExecutor:
+    """
+    run pipeline steps as a dag on a local process pool
+
+    every step is submitted as soon as the steps it depends on are done, so
+    independent branches run at the same time. dataframes travel between
+    steps as memory mapped arrow files in artifact_dir instead of pickles.
+    per step wall time and the critical path are logged after the run
+    """
+
+    def __init__(self, max_workers: int = None, artifact_dir: str = None, keep_artifacts: bool = False):
+        self.max_workers = max_workers or os.cpu_count()
+        self.artifact_dir = artifact_dir
+        self.keep_artifacts = keep_artifacts
+        self.steps = {}
+        self.timings_ = {}
+        self.critical_path_ = []
+
+    def add_step(self, name: str, target: Union[str, Callable], inputs: dict = None, **params) -> DagStep:
+        if name in self.steps:
+            raise ValueError(f"step {name} already added")
+        for ref in (inputs or {}).values():
+            if ref.split(":")[0] not in self.steps:
+                raise ValueError(f"step {name} depends on unknown step {ref}")
+
+        self.steps[name] = DagStep(name, target, inputs, params)
+        return self.steps[name]
+
+    def _input_refs(self, step: DagStep, outputs: dict) -> dict:
+        refs = {}
+        for argument, ref in step.inputs.items():
+            upstream, _, index = ref.partition(":")
+            refs[argument] = outputs[upstream]["outputs"][int(index or 0)]
+        return refs
+
+    def run(self) -> dict:
+        """run every step, returns step name -> output (a tuple for steps returning several)"""
+        artifact_dir = self.artifact_dir or tempfile.mkdtemp(prefix="dag-artifacts-")
+        os.makedirs(artifact_dir, exist_ok=True)
+
+        done, running = {}, {}
+        pending = dict(self.steps)
+        start = time.perf_counter()
+
+        try:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+                while pending or running:
+                    for name, step in list(pending.items()):
+                        if step.upstream <= done.keys():
+                            logging.info(f"starting step {name}")
+                            future = pool.submit(
+                                _run_step, name, step.target, self._input_refs(step, done), step.params, artifact_dir
+                            )
+                            running[future] = name
+                            del pending[name]
+
+                    finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        name = running.pop(future)
+                        # a failing step fails the run, the pool shuts down with the with block
+                        done[name] = future.result()
+                        logging.info(f"finished step {name} in {done[name]['wall_seconds']:.2f}s")
+
+            total_seconds = time.perf_counter() - start
+            results = {}
+            for name, record in done.items():
+                values = [_load(ref) for ref in record["outputs"]]
+                results[name] = tuple(values) if record["tuple"] else values[0]
+        finally:
+            if not self.keep_artifacts:
+                shutil.rmtree(artifact_dir, ignore_errors=True)
+
+        self.timings_ = {
+            name: {key: value for key, value in record.items() if key.endswith("_seconds")}
+            for name, record in done.items()
+        }
+        self.critical_path_ = self.critical_path()
+        self._log_report(total_seconds)
+        return results
+
+    def critical_path(self) -> list:
+        """the chain of dependent steps with the largest summed wall time"""
+        longest = {}
+        for name in self._topological_order():
+            step = self.steps[name]
+            best = max(step.upstream, key=lambda upstream: longest[upstream][0], default=None)
+            before, path = longest[best] if best is not None else (0.0, [])
+            longest[name] = (before + self.timings_[name]["wall_seconds"], path + [name])
+        return max(longest.values(), key=lambda item: item[0])[1] if longest else []
+
+    def _topological_order(self) -> list:
+        # steps can only depend on steps added before them
+        return list(self.steps)
+
+    def _log_report(self, total_seconds: float):
+        for name, timing in self.timings_.items():
+            logging.info(
+                f"step {name}: wall {timing['wall_seconds']:.2f}s "
+                f"(compute {timing['compute_seconds']:.2f}s, load {timing['load_seconds']:.2f}s, "
+                f"store {timing['store_seconds']:.2f}s)"
+            )
+        critical_seconds = sum(self.timings_[name]["wall_seconds"] for name in self.critical_path_)
+        step_seconds = sum(timing["wall_seconds"] for timing in self.timings_.values())
+        logging.info(f"critical path {' -> '.join(self.critical_path_)}: {critical_seconds:.2f}s")
+        logging.info(f"dag finished in {total_seconds:.2f}s, {step_seconds:.2f}s of step time")
@@ -0,0 +1,382 @@
+import copy
+import hashlib
+import json
+import logging
+import os
+import pickle
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from source.log_config import configure_logging
+from source.outlier_detection import _QuantileDigest, _partition_quantiles
+
+configure_logging()
+
+# the default cache sits at the repo root whatever directory the analysis runs from
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".profile_cache")
+
+
+def _schema_hash(df: pd.DataFrame) -> str:
+    payload = json.dumps([[str(column), str(dtype)] for column, dtype in df.dtypes.items()])
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def _sample_positions(n_rows: int, sample_rows: int = None) -> np.ndarray:
+    # evenly spaced rows plus the tail, positions only depend on n_rows so a prefix can be checked on its own
+    if sample_rows is None or n_rows <= sample_rows:
+        return np.arange(n_rows)
+    spread = np.linspace(0, n_rows - 1, sample_rows // 2).astype(np.int64)
+    tail = np.arange(n_rows - sample_rows // 2, n_rows)
+    return np.unique(np.concatenate([spread, tail]))
+
+
+def fingerprint(df: pd.DataFrame, n_rows: int = None, sample_rows: int = 10_000) -> str:
+    """
+    hash of the columns, dtypes, row count and the rows at _sample_positions
+    of the first n_rows rows (all of them by default)
+
+    with sample_rows=None every row is hashed. a sampled fingerprint misses
+    an in place edit of a row it did not look at, appends and schema
+    changes are always seen
+    """
+    n_rows = len(df) if n_rows is None else n_rows
+    rows = df.iloc[_sample_positions(n_rows, sample_rows)]
+
+    digest = hashlib.sha256()
+    digest.update(_schema_hash(df).encode())
+    digest.update(str(n_rows).encode())
+    digest.update(pd.util.hash_pandas_object(rows, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+class DataProfile:
+    """
+    dtypes, null counts, describe() statistics, value counts and the
+    pairwise covariance of a frame, all kept as running totals
+
+    update(chunk) adds rows in O(rows * numeric columns^2), nothing here
+    holds on to the rows themselves. a profile built from a whole frame in
+    one update(df, exact_quantiles=True) has exact quartiles. after further
+    updates they come from _QuantileDigest sketches and are approximate once
+    a column has more than ~2 * compression values, everything else matches
+    pandas
+    """
+
+    def __init__(self, df: pd.DataFrame, compression: int = 200):
+        self.columns = list(df.columns)
+        self.dtypes = df.dtypes.copy()
+        self.numeric_columns = list(df.select_dtypes(include="number").columns)
+        self.categorical_columns = list(df.select_dtypes(include=["object", "string", "category"]).columns)
+        self.compression = compression
+        self.schema = _schema_hash(df)
+        self.fingerprint = None
+
+        p = len(self.numeric_columns)
+        self.n_rows = 0
+        self.null_counts = np.zeros(len(self.columns), dtype=np.int64)
+
+        # per column moments, merged chunk by chunk (chan / pebay)
+        self.count = np.zeros(p)
+        self.mean = np.zeros(p)
+        self.m2 = np.zeros(p)
+        self.m3 = np.zeros(p)
+        self.m4 = np.zeros(p)
+        self.digests = [_QuantileDigest(compression) for _ in range(p)]
+        self.exact_quantiles = None
+
+        # pairwise complete sums of the shifted values, entry [i, j] only counts rows where
+        # both column i and column j are present, the same rows df.corr() uses for that pair
+        self.shift = None
+        self.pair_count = np.zeros((p, p))
+        self.pair_sum = np.zeros((p, p))
+        self.pair_sum_sq = np.zeros((p, p))
+        self.pair_cross = np.zeros((p, p))
+
+        # plain dicts, merging a chunk's counts into them is far cheaper than aligning Series
+        self.value_counts = {column: {} for column in self.categorical_columns}
+
+    def update(self, chunk: pd.DataFrame, exact_quantiles: bool = False) -> "DataProfile":
+        """
+        add the rows of chunk. exact_quantiles on the first update also
+        selects the exact quartiles of chunk (np.partition), any later update
+        drops them again and describe falls back to the digests
+        """
+        if list(chunk.columns) != self.columns:
+            raise ValueError("chunk columns do not match the profiled columns")
+        if len(chunk) == 0:
+            return self
+
+        if exact_quantiles and self.n_rows == 0 and self.numeric_columns:
+            levels = (0.25, 0.5, 0.75)
+            self.exact_quantiles = dict(zip(levels, _partition_quantiles(chunk[self.numeric_columns], list(levels))))
+        else:
+            self.exact_quantiles = None
+
+        self.n_rows += len(chunk)
+        self.null_counts += chunk.isna().sum().to_numpy(dtype=np.int64)
+
+        if self.numeric_columns:
+            values = chunk[self.numeric_columns].to_numpy(dtype=np.float64)
+            self._update_moments(values)
+            self._update_pairs(values)
+            for index, digest in enumerate(self.digests):
+                digest.update(values[:, index])
+
+        for column in self.categorical_columns:
+            totals = self.value_counts[column]
+            for value, count in chunk[column].value_counts().items():
+                if count:
+                    totals[value] = totals.get(value, 0) + int(count)
+        return self
+
+    def _update_moments(self, values: np.ndarray):
+        present = ~np.isnan(values)
+        count_b = present.sum(axis=0).astype(np.float64)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean_b = np.where(count_b > 0, np.nansum(values, axis=0) / count_b, 0.0)
+        centred = np.where(present, values - mean_b, 0.0)
+        # products rather than ** 3 and ** 4, numpy only has a fast path for squaring
+        squared = centred * centred
+        m2_b = squared.sum(axis=0)
+        m3_b = (squared * centred).sum(axis=0)
+        m4_b = (squared * squared).sum(axis=0)
+
+        count_a, mean_a, m2_a, m3_a, m4_a = self.count, self.mean, self.m2, self.m3, self.m4
+        total = count_a + count_b
+        delta = mean_b - mean_a
+        # a column without any values yet has total 0, its weights stay 0 instead of 0/0
+        inverse = np.where(total > 0, 1 / np.maximum(total, 1), 0.0)
+        a, b = count_a * inverse, count_b * inverse
+        product = count_a * count_b * inverse
+
+        self.mean = mean_a + delta * b
+        self.m2 = m2_a + m2_b + delta**2 * product
+        self.m3 = m3_a + m3_b + delta**3 * product * (a - b) + 3 * delta * (a * m2_b - b * m2_a)
+        self.m4 = (m4_a + m4_b + delta**4 * product * (a**2 - a * b + b**2)
+                   + 6 * delta**2 * (a**2 * m2_b + b**2 * m2_a) + 4 * delta * (a * m3_b - b * m3_a))
+        self.count = total
+
+    def _update_pairs(self, values: np.ndarray):
+        if self.shift is None:
+            # the first chunk's means, shifting keeps the sums small so the covariance does not cancel out
+            with np.errstate(invalid="ignore"):
+                self.shift = np.nan_to_num(np.nanmean(values, axis=0))
+        present = ~np.isnan(values)
+        mask = present.astype(np.float64)
+        shifted = np.where(present, values - self.shift, 0.0)
+
+        self.pair_count += mask.T @ mask
+        self.pair_sum += shifted.T @ mask
+        self.pair_sum_sq += (shifted * shifted).T @ mask
+        self.pair_cross += shifted.T @ shifted
+
+    def info(self) -> pd.DataFrame:
+        """what df.info() prints, one row per column"""
+        return pd.DataFrame(
+            {
+                "dtype": self.dtypes.astype(str).to_numpy(),
+                "non_null": self.n_rows - self.null_counts,
+                "null": self.null_counts,
+            },
+            index=pd.Index(self.columns),
+        )
+
+    def missing(self) -> pd.Series:
+        """null counts of the columns that have any, like df.isnull().sum()[lambda s: s > 0]"""
+        nulls = pd.Series(self.null_counts, index=pd.Index(self.columns))
+        return nulls[nulls > 0]
+
+    def describe(self, percentiles=(0.25, 0.5, 0.75)) -> pd.DataFrame:
+        """df.describe() of the numeric columns, quantiles exact when known, otherwise from the digests"""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            std = np.sqrt(self.m2 / (self.count - 1))
+        rows = {"count": self.count, "mean": np.where(self.count > 0, self.mean, np.nan), "std": std}
+        rows["min"] = [digest.min if digest.total else np.nan for digest in self.digests]
+        for q in percentiles:
+            if self.exact_quantiles is not None and q in self.exact_quantiles:
+                rows[f"{q * 100:g}%"] = self.exact_quantiles[q].to_numpy()
+            else:
+                rows[f"{q * 100:g}%"] = [digest.quantile(q) for digest in self.digests]
+        rows["max"] = [digest.max if digest.total else np.nan for digest in self.digests]
+        return pd.DataFrame(rows, index=pd.Index(self.numeric_columns)).T
+
+    def describe_categorical(self) -> pd.DataFrame:
+        """df.describe(include=[object]) - count, unique, top and freq per text column"""
+        summary = {}
+        for index, column in enumerate(self.columns):
+            if column not in self.value_counts:
+                continue
+            counts = self.value_counts[column]
+            summary[column] = {
+                "count": self.n_rows - self.null_counts[index],
+                "unique": len(counts),
+                "top": max(counts, key=counts.get) if counts else np.nan,
+                "freq": max(counts.values()) if counts else np.nan,
+            }
+        return pd.DataFrame(summary, index=["count", "unique", "top", "freq"])
+
+    def moments(self) -> pd.DataFrame:
+        """mean, variance and the bias corrected skew and excess kurtosis pandas reports"""
+        n = self.count
+        with np.errstate(invalid="ignore", divide="ignore"):
+            variance = self.m2 / (n - 1)
+            skew = np.sqrt(n * (n - 1)) / (n - 2) * (self.m3 / n) / (self.m2 / n) ** 1.5
+            kurtosis = ((n + 1) * n * (n - 1) / ((n - 2) * (n - 3)) * self.m4 / self.m2**2
+                        - 3 * (n - 1) ** 2 / ((n - 2) * (n - 3)))
+        return pd.DataFrame(
+            {"count": n, "mean": self.mean, "variance": variance,
+             "skew": np.where(n > 2, skew, np.nan), "kurtosis": np.where(n > 3, kurtosis, np.nan)},
+            index=pd.Index(self.numeric_columns),
+        )
+
+    def _centred_pairs(self):
+        n = self.pair_count
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cross = self.pair_cross - self.pair_sum * self.pair_sum.T / n
+            sum_sq = self.pair_sum_sq - self.pair_sum**2 / n
+        return n, cross, sum_sq
+
+    def covariance(self, min_periods: int = 2) -> pd.DataFrame:
+        """pairwise complete covariance, df.cov()"""
+        n, cross, _ = self._centred_pairs()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cov = np.where(n >= max(min_periods, 2), cross / (n - 1), np.nan)
+        return pd.DataFrame(cov, index=self.numeric_columns, columns=self.numeric_columns)
+
+    def correlation(self, min_periods: int = 1) -> pd.DataFrame:
+        """pairwise complete pearson correlation, df.corr()"""
+        n, cross, sum_sq = self._centred_pairs()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            corr = np.clip(cross / np.sqrt(sum_sq * sum_sq.T), -1, 1)
+        corr = np.where(n >= max(min_periods, 2), corr, np.nan)
+        return pd.DataFrame(corr, index=self.numeric_columns, columns=self.numeric_columns)
+
+
+class DataProfiler:
+    """
+    profiles frames and caches the results by fingerprint
+
+    a frame seen before is answered from the cache. a frame whose first
+    rows are a profiled frame, e.g. yesterday's data with tonight's rows
+    appended, reuses that profile and only the new rows are read. profiles
+    live in memory and, with a cache_dir, on disk (least recently used
+    evicted past max_entries), so the next process picks them up too
+    """
+
+    def __init__(self, cache_dir: str = None, max_entries: int = 32, sample_rows: int = 10_000, compression: int = 200):
+        """
+        parameters -
+        cache_dir(str)- where profiles are pickled, None keeps them in memory only
+        max_entries(int)- profiles kept in memory and on disk
+        sample_rows(int)- rows hashed for a fingerprint, None hashes every row
+        compression(int)- size of the quantile digests
+        """
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.sample_rows = sample_rows
+        self.compression = compression
+        self._profiles = OrderedDict()
+
+    def _entry_path(self, profile: DataProfile) -> str:
+        # schema and row count in the name, looking for a prefix does not have to unpickle anything
+        return os.path.join(self.cache_dir, f"{profile.schema}-{profile.n_rows}-{profile.fingerprint}.pkl")
+
+    def _remember(self, profile: DataProfile):
+        self._profiles[profile.fingerprint] = profile
+        self._profiles.move_to_end(profile.fingerprint)
+        while len(self._profiles) > self.max_entries:
+            self._profiles.popitem(last=False)
+
+        if self.cache_dir is None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._entry_path(profile)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(profile, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self):
+        entries = sorted(
+            (os.stat(os.path.join(self.cache_dir, name)).st_mtime, name)
+            for name in os.listdir(self.cache_dir)
+            if name.endswith(".pkl")
+        )
+        for _, name in entries[: max(len(entries) - self.max_entries, 0)]:
+            os.remove(os.path.join(self.cache_dir, name))
+
+    def _stored(self, schema: str):
+        """(n_rows, fingerprint, loader) of every cached profile with this schema"""
+        for profile in self._profiles.values():
+            if profile.schema == schema:
+                yield profile.n_rows, profile.fingerprint, lambda profile=profile: profile
+        if self.cache_dir is None or not os.path.isdir(self.cache_dir):
+            return
+        for name in os.listdir(self.cache_dir):
+            parts = name[: -len(".pkl")].split("-") if name.endswith(".pkl") else []
+            if len(parts) == 3 and parts[0] == schema and parts[2] not in self._profiles:
+                yield int(parts[1]), parts[2], lambda name=name: self._load(name)
+
+    def _load(self, name: str) -> DataProfile:
+        path = os.path.join(self.cache_dir, name)
+        with open(path, "rb") as f:
+            profile = pickle.load(f)
+        os.utime(path)
+        return profile
+
+    def profile(self, df: pd.DataFrame) -> DataProfile:
+        """the profile of df, from the cache, extended from a cached prefix or computed from scratch"""
+        schema = _schema_hash(df)
+        key = fingerprint(df, sample_rows=self.sample_rows)
+
+        stored = sorted(self._stored(schema), key=lambda entry: entry[0], reverse=True)
+        for _, stored_key, load in stored:
+            if stored_key == key:
+                logging.info("data profile cache hit")
+                profile = load()
+                self._remember(profile)
+                return profile
+
+        for n_rows, stored_key, load in stored:
+            if n_rows < len(df) and fingerprint(df, n_rows, self.sample_rows) == stored_key:
+                logging.info(f"data profile extended from {n_rows} cached rows with {len(df) - n_rows} new rows")
+                # the cached profile stays valid for the shorter frame, update a copy
+                profile = copy.deepcopy(load()).update(df.iloc[n_rows:])
+                break
+        else:
+            logging.info(f"data profile cache miss, profiling {len(df)} rows")
+            profile = DataProfile(df, self.compression).update(df, exact_quantiles=True)
+
+        profile.fingerprint = key
+        self._remember(profile)
+        return profile
+
+    def append(self, profile: DataProfile, new_rows: pd.DataFrame, df: pd.DataFrame = None) -> DataProfile:
+        """
+        profile.update on a copy, for callers that know new_rows were appended.
+        with the combined frame df the result is cached under its fingerprint
+        """
+        extended = copy.deepcopy(profile).update(new_rows)
+        extended.fingerprint = None
+        if df is not None:
+            extended.fingerprint = fingerprint(df, sample_rows=self.sample_rows)
+            self._remember(extended)
+        return extended
+
+
+_PROFILER = None
+
+
+def get_data_profiler() -> DataProfiler:
+    """
+    the shared profiler, cached on disk in DATA_PROFILE_CACHE_DIR (.profile_cache at the repo root),
+    memory only if DATA_PROFILE_CACHE_DISABLE is set
+    """
+    global _PROFILER
+    if _PROFILER is None:
+        cache_dir = None if os.environ.get("DATA_PROFILE_CACHE_DISABLE") else os.environ.get("DATA_PROFILE_CACHE_DIR", DEFAULT_CACHE_DIR)
+        _PROFILER = DataProfiler(cache_dir=cache_dir)
+    return _PROFILER
@@ -1,34 +1,148 @@
 from abc import ABC, abstractmethod
+import numpy as np
 import pandas as pd
-from sklearn.model_selection import train_test_split
+from sklearn.model_selection import GroupShuffleSplit, train_test_split
 import source.data_splitter
 import logging
 
+from source.instrumentation import instrumented
+from source.log_config import configure_logging
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+configure_logging()
 
 class DataSplitting(ABC):
     @abstractmethod
     def split_data(self, df:pd.DataFrame, target_column:str):
         pass
 
+    @abstractmethod
+    def split_indices(self, df: pd.DataFrame, target_column: str):
+        """
+        positional (train, test) int arrays instead of copied frames, callers
+        slice lazily with df.iloc or take_split when they need the rows
+        """
+        pass
+
+
+def take_split(df: pd.DataFrame, target_column: str, train_idx: np.ndarray, test_idx: np.ndarray):
+    """
+    x_train, x_test, y_train, y_test from positional indices
+
+    every row is copied once into its part, no intermediate copy of the
+    whole frame without the target like df.drop + train_test_split makes
+    """
+    target = df.columns.get_loc(target_column)
+    features = np.delete(np.arange(df.shape[1]), target)
+    return (
+        df.iloc[train_idx, features],
+        df.iloc[test_idx, features],
+        df.iloc[train_idx, target],
+        df.iloc[test_idx, target],
+    )
+
 
 class SimpleTrainTestSpliter(DataSplitting):
     def __init__(self, test_size=0.2, random_state=42):
         self.test_size = test_size
         self.random_state = random_state
 
+    def split_indices(self, df: pd.DataFrame, target_column: str):
+        # shuffling only depends on the row count, so this is the same split train_test_split(x, y) gives
+        return train_test_split(np.arange(len(df)), test_size=self.test_size, random_state=self.random_state)
+
     def split_data(self, df: pd.DataFrame, target_column:str):
         logging.info("performing simple train test split")
-        x = df.drop(columns=[target_column])
-        y = df[target_column]
+        train_idx, test_idx = self.split_indices(df, target_column)
 
-        x_train, x_test, y_train, y_test = train_test_split(x, y, test_size=self.test_size, random_state=self.random_state)
+        x_train, x_test, y_train, y_test = take_split(df, target_column, train_idx, test_idx)
 
         logging.info("simple train test split completed")
         return x_train, x_test, y_train, y_test
 
 
+class StratifiedTrainTestSplitter(DataSplitting):
+    """train test split keeping the distribution of the target, binned by quantiles"""
+
+    def __init__(self, test_size=0.2, n_bins=10, random_state=42):
+        self.test_size = test_size
+        self.n_bins = n_bins
+        self.random_state = random_state
+
+    def split_indices(self, df: pd.DataFrame, target_column: str):
+        # quantile bins hold about len(df) / n_bins rows each, duplicate edges are merged
+        bins = pd.qcut(df[target_column], q=self.n_bins, labels=False, duplicates="drop")
+        bins = bins.fillna(-1).to_numpy()
+        return train_test_split(
+            np.arange(len(df)), test_size=self.test_size, random_state=self.random_state, stratify=bins
+        )
+
+    def split_data(self, df: pd.DataFrame, target_column: str):
+        logging.info(f"performing train test split stratified on {self.n_bins} bins of {target_column}")
+        return take_split(df, target_column, *self.split_indices(df, target_column))
+
+
+class GroupedTrainTestSplitter(DataSplitting):
+    """train test split where every group (e.g. neighborhood) ends up entirely on one side"""
+
+    def __init__(self, group_column="Neighborhood", test_size=0.2, random_state=42):
+        self.group_column = group_column
+        self.test_size = test_size
+        self.random_state = random_state
+
+    def split_indices(self, df: pd.DataFrame, target_column: str):
+        if self.group_column not in df.columns:
+            raise ValueError(f"group column {self.group_column} not found in dataset")
+
+        # test_size is the share of groups, not of rows
+        groups = pd.factorize(df[self.group_column])[0]
+        splitter = GroupShuffleSplit(n_splits=1, test_size=self.test_size, random_state=self.random_state)
+        return next(splitter.split(np.empty(len(df)), groups=groups))
+
+    def split_data(self, df: pd.DataFrame, target_column: str):
+        logging.info(f"performing train test split grouped by {self.group_column}")
+        return take_split(df, target_column, *self.split_indices(df, target_column))
+
+
+class TimeBasedTrainTestSplitter(DataSplitting):
+    """the most recent sales are the test set, so the model is scored on its future"""
+
+    def __init__(self, year_column="Yr Sold", month_column="Mo Sold", test_size=0.2):
+        self.year_column = year_column
+        self.month_column = month_column
+        self.test_size = test_size
+
+    def split_indices(self, df: pd.DataFrame, target_column: str):
+        for column in (self.year_column, self.month_column):
+            if column not in df.columns:
+                raise ValueError(f"time column {column} not found in dataset")
+
+        period = df[self.year_column].to_numpy(dtype=np.float64) * 12 + df[self.month_column].to_numpy(dtype=np.float64)
+
+        # rows without a sale date can't be placed in time, they go to neither side
+        dated = np.flatnonzero(~np.isnan(period))
+        if len(dated) == 0:
+            raise ValueError(f"no rows with both {self.year_column} and {self.month_column} set")
+        if len(dated) < len(df):
+            logging.warning(f"dropping {len(df) - len(dated)} rows without a sale date from the time based split")
+        order = dated[np.argsort(period[dated], kind="stable")]
+
+        # cut at a month boundary, a month is never split between train and test
+        cutoff = period[order[min(int(np.ceil(len(order) * (1 - self.test_size))), len(order) - 1)]]
+        is_test = period[order] >= cutoff
+        if is_test.all() or not is_test.any():
+            # the cutoff landed on the first month, e.g. every dated row was sold in the same month
+            raise ValueError(
+                f"time based split of {len(order)} rows over {len(np.unique(period[order]))} months "
+                f"leaves the {'train' if is_test.all() else 'test'} set empty"
+            )
+        return order[~is_test], order[is_test]
+
+    def split_data(self, df: pd.DataFrame, target_column: str):
+        logging.info(f"performing time based train test split on {self.year_column}/{self.month_column}")
+        return take_split(df, target_column, *self.split_indices(df, target_column))
+
+
 class DataSplitter:
     def __init__(self, strategy:DataSplitting):
         self.strategy = strategy
@@ -36,6 +150,11 @@ class DataSplitter:
     def set_strategy(self, strategy:DataSplitting):
         self.strategy = strategy
 
+    @instrumented
     def split(self, df:pd.DataFrame, target_column:str):
         logging.info("splitting data using selected strategy")
-        return self.strategy.split_data(df, target_column)                    
\ No newline at end of file
+        return self.strategy.split_data(df, target_column)
+
+    @instrumented
+    def split_indices(self, df: pd.DataFrame, target_column: str):
+        return self.strategy.split_indices(df, target_column)                    
\ No newline at end of file
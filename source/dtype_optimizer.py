@@ -0,0 +1,135 @@
+import logging
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from source.log_config import configure_logging
+
+configure_logging()
+
+# smallest first, the first one holding a column's min and max wins
+_INTEGER_TYPES = [np.int8, np.int16, np.int32, np.int64]
+
+
+class DtypeOptimizer:
+    """
+    shrink a freshly ingested frame to the smallest dtypes that keep every value
+
+    - integer columns, and float columns holding only whole numbers, get the
+      smallest signed int holding their min and max
+    - float columns become float32 only with downcast_floats and only if
+      every value survives the round trip exactly
+    - string columns with at most category_threshold unique values per row
+      become category
+
+    last_report_ has the bytes before/after and every changed column
+    """
+
+    def __init__(self, category_threshold: float = 0.5, downcast_floats: bool = False, exclude: list = None):
+        """
+        parameters -
+        category_threshold(float)- largest unique/rows ratio turned into a category
+        downcast_floats(bool)- also try float32, off because float32 sums are less precise
+        exclude(list)- columns left as they are, e.g. the target
+        """
+        self.category_threshold = category_threshold
+        self.downcast_floats = downcast_floats
+        self.exclude = set(exclude or [])
+        self.last_report_ = None
+
+    def _integer_type(self, column: pd.Series):
+        if len(column) == 0:
+            return None
+        low, high = column.min(), column.max()
+        for candidate in _INTEGER_TYPES:
+            info = np.iinfo(candidate)
+            if info.min <= low and high <= info.max:
+                return candidate if np.dtype(candidate) != column.dtype else None
+        return None
+
+    def _target_dtype(self, column: pd.Series):
+        dtype = column.dtype
+        if pd.api.types.is_bool_dtype(dtype) or isinstance(dtype, pd.CategoricalDtype):
+            return None
+
+        if pd.api.types.is_integer_dtype(dtype) and isinstance(dtype, np.dtype):
+            return self._integer_type(column)
+
+        if pd.api.types.is_float_dtype(dtype) and isinstance(dtype, np.dtype) and len(column) and not column.hasnans:
+            # whole numbers read as float (chunked reads pin numeric columns to float64) go back to ints
+            values = column.to_numpy()
+            if np.isfinite(values).all() and (values == np.round(values)).all():
+                return self._integer_type(column)
+
+        if pd.api.types.is_float_dtype(dtype) and dtype == np.float64 and self.downcast_floats:
+            values = column.to_numpy()
+            narrowed = values.astype(np.float32)
+            exact = (narrowed.astype(np.float64) == values) | np.isnan(values)
+            return np.float32 if exact.all() else None
+
+        if pd.api.types.is_string_dtype(dtype) or dtype == object:
+            non_null = column.count()
+            if non_null and column.nunique() / len(column) <= self.category_threshold:
+                return "category"
+        return None
+
+    def shrink_chunk(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        """
+        text columns of one chunk to category before it is kept around, the
+        bulk of the savings. concat the chunks with concat_chunks and run
+        optimize on the result for the rest
+        """
+        text = [
+            name for name, dtype in chunk.dtypes.items()
+            if name not in self.exclude and (pd.api.types.is_string_dtype(dtype) or dtype == object)
+            and not isinstance(dtype, pd.CategoricalDtype)
+        ]
+        return chunk.astype({name: "category" for name in text}) if text else chunk
+
+    def optimize(self, df: pd.DataFrame) -> pd.DataFrame:
+        bytes_before = int(df.memory_usage(deep=True).sum())
+
+        changes = {}
+        for name in df.columns:
+            if name in self.exclude:
+                continue
+            target = self._target_dtype(df[name])
+            if target is not None:
+                changes[name] = target
+
+        # one astype call for all changed columns, untouched columns are not copied under copy on write
+        optimized = df.astype(changes) if changes else df.copy()
+        bytes_after = int(optimized.memory_usage(deep=True).sum())
+
+        self.last_report_ = {
+            "bytes_before": bytes_before,
+            "bytes_after": bytes_after,
+            "ratio": bytes_before / bytes_after if bytes_after else None,
+            "columns": {name: [str(df[name].dtype), str(optimized[name].dtype)] for name in changes},
+        }
+        logging.info(
+            "dtype optimisation: %d -> %d bytes (%.1fx smaller), %d columns changed",
+            bytes_before, bytes_after, self.last_report_["ratio"] or 0, len(changes),
+        )
+        return optimized
+
+
+def concat_chunks(chunks: list) -> pd.DataFrame:
+    """
+    pd.concat(chunks, ignore_index=True) that keeps category columns
+    categorical, plain concat falls back to object when the chunks saw
+    different categories
+    """
+    categorical = [name for name, dtype in chunks[0].dtypes.items() if isinstance(dtype, pd.CategoricalDtype)]
+    if categorical and len(chunks) > 1:
+        categories = {
+            name: union_categoricals([chunk[name] for chunk in chunks], ignore_order=True).categories
+            for name in categorical
+        }
+        chunks = [
+            chunk.astype({name: pd.CategoricalDtype(values) for name, values in categories.items()})
+            for chunk in chunks
+        ]
+    return pd.concat(chunks, ignore_index=True)
+
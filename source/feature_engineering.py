@@ -2,88 +2,446 @@ import logging
 import pandas as pd
 from abc import ABC, abstractmethod
 import numpy as np
-from sklearn.preprocessing import MinMaxScaler, OneHotEncoder, StandardScaler
+from scipy import sparse
 
+from source.instrumentation import instrumented
+from source.log_config import configure_logging
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+configure_logging()
 
 class FeatureEngineering(ABC):
+    # fit learns whatever statistics the strategy needs, transform only applies them,
+    # so an inference batch is never used to re-fit the training statistics
+    def fit(self, df:pd.DataFrame) -> "FeatureEngineering":
+        return self
+
     @abstractmethod
+    def transform(self, df:pd.DataFrame) -> pd.DataFrame:
+        pass
+
     def apply_transformation(self,df:pd.DataFrame) -> pd.DataFrame:
+        return self.fit(df).transform(df)
+
+    def get_state(self) -> dict:
+        """fitted parameters as a dict of numpy arrays"""
+        return {"features": np.asarray(self.features, dtype=str)}
+
+    def set_state(self, state: dict):
+        self.features = state["features"].tolist()
+
+    def save_state(self, path: str):
+        np.savez(path, **self.get_state())
+
+    def load_state(self, path: str) -> "FeatureEngineering":
+        with np.load(path, allow_pickle=False) as data:
+            self.set_state({key: data[key] for key in data.files})
+        return self
+
+
+class ColumnwiseTransformation(FeatureEngineering):
+    # numeric strategies that work column by column on a float64 block
+
+    def fit(self, df:pd.DataFrame) -> "FeatureEngineering":
+        self._fit_array(df[self.features].to_numpy(dtype=np.float64))
+        return self
+
+    def transform(self, df:pd.DataFrame) -> pd.DataFrame:
+        df_transformed = df.copy()
+        values = df[self.features].to_numpy(dtype=np.float64, copy=True)
+        self._transform_array(values)
+        df_transformed[self.features] = values
+        return df_transformed
+
+    def _fit_array(self, values: np.ndarray):
         pass
 
-class LogTransformation(FeatureEngineering):
+    @abstractmethod
+    def _transform_array(self, values: np.ndarray):
+        """transform the (rows, features) float64 array in place"""
+        pass
+
+    def _check_fitted(self, *attributes):
+        if any(getattr(self, attribute, None) is None for attribute in attributes):
+            raise ValueError(f"{type(self).__name__} has not been fitted")
+
+
+class LogTransformation(ColumnwiseTransformation):
     def __init__(self,features):
         self.features = features
 # for handling skewness
 
-    def apply_transformation(self, df:pd.DataFrame) -> pd.DataFrame:
+    def transform(self, df:pd.DataFrame) -> pd.DataFrame:
         logging.info(f"Applying log Transformation on {self.features}")
-        df_transformed = df.copy()
-        for feature in self.features:
-            df_transformed[feature] = np.log1p(df_transformed[feature])
-        logging.info("log transformation applied")    
+        df_transformed = super().transform(df)
+        logging.info("log transformation applied")
         return df_transformed
 
+    def _transform_array(self, values: np.ndarray):
+        np.log1p(values, out=values)
+
 
 
-class StandardScaling(FeatureEngineering):
+class StandardScaling(ColumnwiseTransformation):
     def __init__(self,features):
         self.features = features
-        self.scaler = StandardScaler()
+        self.mean_ = None
+        self.scale_ = None
 
-    def apply_transformation(self, df:pd.DataFrame) -> pd.DataFrame:
+    def _fit_array(self, values: np.ndarray):
+        self.mean_ = np.nanmean(values, axis=0)
+        scale = np.nanstd(values, axis=0)
+        # constant columns are left centred instead of divided by zero
+        scale[scale == 0] = 1.0
+        self.scale_ = scale
+
+    def transform(self, df:pd.DataFrame) -> pd.DataFrame:
         logging.info(f"Applying Standard Scaling on {self.features}")
-        df_transformed = df.copy()
-        df_transformed[self.features] = self.scaler.fit_transform(df_transformed[self.features])
+        df_transformed = super().transform(df)
         logging.info("Standard Scaling applied")
         return df_transformed
 
-class MinMaxScaling(FeatureEngineering):
+    def _transform_array(self, values: np.ndarray):
+        self._check_fitted("mean_", "scale_")
+        values -= self.mean_
+        values /= self.scale_
+
+    def get_state(self) -> dict:
+        self._check_fitted("mean_", "scale_")
+        return {**super().get_state(), "mean": self.mean_, "scale": self.scale_}
+
+    def set_state(self, state: dict):
+        super().set_state(state)
+        self.mean_ = state["mean"]
+        self.scale_ = state["scale"]
+
+class MinMaxScaling(ColumnwiseTransformation):
     def __init__(self,features, feature_range=(0,1)):
         self.features = features
-        self.scaler = MinMaxScaler(feature_range=feature_range)
+        self.feature_range = feature_range
+        self.scale_ = None
+        self.min_ = None
 
+    def _fit_array(self, values: np.ndarray):
+        data_min = np.nanmin(values, axis=0)
+        data_range = np.nanmax(values, axis=0) - data_min
+        data_range[data_range == 0] = 1.0
+        low, high = self.feature_range
+        # x * scale + min maps [data_min, data_max] onto feature_range
+        self.scale_ = (high - low) / data_range
+        self.min_ = low - data_min * self.scale_
 
-    def apply_transformation(self, df:pd.DataFrame) -> pd.DataFrame:
+
+    def transform(self, df:pd.DataFrame) -> pd.DataFrame:
         logging.info(f"Applying Min Max Scaling on {self.features}")
-        df_transformed = df.copy()
-        df_transformed[self.features] = self.scaler.fit_transform(df_transformed[self.features])
+        df_transformed = super().transform(df)
         logging.info("MinMax Scaling applied")
         return df_transformed
 
+    def _transform_array(self, values: np.ndarray):
+        self._check_fitted("scale_", "min_")
+        values *= self.scale_
+        values += self.min_
+
+    def get_state(self) -> dict:
+        self._check_fitted("scale_", "min_")
+        return {
+            **super().get_state(),
+            "feature_range": np.asarray(self.feature_range, dtype=np.float64),
+            "scale": self.scale_,
+            "min": self.min_,
+        }
+
+    def set_state(self, state: dict):
+        super().set_state(state)
+        self.feature_range = tuple(state["feature_range"].tolist())
+        self.scale_ = state["scale"]
+        self.min_ = state["min"]
+
+
+def _as_str(column: pd.Series) -> np.ndarray:
+    # numpy str conversion turns missing values into "nan" on every pandas version
+    return np.asarray(column.to_numpy(dtype=object), dtype=str)
+
 
 class OneHotEncoding(FeatureEngineering):
-    def __init__(self, features):
-        self.features = features 
-        self.encoder = OneHotEncoder(sparse = False, drop = "first")
+    def __init__(self, features, sparse=False, hashing=False, n_features=1024):
+        """
+        parameters -
+        sparse(bool)- return sparse columns instead of a dense float block
+        hashing(bool)- hash "feature=value" into n_features columns instead of
+                       learning a vocabulary, for unbounded cardinality
+        n_features(int)- width of the hashed space
+        """
+        self.features = features
+        self.sparse = sparse
+        self.hashing = hashing
+        self.n_features = n_features
+        self.categories_ = None
+        self._lookups = None
 
-    def apply_transformation(self, df:pd.DataFrame) -> pd.DataFrame:
+    def fit(self, df:pd.DataFrame) -> "FeatureEngineering":
+        if self.hashing:
+            self.categories_ = []
+        else:
+            self.categories_ = [
+                np.unique(_as_str(df[feature])) for feature in self.features
+            ]
+        self._build_lookups()
+        return self
+
+    def _build_lookups(self):
+        # hash table from category to integer code, reused for every transform call
+        self._lookups = [pd.Index(categories) for categories in self.categories_]
+
+    def _check_fitted(self):
+        if self.categories_ is None:
+            raise ValueError("OneHotEncoding has not been fitted")
+
+    def get_feature_names_out(self) -> list:
+        self._check_fitted()
+        if self.hashing:
+            return [f"hash_{i}" for i in range(self.n_features)]
+        # first category of every feature is dropped, same as drop="first"
+        return [
+            f"{feature}_{category}"
+            for feature, categories in zip(self.features, self.categories_)
+            for category in categories[1:]
+        ]
+
+    def _encode_sparse(self, df:pd.DataFrame) -> sparse.csr_matrix:
+        self._check_fitted()
+        n_rows = len(df)
+        rows, cols = [], []
+
+        if self.hashing:
+            for feature in self.features:
+                keyed = np.char.add(f"{feature}=", _as_str(df[feature])).astype(object)
+                rows.append(np.arange(n_rows))
+                cols.append((pd.util.hash_array(keyed) % np.uint64(self.n_features)).astype(np.int64))
+            width = self.n_features
+        else:
+            offset = 0
+            for feature, lookup in zip(self.features, self._lookups):
+                # unseen categories get code -1, the first category code 0 is dropped
+                codes = lookup.get_indexer(_as_str(df[feature]))
+                keep = codes > 0
+                rows.append(np.flatnonzero(keep))
+                cols.append(offset + codes[keep] - 1)
+                offset += max(len(lookup) - 1, 0)
+            width = offset
+
+        rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+        cols = np.concatenate(cols) if cols else np.empty(0, dtype=np.int64)
+        data = np.ones(len(rows), dtype=np.float64)
+        # duplicates only happen on hash collisions and are summed
+        return sparse.coo_matrix((data, (rows, cols)), shape=(n_rows, width)).tocsr()
+
+    def _encoded_frame(self, df:pd.DataFrame) -> pd.DataFrame:
+        encoded = self._encode_sparse(df)
+        columns = self.get_feature_names_out()
+        if self.sparse:
+            # built column by column, DataFrame.sparse.from_spmatrix uses a nan fill value on pandas 3
+            encoded = encoded.tocsc()
+            return pd.DataFrame(
+                {column: pd.arrays.SparseArray.from_spmatrix(encoded[:, [i]]) for i, column in enumerate(columns)},
+                index=df.index,
+            )
+        return pd.DataFrame(encoded.toarray(), columns=columns, index=df.index)
+
+    def transform(self, df:pd.DataFrame) -> pd.DataFrame:
         logging.info(f"Applying One Hot Encoding on {self.features}")
-        df_transformed = df.copy()
-        encoded_df = pd.DataFrame(
-            self.encoder.fit_transform(df[self.features]),
-            columns = self.encoder.get_feature_names_out(self.features)
-        )
-        df_transformed = df_transformed.drop(columns=self.features)
+        encoded_df = self._encoded_frame(df)
 
-        df_transformed = pd.concat([df_transformed, encoded_df],inplace=True)
+        df_transformed = df.drop(columns=self.features)
+        df_transformed = pd.concat([df_transformed, encoded_df], axis=1)
         logging.info("onehot encoding is completed")
         return df_transformed
 
+    def transform_sparse(self, df:pd.DataFrame) -> sparse.csr_matrix:
+        """
+        encode straight into a csr matrix for estimators that accept sparse input
+        (e.g. LinearRegression), the remaining columns must be numeric and come first
+        """
+        remaining = df.drop(columns=self.features)
+        numeric = sparse.csr_matrix(remaining.to_numpy(dtype=np.float64))
+        return sparse.hstack([numeric, self._encode_sparse(df)], format="csr")
+
+    def get_state(self) -> dict:
+        self._check_fitted()
+        state = super().get_state()
+        state["hashing"] = np.asarray(self.hashing)
+        state["n_features"] = np.asarray(self.n_features)
+        for i, categories in enumerate(self.categories_):
+            state[f"categories_{i}"] = categories.astype(str)
+        return state
+
+    def set_state(self, state: dict):
+        super().set_state(state)
+        self.hashing = bool(state["hashing"])
+        self.n_features = int(state["n_features"])
+        if self.hashing:
+            self.categories_ = []
+        else:
+            self.categories_ = [state[f"categories_{i}"] for i in range(len(self.features))]
+        self._build_lookups()
+
+
+class FeatureEngineeringPipeline(FeatureEngineering):
+    """
+    run an ordered list of strategies as one fused pass
+
+    the numeric columns touched by any column-wise strategy are copied once into
+    a contiguous float64 block and every column-wise strategy is applied to that
+    block in place, one hot encodings are computed from the untouched categorical
+    columns and everything is assembled into a single output frame. chaining the
+    strategies one by one would copy the whole frame once per strategy.
+    """
+
+    def __init__(self, strategies: list):
+        for strategy in strategies:
+            if not isinstance(strategy, (ColumnwiseTransformation, OneHotEncoding)):
+                raise ValueError(f"{type(strategy).__name__} can not be fused into a pipeline")
+        self.strategies = strategies
+        self.last_report_ = None
+
+    @property
+    def features(self) -> list:
+        return [feature for strategy in self.strategies for feature in strategy.features]
+
+    def _plan(self, df:pd.DataFrame):
+        numeric_columns = []
+        encoded_columns = []
+        for strategy in self.strategies:
+            target = encoded_columns if isinstance(strategy, OneHotEncoding) else numeric_columns
+            for feature in strategy.features:
+                if feature not in df.columns:
+                    raise ValueError(f"feature {feature} not found in dataset")
+                if feature not in target:
+                    target.append(feature)
+
+        overlap = set(numeric_columns) & set(encoded_columns)
+        if overlap:
+            raise ValueError(f"features {sorted(overlap)} are both scaled and one hot encoded")
+
+        return numeric_columns, encoded_columns
+
+    def _run(self, df:pd.DataFrame, fit: bool) -> pd.DataFrame:
+        numeric_columns, encoded_columns = self._plan(df)
+        position = {column: i for i, column in enumerate(numeric_columns)}
+
+        # the one buffer all column-wise strategies write into, fortran order keeps columns contiguous
+        block = np.empty((len(df), len(numeric_columns)), dtype=np.float64, order="F")
+        for i, column in enumerate(numeric_columns):
+            block[:, i] = df[column].to_numpy(dtype=np.float64)
+        allocated = block.nbytes
+        naive = 0
+        frame_bytes = int(df.memory_usage(index=True).sum())
+
+        encoded_frames = []
+        for strategy in self.strategies:
+            if isinstance(strategy, OneHotEncoding):
+                if fit:
+                    strategy.fit(df)
+                encoded = strategy._encoded_frame(df)
+                encoded_frames.append(encoded)
+                encoded_bytes = int(encoded.memory_usage(index=False).sum())
+                allocated += encoded_bytes
+                frame_bytes += encoded_bytes
+                naive += frame_bytes
+                continue
+
+            indices = [position[feature] for feature in strategy.features]
+            contiguous = indices == list(range(indices[0], indices[0] + len(indices))) if indices else True
+            if contiguous and indices:
+                values = block[:, indices[0]:indices[0] + len(indices)]
+            else:
+                # non adjacent columns need a temporary gather and scatter back
+                values = block[:, indices]
+                allocated += values.nbytes
+
+            if fit:
+                strategy._fit_array(values)
+            strategy._transform_array(values)
+
+            if not (contiguous and indices):
+                block[:, indices] = values
+
+            # the unfused strategy copies the whole frame plus its own float block
+            naive += frame_bytes + values.nbytes
+
+        untouched = df.drop(columns=numeric_columns + encoded_columns)
+        numeric_df = pd.DataFrame(block, columns=numeric_columns, index=df.index)
+        allocated += int(untouched.memory_usage(index=False).sum())
+
+        df_transformed = pd.concat([untouched, numeric_df] + encoded_frames, axis=1)
+        column_order = [c for c in df.columns if c not in encoded_columns]
+        column_order += [c for frame in encoded_frames for c in frame.columns]
+        df_transformed = df_transformed[column_order]
+
+        self.last_report_ = {"allocated_bytes": allocated, "naive_bytes": naive, "strategies": len(self.strategies)}
+        logging.info(f"fused {len(self.strategies)} strategies, allocated {allocated} bytes vs {naive} bytes for the unfused chain")
+        return df_transformed
+
+    def fit(self, df:pd.DataFrame) -> "FeatureEngineering":
+        self._run(df, fit=True)
+        return self
+
+    def transform(self, df:pd.DataFrame) -> pd.DataFrame:
+        return self._run(df, fit=False)
+
+    def apply_transformation(self, df:pd.DataFrame) -> pd.DataFrame:
+        # fitting already produces the transformed frame, no need for a second pass
+        return self._run(df, fit=True)
+
+    def get_state(self) -> dict:
+        state = {}
+        for i, strategy in enumerate(self.strategies):
+            for key, value in strategy.get_state().items():
+                state[f"step{i}__{key}"] = value
+        return state
+
+    def set_state(self, state: dict):
+        for i, strategy in enumerate(self.strategies):
+            prefix = f"step{i}__"
+            strategy.set_state({key[len(prefix):]: value for key, value in state.items() if key.startswith(prefix)})
+
 
 class FeatureEngineer:
     def __init__(self, strategy: FeatureEngineering):
-        self.strategy = strategy   
+        # a list of strategies is planned and run as one fused pass
+        if isinstance(strategy, (list, tuple)):
+            strategy = FeatureEngineeringPipeline(list(strategy))
+        self.strategy = strategy
 
     def set_strategy(self, strategy: FeatureEngineering):
         logging.info(f"switching startegy to {self.strategy}")
-        self.strategy = strategy 
+        if isinstance(strategy, (list, tuple)):
+            strategy = FeatureEngineeringPipeline(list(strategy))
+        self.strategy = strategy
 
 
+    @instrumented
     def apply_feature_engineering(self, df:pd.DataFrame) -> pd.DataFrame:
         logging.info("applying feature engineering")
         return self.strategy.apply_transformation(df)
 
+    @instrumented
+    def fit(self, df:pd.DataFrame) -> "FeatureEngineer":
+        logging.info("fitting feature engineering")
+        self.strategy.fit(df)
+        return self
+
+    @instrumented
+    def transform(self, df:pd.DataFrame) -> pd.DataFrame:
+        logging.info("transforming with fitted feature engineering")
+        return self.strategy.transform(df)
+
+    def save_state(self, path: str):
+        self.strategy.save_state(path)
+
+    def load_state(self, path: str) -> "FeatureEngineer":
+        self.strategy.load_state(path)
+        return self
+
 
-                   
\ No newline at end of file
@@ -1,9 +1,14 @@
+import json
 import logging
+import warnings
 from abc import ABC, abstractmethod
+import numpy as np
 import pandas as pd
-from Analysis.basic_data_inspection import DataInspectionStrategy
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+from source.instrumentation import instrumented
+from source.log_config import configure_logging
+
+configure_logging()
 
 class MissingValuesHandling(ABC):  # reason of ABC is to any subclass which going to inherite this class must implement this method
     @abstractmethod
@@ -31,37 +36,141 @@ class DropMissingValues(MissingValuesHandling):
         return df_cleaned
 
 
+def _column_mode(column: pd.Series):
+    """most frequent value of a column, ties go to the smallest value like Series.mode"""
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        # categoricals already carry integer codes, no hashing needed
+        codes, uniques = column.cat.codes.to_numpy(), column.cat.categories
+    else:
+        codes, uniques = pd.factorize(column, sort=False)
+
+    codes = codes[codes >= 0]
+    if len(codes) == 0:
+        return np.nan
+
+    counts = np.bincount(codes, minlength=len(uniques))
+    tied = uniques[np.flatnonzero(counts == counts.max())]
+    try:
+        return min(tied)
+    except TypeError:
+        return tied[0]
+
+
+class ImputationStatistics:
+    """mean, median and mode of every column computed together so inference can reuse them"""
+
+    def __init__(self):
+        self.mean = None
+        self.median = None
+        self.mode = None
+        self.only_missing = False
+
+    def fit(self, df:pd.DataFrame, methods=("mean", "median", "mode"), only_missing=False) -> "ImputationStatistics":
+        """
+        only_missing=True skips the columns without gaps, enough to fill df itself
+        but not to be saved, at inference any column can have gaps
+        """
+        self.only_missing = only_missing
+        columns = df.columns[df.isna().any().to_numpy()] if only_missing else df.columns
+        numeric_columns = df[columns].select_dtypes(include="number").columns
+
+        if "mean" in methods or "median" in methods:
+            # mean and median share one float64 copy of the numeric block
+            numeric = df[numeric_columns].to_numpy(dtype=np.float64)
+            with warnings.catch_warnings():
+                # all missing columns just get a nan statistic
+                warnings.simplefilter("ignore", category=RuntimeWarning)
+                if "mean" in methods:
+                    self.mean = pd.Series(np.nanmean(numeric, axis=0), index=numeric_columns)
+                if "median" in methods:
+                    self.median = pd.Series(np.nanmedian(numeric, axis=0), index=numeric_columns)
+
+        if "mode" in methods:
+            self.mode = pd.Series({column: _column_mode(df[column]) for column in columns}, dtype=object)
+        return self
+
+    def fill_values(self, method: str) -> pd.Series:
+        if method not in ("mean", "median", "mode"):
+            raise ValueError(f"unknown imputation method {method}")
+        values = getattr(self, method)
+        if values is None:
+            raise ValueError(f"{method} statistics have not been fitted")
+        return values.dropna()
+
+    def save(self, path: str):
+        if self.only_missing:
+            raise ValueError("statistics fitted with only_missing=True do not cover every column, refit before saving")
+
+        def to_dict(series: pd.Series) -> dict:
+            if series is None:
+                return None
+            return {column: (value.item() if hasattr(value, "item") else value) for column, value in series.dropna().items()}
+
+        with open(path, "w") as f:
+            json.dump({"mean": to_dict(self.mean), "median": to_dict(self.median), "mode": to_dict(self.mode)}, f)
+
+    def load(self, path: str) -> "ImputationStatistics":
+        with open(path) as f:
+            data = json.load(f)
+        for method, dtype in (("mean", np.float64), ("median", np.float64), ("mode", object)):
+            if data[method] is not None:
+                setattr(self, method, pd.Series(data[method], dtype=dtype))
+        return self
+
+
+def _with_category(df: pd.DataFrame, value) -> pd.DataFrame:
+    # a categorical column can only be filled with one of its categories
+    missing = [
+        name for name, dtype in df.dtypes.items()
+        if isinstance(dtype, pd.CategoricalDtype) and value not in dtype.categories and df[name].hasnans
+    ]
+    if not missing:
+        return df
+    df = df.copy()
+    for name in missing:
+        df[name] = df[name].cat.add_categories([value])
+    return df
+
+
 class FillMissingValues(MissingValuesHandling):
     def __init__(self, method="mean",fill_value=None):
         self.method=method
         self.fill_value=fill_value
+        self.statistics_ = None
+
+    def fit(self, df:pd.DataFrame) -> "FillMissingValues":
+        self.statistics_ = ImputationStatistics().fit(df, methods=(self.method,))
+        return self
+
+    def transform(self, df:pd.DataFrame) -> pd.DataFrame:
+        if self.method == "constant":
+            return _with_category(df, self.fill_value).fillna(self.fill_value)
 
+        if self.statistics_ is None:
+            raise ValueError("FillMissingValues has not been fitted")
+
+        # one fillna call with a per column value instead of a loop over columns
+        return df.fillna(value=self.statistics_.fill_values(self.method).to_dict())
 
     def handle(self,df:pd.DataFrame) -> pd.DataFrame:
         logging.info(f"filling missing values with method={self.method} and fill_value={self.fill_value}")
-        df_cleaned = df.copy()
-        if self.method=="mean":
-            numerical_columns = df_cleaned.select_dtypes(include="number").columns
-            df_cleaned[numerical_columns] = df_cleaned[numerical_columns].fillna(
-                df[numerical_columns].mean()
-            )    
-
-        elif self.method == "median":
-            numerical_columns = df_cleaned.select_dtypes(include="number").columns
-            df_cleaned[numerical_columns] = df_cleaned[numerical_columns].fillna(
-                df[numerical_columns].median()
-            )     
-
-        elif self.method == "mode":
-            for column in df_cleaned.columns:
-                df_cleaned[column].fillna(df[column].mode().iloc[0], inplace=True)
-
-        elif self.method == "constant":
-            df_cleaned.fillna(self.fill_value, inplace=True)
-
+        if self.method != "constant":
+            # df is filled with its own statistics, so the columns without gaps need none
+            self.statistics_ = ImputationStatistics().fit(df, methods=(self.method,), only_missing=True)
+        df_cleaned = self.transform(df)
         logging.info("missing values filled successfully")
         return df_cleaned
 
+    def save_statistics(self, path: str):
+        """statistics of every column, handle only fits the columns with gaps so call fit first"""
+        if self.statistics_ is None:
+            raise ValueError("FillMissingValues has not been fitted")
+        self.statistics_.save(path)
+
+    def load_statistics(self, path: str) -> "FillMissingValues":
+        self.statistics_ = ImputationStatistics().load(path)
+        return self
+
 
 class MissingValuesHandler:
     def __init__(self, strategy: MissingValuesHandling):
@@ -72,6 +181,7 @@ class MissingValuesHandler:
         logging.info(f"setting strategy to {strategy}")
         self.strategy = strategy
 
+    @instrumented
     def execute_strategy(self, df:pd.DataFrame):
         logging.info("executing the strategy.")
         return self.strategy.handle(df)
@@ -0,0 +1,219 @@
+import logging
+
+import numpy as np
+from source.log_config import configure_logging
+
+configure_logging()
+
+
+class CompiledLinearPipeline:
+    """
+    fitted preprocessing + linear model folded into plain numpy arrays
+
+    mean imputation becomes a fill vector, standard scaling is folded into the
+    weights and the intercept, and every one hot encoded column becomes a
+    lookup of the coefficient of its category, so a batch prediction is one
+    fill, one matrix-vector product and one gather per categorical column
+    """
+
+    def __init__(self, numeric_columns, numeric_fill, weights, intercept,
+                 categorical_columns=None, vocabularies=None, category_fill=None, category_weights=None):
+        self.numeric_columns = list(numeric_columns)
+        self.numeric_fill = np.asarray(numeric_fill, dtype=np.float64)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.intercept = float(intercept)
+        self.categorical_columns = list(categorical_columns or [])
+        # vocabularies are sorted str arrays so lookups are a searchsorted
+        self.vocabularies = list(vocabularies or [])
+        self.category_fill = list(category_fill or [])
+        self.category_weights = list(category_weights or [])
+
+    @classmethod
+    def from_pipeline(cls, pipeline) -> "CompiledLinearPipeline":
+        """compile a fitted sklearn Pipeline whose last step is a linear model with coef_/intercept_"""
+        steps = [estimator for _, estimator in pipeline.steps] if hasattr(pipeline, "steps") else [pipeline]
+        model = steps[-1]
+        if not hasattr(model, "coef_") or not hasattr(model, "intercept_"):
+            raise ValueError(f"{type(model).__name__} is not a fitted linear model")
+
+        coef = np.ravel(model.coef_).astype(np.float64)
+        intercept = float(np.ravel(model.intercept_)[0])
+        preprocessors = steps[:-1]
+
+        if len(preprocessors) > 1:
+            raise ValueError("only a single preprocessing step can be compiled")
+
+        if not preprocessors:
+            columns = _input_columns(model, len(coef))
+            return cls(columns, np.full(len(coef), np.nan), coef, intercept)
+
+        preprocessor = preprocessors[0]
+        if type(preprocessor).__name__ != "ColumnTransformer":
+            # a single transformer over every input column, e.g. the scaler of LinearRegressionStrategy
+            columns = _input_columns(preprocessor, len(coef))
+            preprocessor = _SingleBlock(preprocessor, columns)
+
+        numeric_columns, numeric_fill, weights = [], [], []
+        categorical_columns, vocabularies, category_fill, category_weights = [], [], [], []
+        offset = 0
+
+        for name, transformer, columns in preprocessor.transformers_:
+            if transformer == "drop" or len(columns) == 0:
+                continue
+            columns = list(columns)
+            chain = [transformer] if transformer == "passthrough" else _flatten(transformer)
+
+            encoder = next((t for t in chain if type(t).__name__ == "OneHotEncoder"), None)
+            if encoder is None:
+                fill = np.full(len(columns), np.nan)
+                mean = np.zeros(len(columns))
+                scale = np.ones(len(columns))
+                for step in chain:
+                    kind = type(step).__name__
+                    if step == "passthrough":
+                        continue
+                    elif kind == "SimpleImputer":
+                        fill = np.asarray(step.statistics_, dtype=np.float64)
+                    elif kind == "StandardScaler":
+                        mean = step.mean_ if step.with_mean else np.zeros(len(columns))
+                        scale = step.scale_ if step.with_std else np.ones(len(columns))
+                    else:
+                        raise ValueError(f"can not compile {kind} in transformer {name}")
+
+                block = coef[offset:offset + len(columns)]
+                # w . (x - mean) / scale == (w / scale) . x - w . mean / scale
+                weights.append(block / scale)
+                intercept -= float(np.sum(block * mean / scale))
+                numeric_columns += columns
+                numeric_fill.append(fill)
+                offset += len(columns)
+                continue
+
+            fill = [None] * len(columns)
+            for step in chain:
+                kind = type(step).__name__
+                if kind == "SimpleImputer":
+                    fill = [str(value) for value in step.statistics_]
+                elif kind != "OneHotEncoder":
+                    raise ValueError(f"can not compile {kind} in transformer {name}")
+
+            drop_idx = getattr(encoder, "drop_idx_", None)
+            for i, (column, categories) in enumerate(zip(columns, encoder.categories_)):
+                n_out = len(categories) - (0 if drop_idx is None or drop_idx[i] is None else 1)
+                block = coef[offset:offset + n_out]
+                contributions = np.zeros(len(categories))
+                keep = np.ones(len(categories), dtype=bool)
+                if drop_idx is not None and drop_idx[i] is not None:
+                    keep[drop_idx[i]] = False
+                contributions[keep] = block
+
+                vocabulary = np.asarray(categories, dtype=str)
+                order = np.argsort(vocabulary)
+                categorical_columns.append(column)
+                vocabularies.append(vocabulary[order])
+                category_weights.append(contributions[order])
+                category_fill.append(fill[i])
+                offset += n_out
+
+        if offset != len(coef):
+            raise ValueError(f"compiled {offset} features but the model has {len(coef)} coefficients")
+
+        return cls(
+            numeric_columns,
+            np.concatenate(numeric_fill) if numeric_fill else np.empty(0),
+            np.concatenate(weights) if weights else np.empty(0),
+            intercept,
+            categorical_columns,
+            vocabularies,
+            category_fill,
+            category_weights,
+        )
+
+    def predict(self, numeric: np.ndarray, categorical: np.ndarray = None) -> np.ndarray:
+        """
+        numeric - (rows, len(numeric_columns)) float array in numeric_columns order
+        categorical - (rows, len(categorical_columns)) array of category values
+        """
+        values = np.array(numeric, dtype=np.float64, copy=True)
+        missing = np.isnan(values)
+        if missing.any():
+            np.copyto(values, np.broadcast_to(self.numeric_fill, values.shape), where=missing)
+
+        predictions = values @ self.weights
+        predictions += self.intercept
+
+        if self.categorical_columns:
+            if categorical is None:
+                raise ValueError(f"model expects categorical columns {self.categorical_columns}")
+            for i, (vocabulary, contributions) in enumerate(zip(self.vocabularies, self.category_weights)):
+                column = categorical[:, i]
+                if self.category_fill[i] is not None:
+                    column = np.where(_is_missing(column), self.category_fill[i], column)
+                column = np.asarray(column, dtype=str)
+                # unknown categories contribute nothing, same as handle_unknown="ignore"
+                index = np.minimum(np.searchsorted(vocabulary, column), len(vocabulary) - 1)
+                found = vocabulary[index] == column
+                predictions += np.where(found, contributions[index], 0.0)
+
+        return predictions
+
+    def save(self, file_path: str):
+        """store the engine as a plain npz, loading it back needs numpy only"""
+        arrays = {
+            "numeric_columns": np.asarray(self.numeric_columns, dtype=str),
+            "numeric_fill": self.numeric_fill,
+            "weights": self.weights,
+            "intercept": np.float64(self.intercept),
+            "categorical_columns": np.asarray(self.categorical_columns, dtype=str),
+            "category_fill": np.asarray(["" if fill is None else fill for fill in self.category_fill], dtype=str),
+            "has_category_fill": np.asarray([fill is not None for fill in self.category_fill], dtype=bool),
+        }
+        for i, (vocabulary, contributions) in enumerate(zip(self.vocabularies, self.category_weights)):
+            arrays[f"vocabulary_{i}"] = vocabulary
+            arrays[f"category_weights_{i}"] = contributions
+        np.savez(file_path, **arrays)
+
+    @classmethod
+    def load(cls, file_path: str) -> "CompiledLinearPipeline":
+        with np.load(file_path, allow_pickle=False) as data:
+            categorical_columns = data["categorical_columns"].tolist()
+            return cls(
+                data["numeric_columns"].tolist(),
+                data["numeric_fill"],
+                data["weights"],
+                float(data["intercept"]),
+                categorical_columns,
+                [data[f"vocabulary_{i}"] for i in range(len(categorical_columns))],
+                [fill if has_fill else None
+                 for fill, has_fill in zip(data["category_fill"].tolist(), data["has_category_fill"])],
+                [data[f"category_weights_{i}"] for i in range(len(categorical_columns))],
+            )
+
+    def predict_frame(self, df) -> np.ndarray:
+        numeric = df[self.numeric_columns].to_numpy(dtype=np.float64)
+        categorical = df[self.categorical_columns].to_numpy(dtype=object) if self.categorical_columns else None
+        return self.predict(numeric, categorical)
+
+
+class _SingleBlock:
+    # makes a bare transformer look like a one entry ColumnTransformer
+    def __init__(self, transformer, columns):
+        self.transformers_ = [("all", transformer, columns)]
+
+
+def _flatten(transformer) -> list:
+    if hasattr(transformer, "steps"):
+        return [step for _, step in transformer.steps]
+    return [transformer]
+
+
+def _input_columns(estimator, n_features: int) -> list:
+    if hasattr(estimator, "feature_names_in_"):
+        return list(estimator.feature_names_in_)
+    return list(range(n_features))
+
+
+def _is_missing(values: np.ndarray) -> np.ndarray:
+    values = np.asarray(values, dtype=object)
+    # nan is the only value not equal to itself
+    return (values != values) | np.equal(values, None)
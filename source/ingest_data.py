@@ -1,7 +1,11 @@
 import os
+import hashlib
+import logging
 from abc import ABC , abstractmethod
 import zipfile
+from typing import Iterator
 
+import numpy as np
 import pandas as pd
 
 class DataIngestor(ABC):
@@ -36,11 +40,188 @@ class ZipDataIngestor(DataIngestor):
         return df
     
 
+class ChunkedZipDataIngestor(DataIngestor):
+    """stream the csv out of a zip file in fixed size chunks without extracting it"""
+
+    def __init__(self, chunksize: int = 100_000, dtype: dict = None, usecols: list = None):
+        """
+        parameters -
+        chunksize(int)- number of rows per yielded chunk, peak memory scales with this
+        dtype(dict)- column -> dtype mapping passed to read_csv so every chunk has the same types
+        usecols(list)- only parse these columns
+        """
+        self.chunksize = chunksize
+        self.dtype = dtype
+        self.usecols = usecols
+        # columns infer_dtypes saw as integers and pinned to float64
+        self.integer_columns = []
+
+    def _find_csv_member(self, zip_ref: zipfile.ZipFile) -> str:
+        csv_files = [name for name in zip_ref.namelist() if name.endswith(".csv")]
+
+        if len(csv_files) == 0:
+            raise FileNotFoundError("No CSV files found in the zip file")
+
+        if len(csv_files) > 1:
+            raise ValueError("Multiple CSV files found in the zip file")
+
+        return csv_files[0]
+
+    def iter_chunks(self, file_path: str) -> Iterator[pd.DataFrame]:
+        """yield dataframe chunks of `chunksize` rows read straight from the zip member"""
+
+        if not file_path.endswith(".zip"):
+            raise ValueError("file is not a zip file")
+
+        with zipfile.ZipFile(file_path, "r") as zip_ref:
+            member = self._find_csv_member(zip_ref)
+            with zip_ref.open(member) as csv_file:
+                reader = pd.read_csv(
+                    csv_file,
+                    chunksize=self.chunksize,
+                    dtype=self.dtype,
+                    usecols=self.usecols,
+                )
+                for chunk in reader:
+                    yield chunk
+
+    def infer_dtypes(self, file_path: str, sample_rows: int = 10_000) -> dict:
+        """
+        column -> dtype mapping from the first sample_rows rows to pass as dtype
+
+        numeric columns become float64 so a missing value in a later chunk can
+        not turn an int column into a float one, the rest str. columns that
+        are empty in the sample are left out and inferred per chunk. the
+        integer ones are remembered for restore_integers
+        """
+        reader = ChunkedZipDataIngestor(chunksize=sample_rows, usecols=self.usecols).iter_chunks(file_path)
+        try:
+            sample = next(reader)
+        finally:
+            reader.close()
+
+        dtypes = {}
+        self.integer_columns = []
+        for column, dtype in sample.dtypes.items():
+            if sample[column].isna().all():
+                continue
+            numeric = pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+            dtypes[column] = "float64" if numeric else "str"
+            if pd.api.types.is_integer_dtype(dtype):
+                self.integer_columns.append(column)
+        return dtypes
+
+    def restore_integers(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        int64 again for the integer columns of the sample that stayed whole and
+        complete over the whole file, the types read_csv of the whole file gives
+        """
+        for column in self.integer_columns:
+            values = df[column]
+            if values.dtype != np.float64 or values.hasnans:
+                continue
+            array = values.to_numpy()
+            if np.array_equal(array, np.floor(array)):
+                df[column] = array.astype(np.int64)
+        return df
+
+    def ingest(self, file_path: str) -> pd.DataFrame:
+        chunks = list(self.iter_chunks(file_path))
+        if not chunks:
+            raise ValueError("the csv file in the zip file has no rows")
+        return self.restore_integers(pd.concat(chunks, ignore_index=True))
+
+
+class ParquetDataIngestor(DataIngestor):
+    """read a parquet file, only loading the requested columns"""
+
+    def __init__(self, columns: list = None):
+        self.columns = columns
+
+    def ingest(self, file_path: str) -> pd.DataFrame:
+        if not file_path.endswith(".parquet"):
+            raise ValueError("file is not a parquet file")
+
+        return pd.read_parquet(file_path, columns=self.columns, memory_map=True)
+
+
+class FeatherDataIngestor(DataIngestor):
+    """memory map an arrow ipc (feather) file, only loading the requested columns"""
+
+    def __init__(self, columns: list = None):
+        self.columns = columns
+
+    def ingest(self, file_path: str) -> pd.DataFrame:
+        if not file_path.endswith((".feather", ".arrow")):
+            raise ValueError("file is not a feather/arrow file")
+
+        # pd.read_feather has no memory_map switch, go through pyarrow directly
+        from pyarrow import feather
+
+        table = feather.read_table(file_path, columns=self.columns, memory_map=True)
+        return table.to_pandas()
+
+
+class CachedCsvDataIngestor(DataIngestor):
+    """
+    parse a csv (or the csv inside a zip) once and keep a columnar copy of it
+
+    the cache file is named after the sha256 of the source file so a changed
+    export gets a new entry, later runs memory map the feather file and only
+    read the projected columns instead of re-parsing the text
+    """
+
+    def __init__(self, cache_dir: str = ".columnar_cache", columns: list = None):
+        self.cache_dir = cache_dir
+        self.columns = columns
+
+    @staticmethod
+    def _content_hash(file_path: str, block_size: int = 1 << 20) -> str:
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(block_size), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def cache_path(self, file_path: str) -> str:
+        return os.path.join(self.cache_dir, f"{self._content_hash(file_path)}.feather")
+
+    def _read_source(self, file_path: str) -> pd.DataFrame:
+        if file_path.endswith(".zip"):
+            return ChunkedZipDataIngestor().ingest(file_path)
+        return pd.read_csv(file_path)
+
+    def ingest(self, file_path: str) -> pd.DataFrame:
+        if not file_path.endswith((".csv", ".zip")):
+            raise ValueError("file is not a csv or zip file")
+
+        cache_file = self.cache_path(file_path)
+
+        if not os.path.exists(cache_file):
+            logging.info(f"no columnar cache for {file_path}, converting it to {cache_file}")
+            os.makedirs(self.cache_dir, exist_ok=True)
+            df = self._read_source(file_path)
+            # write to a temp name first so a crashed run never leaves a half written cache
+            tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+            # uncompressed so the buffers can be memory mapped instead of decoded
+            df.to_feather(tmp_file, compression="uncompressed")
+            os.replace(tmp_file, cache_file)
+
+        return FeatherDataIngestor(columns=self.columns).ingest(cache_file)
+
+
 class DataIngestorFactory:
     @staticmethod
-    def get_data_ingestor(file_extension: str) -> DataIngestor:
-        if file_extension == ".zip":
-            return ZipDataIngestor()
+    def get_data_ingestor(file_extension: str, chunksize: int = None, columns: list = None, dtype: dict = None) -> DataIngestor:
+        if file_extension == ".zip" and chunksize is not None:
+            return ChunkedZipDataIngestor(chunksize=chunksize, dtype=dtype, usecols=columns)
+        elif file_extension in (".zip", ".csv"):
+            # parsed once into the columnar cache, later runs map it and read only the requested columns
+            return CachedCsvDataIngestor(columns=columns)
+        elif file_extension == ".parquet":
+            return ParquetDataIngestor(columns=columns)
+        elif file_extension in (".feather", ".arrow"):
+            return FeatherDataIngestor(columns=columns)
         else:
             raise ValueError(f"no ingestor available for file extention: {file_extension}")
         
@@ -0,0 +1,212 @@
+import functools
+import json
+import logging
+import os
+import resource
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from source.log_config import FrameSummary, configure_logging
+
+configure_logging()
+
+
+def _itemsize(dtype) -> int:
+    # object and extension columns (strings, categoricals) are counted as one 8 byte pointer per value
+    return dtype.itemsize if isinstance(dtype, np.dtype) and dtype != object else 8
+
+
+def _shape(value, with_bytes=True):
+    """(rows, columns, bytes) of a frame/series/array, None for anything else"""
+    # bytes come from the dtypes, memory_usage() costs milliseconds on wide frames
+    if isinstance(value, pd.DataFrame):
+        return value.shape[0], value.shape[1], value.shape[0] * sum(map(_itemsize, value.dtypes)) if with_bytes else 0
+    if isinstance(value, pd.Series):
+        return len(value), 1, len(value) * _itemsize(value.dtype)
+    if isinstance(value, np.ndarray):
+        return value.shape[0] if value.ndim else 1, value.shape[1] if value.ndim > 1 else 1, value.nbytes
+    return None
+
+
+def _first_shape(values):
+    for value in values:
+        shape = _shape(value, with_bytes=False)
+        if shape is not None:
+            return shape
+    return None
+
+
+def _peak_rss_bytes() -> int:
+    # ru_maxrss is in kilobytes on linux and bytes on macos
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+class StrategyMetrics:
+    """
+    collects one record per strategy call made through a context class
+
+    a record holds wall and cpu seconds, how much the peak rss grew, the
+    rows/columns going in and out and the bytes held by the outputs, which
+    is an upper bound on what the call copied (text columns counted as
+    pointers). profiling can be switched
+    on per strategy class with enable_profiling or the PROFILE_STRATEGIES
+    environment variable (comma separated class names)
+    """
+
+    def __init__(self):
+        self.records = []
+        self.enabled = not os.environ.get("INSTRUMENTATION_DISABLE")
+        self.profile_dir = os.environ.get("PROFILE_DIR", ".profiles")
+        self.profiled = {}
+        for name in filter(None, os.environ.get("PROFILE_STRATEGIES", "").split(",")):
+            self.profiled[name.strip()] = os.environ.get("PROFILER", "cprofile")
+        self._lock = threading.Lock()
+
+    def enable_profiling(self, strategy_name: str, profiler: str = "cprofile"):
+        """profile every call of this strategy class, profiler is "cprofile" or "sampling" (pyinstrument)"""
+        if profiler not in ("cprofile", "sampling"):
+            raise ValueError(f"unknown profiler {profiler}, expected cprofile or sampling")
+        self.profiled[strategy_name] = profiler
+
+    def disable_profiling(self, strategy_name: str):
+        self.profiled.pop(strategy_name, None)
+
+    def reset(self):
+        with self._lock:
+            self.records = []
+
+    def _profiled_call(self, profiler: str, label: str, func, args, kwargs):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        path = os.path.join(self.profile_dir, f"{label}-{time.strftime('%Y%m%d-%H%M%S')}-{len(self.records)}")
+
+        if profiler == "sampling":
+            # optional dependency, only needed when sampling is switched on
+            from pyinstrument import Profiler
+
+            sampler = Profiler()
+            sampler.start()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                sampler.stop()
+                with open(f"{path}.html", "w") as f:
+                    f.write(sampler.output_html())
+                logging.info(f"sampling profile written to {path}.html")
+
+        import cProfile
+
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(func, *args, **kwargs)
+        finally:
+            profile.dump_stats(f"{path}.prof")
+            logging.info(f"cprofile stats written to {path}.prof")
+
+    def measure(self, context: str, method: str, strategy: str, func, args, kwargs):
+        if not self.enabled:
+            return func(*args, **kwargs)
+
+        shape_in = _first_shape(list(args) + list(kwargs.values()))
+        rss_before = _peak_rss_bytes()
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+
+        profiler = self.profiled.get(strategy)
+        if profiler is None:
+            result = func(*args, **kwargs)
+        else:
+            result = self._profiled_call(profiler, f"{context}.{method}-{strategy}", func, args, kwargs)
+
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        outputs = result if isinstance(result, tuple) else (result,)
+        shapes_out = [shape for shape in map(_shape, outputs) if shape is not None]
+
+        record = {
+            "context": context,
+            "method": method,
+            "strategy": strategy,
+            "wall_seconds": wall,
+            "cpu_seconds": cpu,
+            "peak_rss_increase_bytes": max(_peak_rss_bytes() - rss_before, 0),
+            "rows_in": shape_in[0] if shape_in else None,
+            "columns_in": shape_in[1] if shape_in else None,
+            "rows_out": shapes_out[0][0] if shapes_out else None,
+            "columns_out": shapes_out[0][1] if shapes_out else None,
+            "output_bytes": sum(shape[2] for shape in shapes_out),
+        }
+        with self._lock:
+            self.records.append(record)
+        # lazy, with LOG_FORMAT=json the record and a summary of the input become fields of the line
+        logging.debug(
+            "%s.%s[%s] took %.4fs wall, %.4fs cpu", context, method, strategy, wall, cpu,
+            extra={"strategy_call": record, "input_summary": FrameSummary(args[0]) if args else None},
+        )
+        return result
+
+    def summary(self) -> list:
+        """records aggregated per context, method and strategy, slowest first"""
+        totals = {}
+        for record in self.records:
+            key = (record["context"], record["method"], record["strategy"])
+            total = totals.setdefault(key, {
+                "context": key[0], "method": key[1], "strategy": key[2], "calls": 0,
+                "wall_seconds": 0.0, "cpu_seconds": 0.0, "peak_rss_increase_bytes": 0,
+                "rows_in": 0, "rows_out": 0, "output_bytes": 0,
+            })
+            total["calls"] += 1
+            for name in ("wall_seconds", "cpu_seconds", "rows_in", "rows_out", "output_bytes"):
+                total[name] += record[name] or 0
+            total["peak_rss_increase_bytes"] = max(total["peak_rss_increase_bytes"], record["peak_rss_increase_bytes"])
+        return sorted(totals.values(), key=lambda total: total["wall_seconds"], reverse=True)
+
+    def export_json(self, path: str):
+        with open(path, "w") as f:
+            json.dump({"summary": self.summary(), "calls": self.records}, f, indent=2)
+
+    def export_prometheus(self, path: str):
+        """prometheus text exposition format, e.g. for the node exporter textfile collector"""
+        metrics = [
+            ("strategy_calls_total", "counter", "calls", "strategy calls"),
+            ("strategy_wall_seconds_total", "counter", "wall_seconds", "wall time spent in the strategy"),
+            ("strategy_cpu_seconds_total", "counter", "cpu_seconds", "process cpu time spent in the strategy"),
+            ("strategy_peak_rss_increase_bytes", "gauge", "peak_rss_increase_bytes", "largest growth of the peak rss in one call"),
+            ("strategy_rows_in_total", "counter", "rows_in", "rows passed in"),
+            ("strategy_rows_out_total", "counter", "rows_out", "rows returned"),
+            ("strategy_output_bytes_total", "counter", "output_bytes", "bytes held by the returned frames"),
+        ]
+        summary = self.summary()
+        lines = []
+        for name, kind, field, help_text in metrics:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for total in summary:
+                labels = f'context="{total["context"]}",method="{total["method"]}",strategy="{total["strategy"]}"'
+                lines.append(f"{name}{{{labels}}} {total[field]}")
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        # the textfile collector must never read a half written file
+        os.replace(tmp_path, path)
+
+
+# shared by every context class
+METRICS = StrategyMetrics()
+
+
+def instrumented(method):
+    """record a context class method call against the class of self.strategy"""
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        return METRICS.measure(
+            type(self).__name__, method.__name__, type(self.strategy).__name__,
+            functools.partial(method, self), args, kwargs,
+        )
+
+    return wrapper
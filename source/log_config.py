@@ -0,0 +1,104 @@
+import json
+import logging
+import os
+
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+# attributes every LogRecord has, anything else was passed through extra= and is a structured field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """one json object per line, fields passed with extra= become keys of their own"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value.as_dict() if isinstance(value, FrameSummary) else value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level=None, structured: bool = None, force: bool = False):
+    """
+    the one place logging is set up, every module calls this instead of basicConfig
+
+    level defaults to LOG_LEVEL (INFO), structured to LOG_FORMAT=json. like
+    basicConfig it leaves an already configured root logger alone (zenml
+    sets up its own) unless force is given
+    """
+    root = logging.getLogger()
+    if root.handlers and not force:
+        return
+
+    level = level or os.environ.get("LOG_LEVEL", "INFO").upper()
+    if structured is None:
+        structured = os.environ.get("LOG_FORMAT", "text").lower() == "json"
+
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if structured else logging.Formatter(TEXT_FORMAT))
+    for old in list(root.handlers):
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+
+class FrameSummary:
+    """
+    cheap stand in for a DataFrame in log messages
+
+    pass it as a %s argument, logging.info("got %s", FrameSummary(df)), and
+    nothing is computed unless the record is actually emitted. null counts
+    come from at most sample_rows evenly spaced rows, never from the full frame
+    """
+
+    def __init__(self, df, sample_rows: int = 10_000, max_columns: int = 5):
+        self.df = df
+        self.sample_rows = sample_rows
+        self.max_columns = max_columns
+
+    def as_dict(self) -> dict:
+        df = self.df
+        if not hasattr(df, "dtypes"):
+            return {"type": type(df).__name__}
+
+        shape = list(df.shape)
+        dtypes = df.dtypes.astype(str).value_counts().to_dict() if df.ndim == 2 else {str(df.dtype): 1}
+
+        step = max(len(df) // self.sample_rows, 1)
+        sample = df.iloc[::step]
+        nulls = sample.isna().sum()
+        if df.ndim == 1:
+            null_columns = {str(df.name): int(nulls) * step} if nulls else {}
+        else:
+            nulls = nulls[nulls > 0].sort_values(ascending=False)
+            # scaled back up to the full frame when only a sample was looked at
+            null_columns = {str(column): int(count) * step for column, count in nulls.head(self.max_columns).items()}
+
+        summary = {"shape": shape, "dtypes": dtypes, "null_columns": null_columns}
+        if step > 1:
+            summary["nulls_sampled_every"] = step
+        return summary
+
+    def __str__(self) -> str:
+        summary = self.as_dict()
+        if "shape" not in summary:
+            return f"<{summary['type']}>"
+        shape = "x".join(map(str, summary["shape"]))
+        dtypes = ", ".join(f"{dtype}: {count}" for dtype, count in summary["dtypes"].items())
+        nulls = ", ".join(f"{column}: {count}" for column, count in summary["null_columns"].items()) or "none"
+        approx = "~" if "nulls_sampled_every" in summary else ""
+        kind = "frame" if len(summary["shape"]) == 2 else "series"
+        return f"{shape} {kind} ({dtypes}), {approx}nulls ({nulls})"
+
+
+def summarize(df, **kwargs) -> FrameSummary:
+    return FrameSummary(df, **kwargs)
+
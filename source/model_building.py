@@ -1,14 +1,29 @@
+import itertools
+import json
 import logging
+import os
+import tempfile
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
 import pandas as pd
 from abc import ABC, abstractmethod
 
-from typing import Any
+from typing import Any, Iterable
 from sklearn.base import RegressorMixin
-from sklearn.linear_model import LinearRegression
+from sklearn.ensemble import GradientBoostingRegressor
+from sklearn.exceptions import ConvergenceWarning
+from sklearn.linear_model import ElasticNet, Lasso, LinearRegression, Ridge
+from sklearn.model_selection import KFold
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import StandardScaler
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+from source.instrumentation import instrumented
+from source.log_config import configure_logging
+
+configure_logging()
 
 class ModelBuilding(ABC):
     @abstractmethod
@@ -41,6 +56,444 @@ class LinearRegressionStrategy(ModelBuilding):
         return pipeline
     
 
+# model families the search strategy knows, alpha is the regularisation path parameter
+SEARCH_MODELS = {
+    "ridge": Ridge,
+    "lasso": Lasso,
+    "elasticnet": ElasticNet,
+    "gradient_boosting": GradientBoostingRegressor,
+}
+
+DEFAULT_SEARCH_SPACE = {
+    "ridge": {"alpha": np.logspace(-3, 3, 13).tolist()},
+    "lasso": {"alpha": np.logspace(-2, 3, 11).tolist()},
+    "elasticnet": {"alpha": np.logspace(-2, 2, 9).tolist(), "l1_ratio": [0.2, 0.5, 0.8]},
+    "gradient_boosting": {"n_estimators": [100, 300], "learning_rate": [0.05, 0.1], "max_depth": [2, 3]},
+}
+
+# set once per worker process by _init_search_worker
+_worker_data = {}
+
+# coordinate descent families, fitted along the alpha path with this many iterations
+_PATH_MAX_ITER = {"lasso": 5000, "elasticnet": 5000}
+
+
+def _init_search_worker(x_path: str, y_path: str, n_splits: int, random_state: int):
+    # memory map the shared arrays instead of receiving a pickled copy per task
+    x = np.load(x_path, mmap_mode="r")
+    y = np.load(y_path, mmap_mode="r")
+    folds = list(KFold(n_splits=n_splits, shuffle=True, random_state=random_state).split(np.arange(len(y))))
+    _worker_data.update(x=x, y=y, folds=folds, scaled={})
+
+
+def _fold_data(fold: int):
+    # scaling is fitted on the training part of the fold only, cached per fold in the worker
+    if fold not in _worker_data["scaled"]:
+        train_idx, test_idx = _worker_data["folds"][fold]
+        x, y = _worker_data["x"], _worker_data["y"]
+        scaler = StandardScaler().fit(x[train_idx])
+        _worker_data["scaled"][fold] = (
+            scaler.transform(x[train_idx]), np.asarray(y[train_idx]),
+            scaler.transform(x[test_idx]), np.asarray(y[test_idx]),
+        )
+    return _worker_data["scaled"][fold]
+
+
+def _fit_candidates(family: str, fixed_params: dict, alphas: list, fold: int) -> list:
+    """fit one fold for a group of candidates, warm starting along the alpha path when there is one"""
+    x_train, y_train, x_test, y_test = _fold_data(fold)
+    results = []
+
+    if alphas is None:
+        model = SEARCH_MODELS[family](**fixed_params)
+        model.fit(x_train, y_train)
+        return [(family, fixed_params, float(np.mean((model.predict(x_test) - y_test) ** 2)))]
+
+    model = SEARCH_MODELS[family](alpha=alphas[0], **fixed_params)
+    if family in _PATH_MAX_ITER:
+        # strongest regularisation first, every next fit starts from the previous coefficients
+        model.set_params(warm_start=True, max_iter=_PATH_MAX_ITER[family])
+    for alpha in alphas:
+        model.set_params(alpha=alpha)
+        with warnings.catch_warnings():
+            # weakly regularised lasso fits rarely converge fully, their score says enough
+            warnings.simplefilter("ignore", category=ConvergenceWarning)
+            model.fit(x_train, y_train)
+        mse = float(np.mean((model.predict(x_test) - y_test) ** 2))
+        results.append((family, {**fixed_params, "alpha": alpha}, mse))
+    return results
+
+
+class SearchCVStrategy(ModelBuilding):
+    """
+    k-fold cross validated search over ridge, lasso, elasticnet and gradient boosting
+
+    folds are evaluated as rungs on a process pool: every candidate gets fold 0,
+    only the best 1/prune_factor of them continue to the next fold, so hopeless
+    configurations stop early. no new rung is started once time_budget seconds
+    have passed. the data is written once to .npy files that the workers memory map.
+    """
+
+    def __init__(self, search_space: dict = None, n_iter: int = None, cv: int = 5, n_jobs: int = None,
+                 time_budget: float = None, prune_factor: float = 2, random_state: int = 42):
+        """
+        parameters -
+        search_space(dict)- model name -> {param: list of values}, defaults to DEFAULT_SEARCH_SPACE
+        n_iter(int)- sample this many candidates at random instead of the full grid
+        cv(int)- number of folds
+        n_jobs(int)- worker processes, defaults to every core
+        time_budget(float)- seconds after which no further fold is started
+        prune_factor(float)- keep the best 1/prune_factor candidates after every fold
+        """
+        self.search_space = search_space or DEFAULT_SEARCH_SPACE
+        self.n_iter = n_iter
+        self.cv = cv
+        self.n_jobs = n_jobs or os.cpu_count()
+        self.time_budget = time_budget
+        self.prune_factor = prune_factor
+        self.random_state = random_state
+        self.cv_results_ = None
+        self.best_params_ = None
+
+    def _candidates(self) -> list:
+        candidates = []
+        for family, grid in self.search_space.items():
+            if family not in SEARCH_MODELS:
+                raise ValueError(f"unknown model {family}, expected one of {list(SEARCH_MODELS)}")
+            names = list(grid)
+            for values in itertools.product(*(grid[name] for name in names)):
+                candidates.append((family, dict(zip(names, values))))
+
+        if self.n_iter is not None and self.n_iter < len(candidates):
+            rng = np.random.default_rng(self.random_state)
+            picked = rng.choice(len(candidates), size=self.n_iter, replace=False)
+            candidates = [candidates[i] for i in sorted(picked)]
+        return candidates
+
+    @staticmethod
+    def _key(family: str, params: dict):
+        return family, tuple(sorted(params.items()))
+
+    @staticmethod
+    def _tasks(candidates: list) -> list:
+        # group candidates that only differ in alpha into one regularisation path
+        groups = {}
+        for family, params in candidates:
+            if "alpha" in params and family != "gradient_boosting":
+                fixed = {k: v for k, v in params.items() if k != "alpha"}
+                groups.setdefault((family, tuple(sorted(fixed.items()))), []).append(params["alpha"])
+            else:
+                groups[(family, tuple(sorted(params.items())))] = None
+
+        tasks = []
+        for (family, fixed), alphas in groups.items():
+            tasks.append((family, dict(fixed), sorted(alphas, reverse=True) if alphas is not None else None))
+        return tasks
+
+    def build_and_train_model(self, x_train: pd.DataFrame, y_train: pd.Series) -> Pipeline:
+        if not isinstance(x_train, pd.DataFrame):
+            raise TypeError("x_train must be a pandas DataFrame")
+
+        if not isinstance(y_train, pd.Series):
+            raise TypeError("y_train must be a pandas Series")
+
+        start = time.perf_counter()
+        candidates = self._candidates()
+        scores = {self._key(family, params): [] for family, params in candidates}
+        logging.info(f"searching {len(candidates)} candidates with {self.cv} fold cv on {self.n_jobs} processes")
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            x_path = os.path.join(tmp_dir, "x.npy")
+            y_path = os.path.join(tmp_dir, "y.npy")
+            np.save(x_path, x_train.to_numpy(dtype=np.float64))
+            np.save(y_path, y_train.to_numpy(dtype=np.float64))
+
+            with ProcessPoolExecutor(
+                max_workers=self.n_jobs,
+                initializer=_init_search_worker,
+                initargs=(x_path, y_path, self.cv, self.random_state),
+            ) as pool:
+                alive = candidates
+                for fold in range(self.cv):
+                    # the first fold always runs so there is something to pick from
+                    if fold and self.time_budget is not None and time.perf_counter() - start > self.time_budget:
+                        logging.info(f"time budget spent, stopping after {fold} folds")
+                        break
+
+                    futures = [pool.submit(_fit_candidates, family, fixed, alphas, fold)
+                               for family, fixed, alphas in self._tasks(alive)]
+                    for future in as_completed(futures):
+                        # as_completed still yields the futures cancelled below, they have no result
+                        if future.cancelled():
+                            continue
+                        for family, params, mse in future.result():
+                            scores[self._key(family, params)].append(mse)
+                        if self.time_budget is not None and time.perf_counter() - start > self.time_budget:
+                            # tasks that have not started yet are dropped, running ones still report
+                            for pending in futures:
+                                pending.cancel()
+
+                    alive = [c for c in alive if len(scores[self._key(*c)]) == fold + 1]
+                    if not alive:
+                        break
+
+                    # successive halving: only the best candidates get the next fold
+                    alive = sorted(alive, key=lambda c: np.mean(scores[self._key(*c)]))
+                    alive = alive[:max(1, int(np.ceil(len(alive) / self.prune_factor)))]
+                    logging.info(f"fold {fold} done, {len(alive)} candidates left")
+
+        # prefer the candidates that were evaluated on the most folds
+        evaluated = [c for c in candidates if scores[self._key(*c)]]
+        if not evaluated:
+            raise RuntimeError(f"no candidate finished a fold within the time budget of {self.time_budget}s")
+        most_folds = max(len(scores[self._key(*c)]) for c in evaluated)
+        finalists = [c for c in evaluated if len(scores[self._key(*c)]) == most_folds]
+        best_family, best_params = min(finalists, key=lambda c: np.mean(scores[self._key(*c)]))
+
+        self.cv_results_ = [
+            {"model": family, "params": params, "folds": len(scores[self._key(family, params)]),
+             "mean_mse": float(np.mean(scores[self._key(family, params)]))}
+            for family, params in evaluated
+        ]
+        self.best_params_ = {"model": best_family, **best_params}
+        logging.info(f"best candidate {self.best_params_} after {time.perf_counter() - start:.1f}s")
+
+        model = SEARCH_MODELS[best_family](**best_params)
+        if best_family in _PATH_MAX_ITER:
+            # same iteration limit as the scored fits, the default 1000 may stop short of their coefficients
+            model.set_params(max_iter=_PATH_MAX_ITER[best_family])
+
+        pipeline = Pipeline([
+            ('scaler', StandardScaler()),
+            ('model', model),
+        ])
+        pipeline.fit(x_train, y_train)
+
+        logging.info("model training completed!")
+
+        return pipeline
+
+
+class LinearRegressionStatistics:
+    """
+    sufficient statistics of an ordinary least squares fit
+
+    keeps the row count, the feature/target means and the centred cross
+    products (X - mean)T(X - mean) and (X - mean)T(y - mean), so memory is
+    O(features^2) whatever the number of rows. centred sums are merged with
+    chan's formula, which stays accurate where raw XT X sums of house prices
+    and square feet would lose precision
+    """
+
+    def __init__(self, n_features: int):
+        self.n = 0
+        self.x_mean = np.zeros(n_features)
+        self.y_mean = 0.0
+        self.xx = np.zeros((n_features, n_features))
+        self.xy = np.zeros(n_features)
+
+    def update(self, x: np.ndarray, y: np.ndarray) -> "LinearRegressionStatistics":
+        """add a chunk of rows, rows with a missing feature or target are dropped"""
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        keep = ~(np.isnan(x).any(axis=1) | np.isnan(y))
+        x, y = x[keep], y[keep]
+        if len(y) == 0:
+            return self
+
+        chunk = LinearRegressionStatistics(x.shape[1])
+        chunk.n = len(y)
+        chunk.x_mean = x.mean(axis=0)
+        chunk.y_mean = float(y.mean())
+        x_centred = x - chunk.x_mean
+        chunk.xx = x_centred.T @ x_centred
+        chunk.xy = x_centred.T @ (y - chunk.y_mean)
+        return self.merge(chunk)
+
+    def merge(self, other: "LinearRegressionStatistics") -> "LinearRegressionStatistics":
+        """fold the statistics of another part of the data into these ones"""
+        if other.n == 0:
+            return self
+        if self.n == 0:
+            self.n, self.x_mean, self.y_mean = other.n, other.x_mean.copy(), other.y_mean
+            self.xx, self.xy = other.xx.copy(), other.xy.copy()
+            return self
+
+        n = self.n + other.n
+        dx = other.x_mean - self.x_mean
+        dy = other.y_mean - self.y_mean
+        weight = self.n * other.n / n
+        self.xx += other.xx + weight * np.outer(dx, dx)
+        self.xy += other.xy + weight * dx * dy
+        self.x_mean += dx * other.n / n
+        self.y_mean += dy * other.n / n
+        self.n = n
+        return self
+
+    def solve(self):
+        """coefficients and intercept of the least squares fit"""
+        if self.n == 0:
+            raise ValueError("no rows were accumulated")
+        # solve on the correlation scale, raw sums of ids and prices are ~1e16 apart which
+        # hides collinear columns from lstsq. lstsq then gives the minimum norm solution
+        # for constant or collinear columns, like LinearRegression
+        scale = np.sqrt(np.diag(self.xx))
+        scale[scale == 0] = 1.0
+        coef = np.linalg.lstsq(self.xx / np.outer(scale, scale), self.xy / scale, rcond=None)[0] / scale
+        intercept = self.y_mean - float(self.x_mean @ coef)
+        return coef, intercept
+
+    def save(self, file_path: str):
+        np.savez(file_path, n=self.n, x_mean=self.x_mean, y_mean=self.y_mean, xx=self.xx, xy=self.xy)
+
+    @classmethod
+    def load(cls, file_path: str) -> "LinearRegressionStatistics":
+        with np.load(file_path, allow_pickle=False) as data:
+            stats = cls(len(data["x_mean"]))
+            stats.n = int(data["n"])
+            stats.x_mean = data["x_mean"]
+            stats.y_mean = float(data["y_mean"])
+            stats.xx = data["xx"]
+            stats.xy = data["xy"]
+        return stats
+
+
+def _file_statistics(file_path: str, feature_columns: list, target_column: str, chunksize: int):
+    # runs in a worker process, streams one file and returns only its statistics
+    from source.ingest_data import ChunkedZipDataIngestor, DataIngestorFactory
+
+    columns = feature_columns + [target_column]
+    if file_path.endswith(".zip"):
+        chunks = ChunkedZipDataIngestor(chunksize=chunksize, usecols=columns).iter_chunks(file_path)
+    else:
+        ingestor = DataIngestorFactory.get_data_ingestor(os.path.splitext(file_path)[1], columns=columns)
+        chunks = [ingestor.ingest(file_path)]
+
+    stats = LinearRegressionStatistics(len(feature_columns))
+    for chunk in chunks:
+        stats.update(chunk[feature_columns].to_numpy(dtype=np.float64), chunk[target_column].to_numpy(dtype=np.float64))
+    return stats
+
+
+class IncrementalLinearRegressionStrategy(ModelBuilding):
+    """
+    ordinary least squares solved from accumulated sufficient statistics
+
+    rows are never kept, only LinearRegressionStatistics, so the model can be
+    trained chunk by chunk from a streaming ingestor, from several files in
+    parallel worker processes, and updated with a new month of data by
+    loading the saved statistics instead of rereading the history. only
+    numeric features are supported, categoricals have to be encoded upstream
+    """
+
+    def __init__(self, feature_columns: list = None, chunksize: int = 100_000, n_jobs: int = None):
+        """
+        parameters -
+        feature_columns(list)- features to use, defaults to the numeric columns of the first chunk
+        chunksize(int)- rows per chunk when streaming a zip file or splitting a frame
+        n_jobs(int)- worker processes for fit_files, defaults to every core
+        """
+        self.feature_columns = list(feature_columns) if feature_columns is not None else None
+        # inferred feature columns belong to one training frame, given ones are kept
+        self._features_given = feature_columns is not None
+        self.chunksize = chunksize
+        self.n_jobs = n_jobs or os.cpu_count()
+        self.statistics_ = None
+
+    def _init_features(self, df: pd.DataFrame, target_column: str = None):
+        if self.feature_columns is None:
+            # a column that is empty in the first chunk may turn out to be text later on
+            numeric = df.select_dtypes(include="number").dropna(axis=1, how="all").columns
+            self.feature_columns = [c for c in numeric if c != target_column]
+        if self.statistics_ is None:
+            self.statistics_ = LinearRegressionStatistics(len(self.feature_columns))
+
+    def partial_fit(self, x: pd.DataFrame, y: pd.Series) -> "IncrementalLinearRegressionStrategy":
+        """add one chunk of rows to the statistics"""
+        self._init_features(x)
+        self.statistics_.update(x[self.feature_columns].to_numpy(dtype=np.float64), y.to_numpy(dtype=np.float64))
+        return self
+
+    def fit_chunks(self, chunks: Iterable[pd.DataFrame], target_column: str) -> Pipeline:
+        """consume chunks holding features and target, e.g. ChunkedZipDataIngestor.iter_chunks"""
+        for chunk in chunks:
+            self._init_features(chunk, target_column)
+            self.partial_fit(chunk[self.feature_columns], chunk[target_column])
+        return self.to_pipeline()
+
+    def fit_files(self, file_paths: list, target_column: str) -> Pipeline:
+        """accumulate every file in its own worker process and merge the results"""
+        if self.feature_columns is None:
+            # take the feature list from the first file so every worker uses the same columns
+            first = next(iter(_sample_chunks(file_paths[0])))
+            self._init_features(first, target_column)
+        elif self.statistics_ is None:
+            self.statistics_ = LinearRegressionStatistics(len(self.feature_columns))
+
+        with ProcessPoolExecutor(max_workers=min(self.n_jobs, len(file_paths))) as pool:
+            parts = pool.map(
+                _file_statistics,
+                file_paths,
+                itertools.repeat(self.feature_columns),
+                itertools.repeat(target_column),
+                itertools.repeat(self.chunksize),
+            )
+            for file_path, part in zip(file_paths, parts):
+                logging.info(f"merging statistics of {part.n} rows from {file_path}")
+                self.statistics_.merge(part)
+        return self.to_pipeline()
+
+    def save_statistics(self, file_path: str):
+        self.statistics_.save(file_path)
+        with open(f"{file_path}.columns.json", "w") as f:
+            json.dump(self.feature_columns, f)
+
+    def load_statistics(self, file_path: str) -> "IncrementalLinearRegressionStrategy":
+        """resume from saved statistics, e.g. before adding the next month with fit_chunks"""
+        self.statistics_ = LinearRegressionStatistics.load(file_path)
+        with open(f"{file_path}.columns.json") as f:
+            self.feature_columns = json.load(f)
+        return self
+
+    def to_pipeline(self) -> Pipeline:
+        """solve the accumulated system into a fitted LinearRegression"""
+        coef, intercept = self.statistics_.solve()
+        model = LinearRegression()
+        model.coef_ = coef
+        model.intercept_ = intercept
+        model.n_features_in_ = len(self.feature_columns)
+        model.feature_names_in_ = np.asarray(self.feature_columns, dtype=object)
+        logging.info(f"solved linear regression from {self.statistics_.n} rows")
+        return Pipeline([('model', model)])
+
+    def build_and_train_model(self, x_train: pd.DataFrame, y_train: pd.Series) -> Pipeline:
+        if not isinstance(x_train, pd.DataFrame):
+            raise TypeError("x_train must be a pandas DataFrame")
+
+        if not isinstance(y_train, pd.Series):
+            raise TypeError("y_train must be a pandas Series")
+
+        logging.info("training incremental linear regression model")
+
+        self.statistics_ = None
+        if not self._features_given:
+            self.feature_columns = None
+        for start in range(0, len(x_train), self.chunksize):
+            self.partial_fit(x_train.iloc[start:start + self.chunksize], y_train.iloc[start:start + self.chunksize])
+
+        logging.info("model training completed!")
+
+        return self.to_pipeline()
+
+
+def _sample_chunks(file_path: str):
+    from source.ingest_data import ChunkedZipDataIngestor, DataIngestorFactory
+
+    if file_path.endswith(".zip"):
+        return ChunkedZipDataIngestor(chunksize=1000).iter_chunks(file_path)
+    return [DataIngestorFactory.get_data_ingestor(os.path.splitext(file_path)[1]).ingest(file_path)]
+
+
 class ModelBuilder:
     def __init__(self,strategy: ModelBuilding):
         self.strategy = strategy
@@ -49,6 +502,7 @@ class ModelBuilder:
         logging.info("switching strategy model building strategy")
         self.strategy = strategy
 
+    @instrumented
     def build_and_train_model(self, x_train: pd.DataFrame, y_train: pd.Series) -> Pipeline:
         return self.strategy.build_and_train_model(x_train, y_train)
 
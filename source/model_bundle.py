@@ -0,0 +1,109 @@
+import json
+import logging
+import math
+import struct
+
+import numpy as np
+
+from source.inference_engine import CompiledLinearPipeline
+from source.log_config import configure_logging
+
+configure_logging()
+
+# file layout:
+#   magic (8 bytes) | version (uint32) | header length (uint32) | json header | padding | arrays
+# every array starts on an ALIGNMENT byte boundary so it can be viewed straight out of the mapped file
+BUNDLE_MAGIC = b"HPMBNDL\x00"
+BUNDLE_VERSION = 1
+ALIGNMENT = 64
+_PREFIX = struct.Struct("<8sII")
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def save_bundle(engine: CompiledLinearPipeline, file_path: str):
+    """
+    write a compiled pipeline as a versioned array bundle
+
+    fill values, weights, vocabularies (fixed width unicode) and category
+    weights are stored raw and little endian, the columns, intercept and
+    array offsets go in the json header. no pickle anywhere
+    """
+    # all vocabularies share one array (and their weights another), column i owns
+    # rows category_offsets[i]:category_offsets[i + 1], a handful of arrays keeps loading cheap
+    sizes = [len(vocabulary) for vocabulary in engine.vocabularies]
+    arrays = {
+        "numeric_fill": engine.numeric_fill,
+        "weights": engine.weights,
+        "category_offsets": np.concatenate([[0], np.cumsum(sizes, dtype=np.int64)]).astype(np.int64),
+        "vocabulary": np.concatenate([np.asarray(v, dtype=str) for v in engine.vocabularies]) if sizes else np.empty(0, dtype="<U1"),
+        "category_weights": np.concatenate(engine.category_weights).astype(np.float64) if sizes else np.empty(0),
+    }
+
+    header = {
+        "numeric_columns": [str(column) for column in engine.numeric_columns],
+        "categorical_columns": [str(column) for column in engine.categorical_columns],
+        "category_fill": engine.category_fill,
+        "intercept": engine.intercept,
+        "arrays": {},
+    }
+
+    # offsets are relative to the start of the data section, so they do not depend on the header length
+    offset = 0
+    layout = []
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array, dtype=array.dtype.newbyteorder("<"))
+        header["arrays"][name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        layout.append((offset, array))
+        offset = _align(offset + array.nbytes)
+
+    header_bytes = json.dumps(header).encode()
+    data_start = _align(_PREFIX.size + len(header_bytes))
+
+    with open(file_path, "wb") as f:
+        f.write(_PREFIX.pack(BUNDLE_MAGIC, BUNDLE_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        for array_offset, array in layout:
+            f.seek(data_start + array_offset)
+            f.write(array.tobytes())
+        f.truncate(data_start + offset)
+
+    logging.info(f"saved model bundle v{BUNDLE_VERSION} to {file_path} ({data_start + offset} bytes)")
+
+
+def load_bundle(file_path: str) -> CompiledLinearPipeline:
+    """
+    map a bundle read only, the arrays of the returned engine are views
+    into the page cache so worker processes share one copy
+    """
+    mapped = np.memmap(file_path, dtype=np.uint8, mode="r")
+    magic, version, header_length = _PREFIX.unpack_from(mapped, 0)
+    if magic != BUNDLE_MAGIC:
+        raise ValueError(f"{file_path} is not a model bundle")
+    if version > BUNDLE_VERSION:
+        raise ValueError(f"model bundle version {version} is newer than the supported version {BUNDLE_VERSION}")
+
+    header = json.loads(bytes(mapped[_PREFIX.size:_PREFIX.size + header_length]))
+    data_start = _align(_PREFIX.size + header_length)
+
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        dtype = np.dtype(spec["dtype"])
+        count = math.prod(spec["shape"])
+        array = np.frombuffer(mapped, dtype=dtype, count=count, offset=data_start + spec["offset"])
+        arrays[name] = array.reshape(spec["shape"])
+
+    offsets = arrays["category_offsets"].tolist()
+    bounds = list(zip(offsets[:-1], offsets[1:]))
+    return CompiledLinearPipeline(
+        header["numeric_columns"],
+        arrays["numeric_fill"],
+        arrays["weights"],
+        header["intercept"],
+        header["categorical_columns"],
+        [arrays["vocabulary"][start:end] for start, end in bounds],
+        header["category_fill"],
+        [arrays["category_weights"][start:end] for start, end in bounds],
+    )
@@ -2,12 +2,15 @@ import logging
 from abc import ABC, abstractmethod
 
 from sklearn.base import RegressorMixin
+import numpy as np
 import pandas as pd
-from sklearn.metrics import mean_squared_error, r2_score
 
+from source.instrumentation import instrumented
+from source.log_config import configure_logging
 
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+configure_logging()
 
 
 class ModelEvaluation(ABC):
@@ -16,21 +19,138 @@ class ModelEvaluation(ABC):
         pass
         
 
+def regression_metrics(y_true: np.ndarray, y_pred: np.ndarray, quantiles=(0.5, 0.9, 0.99)) -> dict:
+    """
+    mse, rmse, mae, mape, r2 and absolute error quantiles in one pass over the residuals
+
+    works along the last axis, so a (n_samples, n_rows) matrix of resampled
+    rows gives one value per sample for every metric
+    """
+    y_true = np.asarray(y_true, dtype=np.float64)
+    y_pred = np.asarray(y_pred, dtype=np.float64)
+    errors = y_pred - y_true
+    abs_errors = np.abs(errors)
+
+    mse = np.mean(errors * errors, axis=-1)
+    centred = y_true - np.mean(y_true, axis=-1, keepdims=True)
+    total = np.mean(centred * centred, axis=-1)
+
+    # rows with a zero target have no percentage error, they are left out of mape
+    nonzero = y_true != 0
+    percentage = np.divide(abs_errors, np.abs(y_true), out=np.zeros_like(abs_errors), where=nonzero)
+
+    metrics = {
+        "Mean Squared Error": mse,
+        "Root Mean Squared Error": np.sqrt(mse),
+        "Mean Absolute Error": np.mean(abs_errors, axis=-1),
+        "Mean Absolute Percentage Error": np.sum(percentage, axis=-1) / np.maximum(np.sum(nonzero, axis=-1), 1),
+        "R2 score": 1 - np.divide(mse, total, out=np.full_like(mse, np.nan), where=total != 0),
+    }
+    if quantiles:
+        values = np.quantile(abs_errors, quantiles, axis=-1)
+        for q, value in zip(quantiles, values):
+            metrics[f"P{q * 100:g} Absolute Error"] = value
+    return metrics
+
+
+def bootstrap_intervals(y_true: np.ndarray, y_pred: np.ndarray, n_bootstrap=1000, confidence=0.95,
+                        quantiles=(0.5, 0.9, 0.99), random_state=42, max_batch_cells=10_000_000) -> dict:
+    """
+    percentile bootstrap confidence interval of every metric
+
+    resamples are (batch, n_rows) index matrices evaluated with one
+    regression_metrics call per batch, batches keep the matrix under
+    max_batch_cells entries
+    """
+    y_true = np.asarray(y_true, dtype=np.float64)
+    y_pred = np.asarray(y_pred, dtype=np.float64)
+    rng = np.random.default_rng(random_state)
+    n = len(y_true)
+    batch_size = max(1, min(n_bootstrap, max_batch_cells // max(n, 1)))
+
+    samples = {}
+    for start in range(0, n_bootstrap, batch_size):
+        index = rng.integers(0, n, size=(min(batch_size, n_bootstrap - start), n))
+        for name, values in regression_metrics(y_true[index], y_pred[index], quantiles).items():
+            samples.setdefault(name, []).append(values)
+
+    tail = (1 - confidence) / 2 * 100
+    return {
+        name: tuple(float(v) for v in np.nanpercentile(np.concatenate(values), [tail, 100 - tail]))
+        for name, values in samples.items()
+    }
+
+
+def segment_metrics(y_true: pd.Series, y_pred: np.ndarray, segments: pd.Series) -> pd.DataFrame:
+    """mse, rmse, mae, mape and r2 per segment from sums collected with a single group-by"""
+    y_true = np.asarray(y_true, dtype=np.float64)
+    errors = np.asarray(y_pred, dtype=np.float64) - y_true
+    abs_errors = np.abs(errors)
+    nonzero = y_true != 0
+
+    parts = pd.DataFrame({
+        "rows": 1,
+        "y": y_true,
+        "y2": y_true * y_true,
+        "e2": errors * errors,
+        "ae": abs_errors,
+        "ape": np.divide(abs_errors, np.abs(y_true), out=np.zeros_like(abs_errors), where=nonzero),
+        "nonzero": nonzero,
+    })
+    sums = parts.groupby(np.asarray(segments), sort=True).sum()
+
+    rows = sums["rows"]
+    mse = sums["e2"] / rows
+    total = sums["y2"] / rows - (sums["y"] / rows) ** 2
+    return pd.DataFrame({
+        "rows": rows,
+        "Mean Squared Error": mse,
+        "Root Mean Squared Error": np.sqrt(mse),
+        "Mean Absolute Error": sums["ae"] / rows,
+        "Mean Absolute Percentage Error": sums["ape"] / sums["nonzero"].clip(lower=1),
+        "R2 score": (1 - mse / total).where(total > 0),
+    })
+
+
 class RegressionModelEvaluation(ModelEvaluation):
-    def evaluate_model(self, x_test:pd.DataFrame, y_test: pd.Series, model:RegressorMixin) -> dict:
-        logging.info("adding constant to test data for intercept")
-        
+    def __init__(self, quantiles=(0.5, 0.9, 0.99), n_bootstrap: int = 0, confidence: float = 0.95,
+                 segment_by: str = None, random_state: int = 42):
+        """
+        parameters -
+        quantiles(tuple)- quantiles of the absolute error to report
+        n_bootstrap(int)- bootstrap resamples for confidence intervals, 0 skips them
+        confidence(float)- confidence level of the intervals
+        segment_by(str)- column of x_test to report metrics per value of, or "price_decile"
+        """
+        self.quantiles = quantiles
+        self.n_bootstrap = n_bootstrap
+        self.confidence = confidence
+        self.segment_by = segment_by
+        self.random_state = random_state
 
+    def evaluate_model(self, x_test:pd.DataFrame, y_test: pd.Series, model:RegressorMixin) -> dict:
         logging.info("predicting using trained model")
         y_pred = model.predict(x_test)
 
         logging.info("calculating evaluation matrics")
-        mse = mean_squared_error(y_test, y_pred)
-        r2 = r2_score(y_test, y_pred)
-
-        metrics = {"Mean Square Error":mse, "R2 score":r2}
-
-        logging.info(f"model evaluation metrics:{metrics}")
+        metrics = {name: float(value) for name, value in regression_metrics(y_test, y_pred, self.quantiles).items()}
+
+        if self.n_bootstrap:
+            logging.info(f"bootstrapping {self.n_bootstrap} resamples for confidence intervals")
+            metrics["confidence_intervals"] = bootstrap_intervals(
+                y_test, y_pred, self.n_bootstrap, self.confidence, self.quantiles, self.random_state
+            )
+
+        if self.segment_by is not None:
+            if self.segment_by == "price_decile":
+                segments = pd.qcut(y_test, q=10, labels=False, duplicates="drop")
+            elif self.segment_by in x_test.columns:
+                segments = x_test[self.segment_by]
+            else:
+                raise ValueError(f"segment column {self.segment_by} not found in test data")
+            metrics["segments"] = segment_metrics(y_test, y_pred, segments).to_dict(orient="index")
+
+        logging.info(f"model evaluation metrics:{ {k: v for k, v in metrics.items() if not isinstance(v, dict)} }")
         return metrics
 
 
@@ -42,5 +162,6 @@ class ModelEvaluator:
         self.strategy = strategy
 
 
+    @instrumented
     def evaluate(self, x_test: pd.DataFrame, y_test:pd.Series, model:RegressorMixin) -> dict:
         return self.strategy.evaluate_model(x_test,y_test,model)             
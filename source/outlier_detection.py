@@ -1,43 +1,299 @@
-import Analysis.basic_data_inspection
 from abc import ABC, abstractmethod
+import json
+from typing import Iterable, Iterator
 import pandas as pd
 import numpy as np
 import logging
-import matplotlib.pyplot as plt
-import seaborn as sns
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+from source.instrumentation import instrumented
+from source.log_config import configure_logging
+
+configure_logging()
+
+def save_bounds(lower: pd.Series, upper: pd.Series, path: str):
+    """persist per column lower/upper bounds so inference only needs a comparison"""
+    with open(path, "w") as f:
+        json.dump({"lower": lower.to_dict(), "upper": upper.to_dict()}, f)
+
+
+def load_bounds(path: str):
+    with open(path) as f:
+        data = json.load(f)
+    return pd.Series(data["lower"], dtype=np.float64), pd.Series(data["upper"], dtype=np.float64)
+
+
+def _partition_quantiles(df: pd.DataFrame, quantiles: list) -> list:
+    """
+    linear interpolated quantiles of every column (same as df.quantile) using
+    np.partition selection instead of a full sort
+    """
+    values = df.to_numpy(dtype=np.float64)
+    results = [np.full(values.shape[1], np.nan) for _ in quantiles]
+
+    def select(block: np.ndarray, columns):
+        n_rows = block.shape[0]
+        if n_rows == 0:
+            return
+        positions = [q * (n_rows - 1) for q in quantiles]
+        kth = sorted({int(np.floor(p)) for p in positions} | {int(np.ceil(p)) for p in positions})
+        selected = np.partition(block, kth, axis=0)
+        for result, position in zip(results, positions):
+            low, high = int(np.floor(position)), int(np.ceil(position))
+            fraction = position - low
+            result[columns] = selected[low] + (selected[high] - selected[low]) * fraction
+
+    has_nan = np.isnan(values).any(axis=0)
+    # columns without missing values are selected together in one call
+    complete = np.flatnonzero(~has_nan)
+    if len(complete):
+        select(values[:, complete], complete)
+    for column in np.flatnonzero(has_nan):
+        x = values[:, column]
+        select(x[~np.isnan(x)][:, None], [column])
+
+    return [pd.Series(result, index=df.columns) for result in results]
+
 
 class OutlierDetection(ABC):
+    lower_ = None
+    upper_ = None
+
     @abstractmethod
-    def detect(self, df:pd.DataFrame) -> pd.DataFrame:
+    def bounds(self, df: pd.DataFrame = None):
+        """
+        per column (lower, upper) bounds, values outside them are outliers
+
+        computed from df when given, otherwise the fitted or loaded bounds. the
+        batch strategies store the bounds of df, the online ones are only ever
+        fitted through partial_fit
+        """
         pass
 
+    def detect(self, df:pd.DataFrame, refit=True) -> pd.DataFrame:
+        """refit=False compares df with the fitted or loaded bounds instead of its own"""
+        lower, upper = self.bounds(df if refit else None)
+        return (df < lower) | (df > upper)
+
+    def _stored_bounds(self):
+        if self.lower_ is None:
+            raise ValueError(f"{type(self).__name__} has no bounds, fit or load them first")
+        return self.lower_, self.upper_
+
+    def save_bounds(self, path: str):
+        save_bounds(*self.bounds(), path)
+
+    def load_bounds(self, path: str) -> "OutlierDetection":
+        self.lower_, self.upper_ = load_bounds(path)
+        return self
+
 
 class ZScoreOutlierDetection(OutlierDetection):
     def __init__(self, threshold=3):
         self.threshold = threshold
 
-    def detect(self, df: pd.DataFrame) -> pd.DataFrame:
+    def bounds(self, df: pd.DataFrame = None):
+        if df is None:
+            return self._stored_bounds()
+        # |x - mean| / std > threshold is the same as x outside mean -+ threshold * std
+        mean = df.mean()
+        std = df.std()
+        self.lower_ = mean - self.threshold * std
+        self.upper_ = mean + self.threshold * std
+        return self.lower_, self.upper_
+
+    def detect(self, df: pd.DataFrame, refit=True) -> pd.DataFrame:
         logging.info("detecting outliers with Z Score method")
-        z_score = np.abs((df - df.mean()) / df.std())
-        outliers = z_score > self.threshold
-        logging.info(f"outlier detected with Z score {z_score}")
+        outliers = super().detect(df, refit)
+        logging.info(f"outlier detected with Z score threshold {self.threshold}")
         return outliers
 
 
 class IQROutlierDetection(OutlierDetection):
-    def detect(self, df: pd.DataFrame) -> pd.DataFrame:
-        logging.info("detecting outliers with IQR method")
-        q1 = df.quantile(0.25)
-        q3 = df.quantile(0.75)
-
+    def bounds(self, df: pd.DataFrame = None):
+        if df is None:
+            return self._stored_bounds()
+        q1, q3 = _partition_quantiles(df, [0.25, 0.75])
         iqr = q3 - q1
-        outliers = (df < (q1 - 1.5*iqr) ) | (df > (q3 + 1.5*iqr))
+        self.lower_ = q1 - 1.5*iqr
+        self.upper_ = q3 + 1.5*iqr
+        return self.lower_, self.upper_
 
-        logging.info(f"outlier detected with IQR {iqr}")
+    def detect(self, df: pd.DataFrame, refit=True) -> pd.DataFrame:
+        logging.info("detecting outliers with IQR method")
+        outliers = super().detect(df, refit)
+        logging.info("outlier detected with IQR fences")
         return outliers
-    
+
+
+class PercentileOutlierDetection(OutlierDetection):
+    """values below / above the given percentiles are outliers, used for capping"""
+
+    def __init__(self, lower_quantile=0.01, upper_quantile=0.99):
+        self.lower_quantile = lower_quantile
+        self.upper_quantile = upper_quantile
+
+    def bounds(self, df: pd.DataFrame = None):
+        if df is None:
+            return self._stored_bounds()
+        self.lower_, self.upper_ = _partition_quantiles(df, [self.lower_quantile, self.upper_quantile])
+        return self.lower_, self.upper_
+
+    def detect(self, df: pd.DataFrame, refit=True) -> pd.DataFrame:
+        logging.info("detecting outliers with percentile method")
+        return super().detect(df, refit)
+
+
+class _QuantileDigest:
+    """
+    mergeable approximate quantile sketch (a merging t-digest with a uniform scale)
+
+    holds at most ~2*compression weighted centroids, a new chunk is merged into
+    the centroids with one sort and compressed back into equal weight bins
+    """
+
+    def __init__(self, compression: int = 200):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = np.inf
+        self.max = -np.inf
+
+    @property
+    def total(self) -> float:
+        return float(self.weights.sum())
+
+    def update(self, values: np.ndarray):
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+        # the centroids are already sorted, sorting only the new values and slotting the
+        # centroids in (ahead of equal values) is much cheaper than argsorting both together
+        values = np.sort(values)
+        slots = np.searchsorted(values, self.means) + np.arange(len(self.means))
+        means = np.empty(len(values) + len(self.means))
+        weights = np.ones(len(means))
+        is_centroid = np.zeros(len(means), dtype=bool)
+        is_centroid[slots] = True
+        means[slots], weights[slots] = self.means, self.weights
+        means[~is_centroid] = values
+
+        if len(means) > 2 * self.compression:
+            # centroid k collects the weight falling in [k, k+1) / compression of the total
+            cumulative = np.cumsum(weights)
+            bins = ((cumulative - weights) / cumulative[-1] * self.compression).astype(np.int64)
+            binned_weights = np.bincount(bins, weights=weights)
+            binned_means = np.bincount(bins, weights=weights * means)
+            keep = binned_weights > 0
+            means = binned_means[keep] / binned_weights[keep]
+            weights = binned_weights[keep]
+
+        self.means, self.weights = means, weights
+
+    def quantile(self, q: float) -> float:
+        if len(self.means) == 0:
+            return np.nan
+        # centroid centres on the same 0..n-1 rank scale pandas interpolates on
+        positions = np.cumsum(self.weights) - (self.weights + 1) / 2
+        positions = np.concatenate([[0.0], positions, [self.total - 1]])
+        means = np.concatenate([[self.min], self.means, [self.max]])
+        return float(np.interp(q * (self.total - 1), positions, means))
+
+
+class OnlineZScoreOutlierDetection(OutlierDetection):
+    """
+    z score detection whose mean and variance are accumulated chunk by chunk
+    (welford / chan merge), so the full dataset never has to be in memory
+    """
+
+    def __init__(self, threshold=3):
+        self.threshold = threshold
+        self.columns_ = None
+        self.count_ = None
+        self.mean_ = None
+        self.m2_ = None
+        self.lower_ = None
+        self.upper_ = None
+
+    def partial_fit(self, df: pd.DataFrame) -> "OnlineZScoreOutlierDetection":
+        if self.columns_ is None:
+            self.columns_ = df.columns
+            self.count_ = np.zeros(len(df.columns))
+            self.mean_ = np.zeros(len(df.columns))
+            self.m2_ = np.zeros(len(df.columns))
+
+        values = df[self.columns_].to_numpy(dtype=np.float64)
+        count = np.sum(~np.isnan(values), axis=0).astype(np.float64)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(count > 0, np.nansum(values, axis=0) / count, 0.0)
+        m2 = np.nansum((values - mean) ** 2, axis=0)
+
+        # combine the running and the chunk statistics in one step
+        total = self.count_ + count
+        delta = mean - self.mean_
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self.mean_ = np.where(total > 0, self.mean_ + delta * count / total, 0.0)
+            self.m2_ = self.m2_ + m2 + np.where(total > 0, delta**2 * self.count_ * count / total, 0.0)
+        self.count_ = total
+        self.lower_ = self.upper_ = None
+        return self
+
+    def bounds(self, df: pd.DataFrame = None):
+        if df is not None:
+            # bounds of df alone from a throwaway detector, the accumulated statistics are left as they are
+            return OnlineZScoreOutlierDetection(self.threshold).partial_fit(df).bounds()
+        if self.lower_ is None:
+            if self.columns_ is None:
+                raise ValueError("OnlineZScoreOutlierDetection has not been fitted")
+            with np.errstate(invalid="ignore", divide="ignore"):
+                std = np.sqrt(self.m2_ / (self.count_ - 1))
+            self.lower_ = pd.Series(self.mean_ - self.threshold * std, index=self.columns_)
+            self.upper_ = pd.Series(self.mean_ + self.threshold * std, index=self.columns_)
+        return self.lower_, self.upper_
+
+    def detect(self, df: pd.DataFrame, refit=True) -> pd.DataFrame:
+        logging.info("detecting outliers with online Z Score bounds")
+        return super().detect(df, refit)
+
+
+class StreamingIQROutlierDetection(OutlierDetection):
+    """iqr detection with q1/q3 from per column quantile digests updated chunk by chunk"""
+
+    def __init__(self, compression=200):
+        self.compression = compression
+        self.digests_ = None
+        self.lower_ = None
+        self.upper_ = None
+
+    def partial_fit(self, df: pd.DataFrame) -> "StreamingIQROutlierDetection":
+        if self.digests_ is None:
+            self.digests_ = {column: _QuantileDigest(self.compression) for column in df.columns}
+
+        for column, digest in self.digests_.items():
+            digest.update(df[column].to_numpy(dtype=np.float64))
+        self.lower_ = self.upper_ = None
+        return self
+
+    def bounds(self, df: pd.DataFrame = None):
+        if df is not None:
+            # fresh digests for df alone, the accumulated ones are left as they are
+            return StreamingIQROutlierDetection(self.compression).partial_fit(df).bounds()
+        if self.lower_ is None:
+            if self.digests_ is None:
+                raise ValueError("StreamingIQROutlierDetection has not been fitted")
+            q1 = pd.Series({column: digest.quantile(0.25) for column, digest in self.digests_.items()})
+            q3 = pd.Series({column: digest.quantile(0.75) for column, digest in self.digests_.items()})
+            iqr = q3 - q1
+            self.lower_ = q1 - 1.5 * iqr
+            self.upper_ = q3 + 1.5 * iqr
+        return self.lower_, self.upper_
+
+    def detect(self, df: pd.DataFrame, refit=True) -> pd.DataFrame:
+        logging.info("detecting outliers with streaming IQR bounds")
+        return super().detect(df, refit)
+
 
 class OutlierDetector:
     def __init__(self, strategy: OutlierDetection):
@@ -46,30 +302,82 @@ class OutlierDetector:
     def set_strategy(self, strategy: OutlierDetection):
         self.strategy = strategy
     
-    def detect(self, df: pd.DataFrame) -> pd.DataFrame:
-        return self.strategy.detect(df)
-    
+    @instrumented
+    def detect(self, df: pd.DataFrame, refit=True) -> pd.DataFrame:
+        """refit=False reuses the bounds the strategy already has, like handle_outliers"""
+        return self.strategy.detect(df, refit)
 
-    def handle_outliers(self, df:pd.DataFrame, method="remove", axis=1) -> pd.DataFrame:
-        outliers = self.detect(df)
-        if method == "remove":
-            logging.info("removing outliers from dataset")
-            df_cleaned = df[(~outliers).all(axis=1)]
+    def bounds(self, df: pd.DataFrame = None):
+        """(lower, upper) from the strategy, reusable at inference time through save_bounds"""
+        return self.strategy.bounds(df)
 
-        elif method =="cap":
-            logging.info("capping outliers")
-            df_cleaned = df.clip(lower=df.quantile(0.01), upper=df.quantile(0.99), axis=axis)
+    def save_bounds(self, path: str):
+        self.strategy.save_bounds(path)
 
-        else:
+    def load_bounds(self, path: str) -> "OutlierDetector":
+        self.strategy.load_bounds(path)
+        return self
+
+    @instrumented
+    def handle_outliers(self, df:pd.DataFrame, method="remove", refit=True) -> pd.DataFrame:
+        """
+        remove the rows outside the strategy bounds or cap the numeric columns
+        at them, capping keeps every column's dtype
+
+        refit=False reuses the bounds the strategy already has (fitted or loaded)
+        instead of computing them from df
+        """
+        if method not in ("remove", "cap"):
             logging.warning(f"unknown methos '{method}'. no outlier detected")
             return df
 
+        lower, upper = self.bounds(df if refit else None)
+
+        if method == "remove":
+            logging.info("removing outliers from dataset")
+            outliers = (df < lower) | (df > upper)
+            df_cleaned = df[~outliers.to_numpy().any(axis=1)]
+
+        else:
+            logging.info("capping outliers")
+            numeric = df.select_dtypes(include="number")
+            # missing bounds (e.g. an all nan column) leave the column as is
+            low = lower.reindex(numeric.columns).fillna(-np.inf)
+            high = upper.reindex(numeric.columns).fillna(np.inf)
+            for column, dtype in numeric.dtypes.items():
+                if pd.api.types.is_integer_dtype(dtype):
+                    # integers only need the whole numbers inside the bounds, clamped to
+                    # what the dtype holds so casting the clipped column back is exact
+                    info = np.iinfo(getattr(dtype, "numpy_dtype", dtype))
+                    low[column] = min(max(np.ceil(low[column]), info.min), info.max)
+                    high[column] = max(min(np.floor(high[column]), info.max), low[column])
+            capped = numeric.clip(low, high, axis=1).astype(numeric.dtypes.to_dict())
+            df_cleaned = df.assign(**{column: capped[column] for column in capped.columns})
+
         logging.info("outlier handling completed... ")
         return df_cleaned
 
 
+    def fit_chunks(self, chunks: Iterable[pd.DataFrame]) -> "OutlierDetector":
+        """first pass over a chunked dataset, only works with the online strategies"""
+        if not hasattr(self.strategy, "partial_fit"):
+            raise ValueError(f"{type(self.strategy).__name__} can not be fitted chunk by chunk")
+        for chunk in chunks:
+            self.strategy.partial_fit(chunk)
+        return self
+
+    def handle_outliers_chunks(self, chunks: Iterable[pd.DataFrame], method="remove") -> Iterator[pd.DataFrame]:
+        """second pass, filter every chunk against the bounds from fit_chunks"""
+        for chunk in chunks:
+            yield self.handle_outliers(chunk, method=method, refit=False)
+
+
     def visualize_outliers(self, df:pd.DataFrame, features:list):
         logging.info(f"Visualizing the outliers removed for features {features}")
+        # plotting libraries are only needed here, importing them up front costs ~1.5s on every import
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+
         for feature in features:
             plt.figure(figsize=(12,8))
             sns.boxplot(x=df[feature])
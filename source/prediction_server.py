@@ -0,0 +1,330 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from source.request_decoding import InputSchema
+from source.log_config import configure_logging
+
+configure_logging()
+
+
+class MicroBatcher:
+    """
+    queue concurrent prediction requests and score them together
+
+    a batch is closed when it reaches max_batch_size rows or when max_wait_ms
+    has passed since its first request, then scored with one predict call in
+    a worker thread so the event loop keeps accepting requests meanwhile
+    """
+
+    def __init__(self, predict_fn: Callable[[pd.DataFrame], np.ndarray], max_batch_size=64, max_wait_ms=5.0):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.queue = None
+        self._worker = None
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+
+    async def predict(self, df: pd.DataFrame) -> np.ndarray:
+        predictions, _ = await self.predict_timed(df)
+        return predictions
+
+    async def predict_timed(self, df: pd.DataFrame):
+        """predictions plus the seconds the predict call of their batch took"""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((df, future))
+        return await future
+
+    async def _collect(self) -> list:
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        rows = len(batch[0][0])
+        deadline = loop.time() + self.max_wait_ms / 1000
+
+        while rows < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            batch.append(item)
+            rows += len(item[0])
+        return batch
+
+    async def _run_each(self, batch: list):
+        loop = asyncio.get_running_loop()
+        for df, future in batch:
+            start = time.perf_counter()
+            try:
+                predictions = await loop.run_in_executor(None, self.predict_fn, df)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                continue
+            if not future.done():
+                future.set_result((predictions, time.perf_counter() - start))
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            # pd.concat fills the columns a request left out with nan, so a request is only
+            # ever scored together with requests that have exactly its columns
+            groups = {}
+            for item in batch:
+                df = item[0]
+                key = frozenset(df.columns) if isinstance(df, pd.DataFrame) else df.shape[1:]
+                groups.setdefault(key, []).append(item)
+            for group in groups.values():
+                await self._run_batch(group)
+
+    async def _run_batch(self, batch: list):
+        loop = asyncio.get_running_loop()
+        frames = [df for df, _ in batch]
+        futures = [future for _, future in batch]
+        try:
+            if len(frames) == 1:
+                combined = frames[0]
+            elif isinstance(frames[0], np.ndarray):
+                # requests decoded by an InputSchema are already float matrices
+                combined = np.concatenate(frames)
+            else:
+                combined = pd.concat(frames, ignore_index=True)
+            start = time.perf_counter()
+            predictions = await loop.run_in_executor(None, self.predict_fn, combined)
+            model_seconds = time.perf_counter() - start
+        except Exception as e:
+            if len(batch) == 1:
+                if not futures[0].done():
+                    futures[0].set_exception(e)
+            else:
+                # one bad request must not fail the others it was batched with, score them one by one
+                logging.warning(f"batch of {len(batch)} requests failed ({e}), retrying them one at a time")
+                await self._run_each(batch)
+            return
+
+        # hand every request back its own slice of the batch predictions
+        offset = 0
+        for df, future in batch:
+            if not future.done():
+                future.set_result((predictions[offset:offset + len(df)], model_seconds))
+            offset += len(df)
+
+
+def parse_payload(body: bytes) -> pd.DataFrame:
+    """mlflow style payload, dataframe_records or dataframe_split"""
+    data = json.loads(body)
+    if "dataframe_records" in data:
+        return pd.DataFrame.from_records(data["dataframe_records"])
+    if "dataframe_split" in data:
+        split = data["dataframe_split"]
+        return pd.DataFrame(split["data"], columns=split["columns"])
+    raise ValueError("payload must contain dataframe_records or dataframe_split")
+
+
+class PredictionServer:
+    """minimal asyncio http/1.1 server exposing POST /invocations and GET /ping"""
+
+    def __init__(self, batcher: MicroBatcher, host="127.0.0.1", port=8000, schema: InputSchema = None):
+        """schema decodes requests straight into float matrices, the batcher then gets arrays instead of frames"""
+        self.batcher = batcher
+        self.schema = schema
+        self.host = host
+        self.port = port
+        self.server = None
+
+    async def start(self):
+        self.batcher.start()
+        self.server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        logging.info(f"prediction server listening on http://{self.host}:{self.port}")
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        await self.batcher.stop()
+
+    async def serve_forever(self):
+        await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            # keep-alive, one request after the other on the same connection
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                try:
+                    method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                    while True:
+                        line = await reader.readline()
+                        if line in (b"\r\n", b"\n", b""):
+                            break
+                        key, _, value = line.decode("latin-1").partition(":")
+                        headers[key.strip().lower()] = value.strip()
+                    length = int(headers.get("content-length", 0))
+                    if length < 0:
+                        raise ValueError(f"negative content length {length}")
+                except ValueError:
+                    # the rest of the stream can't be framed after a malformed request, answer and hang up
+                    await self._respond(writer, 400, {"error": "malformed request"})
+                    break
+
+                body = await reader.readexactly(length)
+                status, payload, timings = await self._route(method, path, body, headers.get("content-type"))
+                await self._respond(writer, status, payload, timings)
+
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method: str, path: str, body: bytes, content_type: str = None):
+        if method == "GET" and path == "/ping":
+            return 200, {"status": "ok"}, {}
+
+        if method != "POST" or path != "/invocations":
+            return 404, {"error": f"no route for {method} {path}"}, {}
+
+        start = time.perf_counter()
+        try:
+            if self.schema is not None:
+                request = self.schema.decode(body, content_type)
+            else:
+                request = parse_payload(body)
+        except (ValueError, KeyError, TypeError) as e:
+            return 400, {"error": str(e)}, {}
+        decode_seconds = time.perf_counter() - start
+
+        try:
+            predictions, model_seconds = await self.batcher.predict_timed(request)
+        except (ValueError, KeyError, TypeError) as e:
+            # the model could not take this request's values (e.g. text in a numeric column)
+            return 400, {"error": str(e)}, {}
+        except Exception as e:
+            logging.error(f"prediction failed: {e}")
+            return 500, {"error": str(e)}, {}
+
+        # decode and model time reported separately, model time is for the whole batch
+        timings = {"X-Decode-Ms": f"{decode_seconds * 1e3:.3f}", "X-Model-Ms": f"{model_seconds * 1e3:.3f}"}
+        return 200, {"predictions": np.asarray(predictions).tolist()}, timings
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, payload: dict, headers: dict = None):
+        reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error"}[status]
+        body = json.dumps(payload).encode()
+        extra = "".join(f"{key}: {value}\r\n" for key, value in (headers or {}).items())
+        writer.write(
+            f"HTTP/1.1 {status} {reason}\r\n"
+            f"Content-Type: application/json\r\n{extra}"
+            f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
+
+
+def load_model(model_path: str = None, artifact_name: str = "sklearn-pipeline"):
+    """
+    the trained pipeline from a joblib file, a compiled engine from a .bundle file,
+    or the latest zenml artifact produced by model_building_step
+    """
+    if model_path is not None and model_path.endswith(".bundle"):
+        from source.model_bundle import load_bundle
+
+        return load_bundle(model_path)
+
+    if model_path is not None:
+        import joblib
+
+        return joblib.load(model_path)
+
+    from zenml.client import Client
+
+    return Client().get_artifact_version(artifact_name).load()
+
+
+def make_predict_fn(model, compile_model: bool = False, schema: InputSchema = None) -> Callable:
+    """predict callable for the batcher, taking frames or (with a schema) float matrices in schema order"""
+    from source.inference_engine import CompiledLinearPipeline
+
+    if compile_model or isinstance(model, CompiledLinearPipeline):
+        # a model loaded from a bundle is compiled already
+        engine = model if isinstance(model, CompiledLinearPipeline) else CompiledLinearPipeline.from_pipeline(model)
+        if schema is None:
+            return engine.predict_frame
+        if engine.categorical_columns or engine.numeric_columns != schema.columns:
+            raise ValueError("schema columns do not match the compiled model")
+        return engine.predict
+
+    if schema is None:
+        return model.predict
+    return lambda matrix: model.predict(pd.DataFrame(matrix, columns=schema.columns))
+
+
+async def run_load(url_host: str, port: int, payload: bytes, clients: int, requests_per_client: int,
+                   content_type: str = "application/json") -> dict:
+    """
+    load generator: `clients` concurrent keep-alive connections each sending
+    `requests_per_client` sequential POST /invocations requests
+    """
+    latencies = []
+    request = (
+        f"POST /invocations HTTP/1.1\r\nHost: {url_host}\r\n"
+        f"Content-Type: {content_type}\r\nContent-Length: {len(payload)}\r\n\r\n"
+    ).encode("latin-1") + payload
+
+    async def client():
+        reader, writer = await asyncio.open_connection(url_host, port)
+        try:
+            for _ in range(requests_per_client):
+                start = time.perf_counter()
+                writer.write(request)
+                await writer.drain()
+                status_line = await reader.readline()
+                length = 0
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b""):
+                        break
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":")[1])
+                await reader.readexactly(length)
+                if b" 200 " not in status_line:
+                    raise RuntimeError(f"request failed: {status_line!r}")
+                latencies.append(time.perf_counter() - start)
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = np.asarray(latencies) * 1e3
+    return {
+        "requests": len(latencies),
+        "seconds": elapsed,
+        "throughput_rps": len(latencies) / elapsed,
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+    }
@@ -0,0 +1,142 @@
+import io
+import json
+from operator import itemgetter
+
+import numpy as np
+from source.log_config import configure_logging
+
+configure_logging()
+
+JSON_CONTENT_TYPE = "application/json"
+NPY_CONTENT_TYPE = "application/x-npy"
+ARROW_CONTENT_TYPE = "application/vnd.apache.arrow.stream"
+
+# steps that turn text columns into numbers, their inputs can't be decoded to float
+_ENCODERS = ("OneHotEncoder", "OrdinalEncoder", "TargetEncoder")
+
+
+def _encoded_columns(model) -> list:
+    """input columns of a fitted pipeline that go through an encoder"""
+    steps = [step for _, step in model.steps] if hasattr(model, "steps") else [model]
+    columns = []
+    for step in steps:
+        if type(step).__name__ in _ENCODERS:
+            columns += list(getattr(step, "feature_names_in_", []))
+        for _, transformer, selected in getattr(step, "transformers_", []):
+            chain = [inner for _, inner in transformer.steps] if hasattr(transformer, "steps") else [transformer]
+            if any(type(inner).__name__ in _ENCODERS for inner in chain):
+                columns += list(selected)
+    return columns
+
+
+class InputSchema:
+    """
+    the numeric columns a trained model expects, compiled once
+
+    requests are decoded straight into one (rows, columns) float64
+    matrix in schema order instead of going through a DataFrame
+    """
+
+    def __init__(self, columns: list):
+        self.columns = list(columns)
+        self._positions = {column: i for i, column in enumerate(self.columns)}
+        self._getter = itemgetter(*self.columns) if len(self.columns) > 1 else (lambda record: (record[self.columns[0]],))
+
+    @classmethod
+    def from_model(cls, model) -> "InputSchema":
+        """columns seen at fit time (feature_names_in_), or the numeric columns of a compiled engine"""
+        if hasattr(model, "feature_names_in_"):
+            encoded = _encoded_columns(model)
+            if encoded:
+                raise ValueError(f"a float matrix schema can not carry the text columns {encoded}")
+            return cls(list(model.feature_names_in_))
+        if hasattr(model, "numeric_columns"):
+            if getattr(model, "categorical_columns", None):
+                raise ValueError("a float matrix schema can not carry categorical columns")
+            return cls(model.numeric_columns)
+        raise ValueError(f"can not derive the input columns of {type(model).__name__}")
+
+    def _position(self, column: str) -> int:
+        try:
+            return self._positions[column]
+        except KeyError:
+            raise ValueError(f"unexpected column {column}") from None
+
+    def _check_complete(self, columns):
+        # a left out feature must fail the request, not be imputed
+        present = set(columns)
+        missing = [column for column in self.columns if column not in present]
+        if missing:
+            raise ValueError(f"missing columns {missing}")
+
+    def decode_split(self, split: dict) -> np.ndarray:
+        columns = split.get("columns", self.columns)
+        # None becomes nan in a float64 array, like a missing value in pandas
+        values = np.array(split["data"], dtype=np.float64)
+        if values.ndim != 2 or values.shape[1] != len(columns):
+            raise ValueError(f"expected rows of {len(columns)} values")
+
+        if list(columns) == self.columns:
+            return values
+
+        self._check_complete(columns)
+        matrix = np.full((len(values), len(self.columns)), np.nan)
+        matrix[:, [self._position(column) for column in columns]] = values
+        return matrix
+
+    def decode_records(self, records: list) -> np.ndarray:
+        if records:
+            for column in records[0]:
+                self._position(column)
+
+        try:
+            # itemgetter pulls every schema column of a record in schema order in one c call
+            rows = list(map(self._getter, records))
+        except KeyError:
+            for record in records:
+                self._check_complete(record)
+            raise
+
+        matrix = np.array(rows, dtype=np.float64)
+        return matrix.reshape(len(records), len(self.columns))
+
+    def decode_json(self, body) -> np.ndarray:
+        data = json.loads(body) if isinstance(body, (str, bytes, bytearray)) else body
+        if isinstance(data, list):
+            return self.decode_records(data)
+        if "dataframe_records" in data:
+            return self.decode_records(data["dataframe_records"])
+        if "dataframe_split" in data:
+            return self.decode_split(data["dataframe_split"])
+        if "data" in data:
+            return self.decode_split(data)
+        raise ValueError("payload must contain dataframe_records, dataframe_split or data")
+
+    def decode_npy(self, body: bytes) -> np.ndarray:
+        """a (rows, columns) .npy array already in schema order"""
+        values = np.load(io.BytesIO(body), allow_pickle=False)
+        if values.ndim != 2 or values.shape[1] != len(self.columns):
+            raise ValueError(f"expected a 2d array with {len(self.columns)} columns")
+        return values.astype(np.float64, copy=False)
+
+    def decode_arrow(self, body: bytes) -> np.ndarray:
+        """an arrow ipc stream with one column per schema column"""
+        from pyarrow import ipc
+
+        table = ipc.open_stream(body).read_all()
+        for column in table.column_names:
+            self._position(column)
+        self._check_complete(table.column_names)
+
+        matrix = np.full((table.num_rows, len(self.columns)), np.nan)
+        for column in table.column_names:
+            matrix[:, self._position(column)] = table.column(column).to_numpy(zero_copy_only=False)
+        return matrix
+
+    def decode(self, body: bytes, content_type: str = JSON_CONTENT_TYPE) -> np.ndarray:
+        content_type = (content_type or JSON_CONTENT_TYPE).split(";")[0].strip().lower()
+        if content_type == NPY_CONTENT_TYPE:
+            return self.decode_npy(body)
+        if content_type == ARROW_CONTENT_TYPE:
+            return self.decode_arrow(body)
+        return self.decode_json(body)
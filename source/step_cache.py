@@ -0,0 +1,148 @@
+import os
+import json
+import pickle
+import hashlib
+import inspect
+import logging
+from typing import Any, Callable
+
+import pandas as pd
+from source.log_config import configure_logging
+
+configure_logging()
+
+
+class StepCache:
+    """
+    local content addressed cache for step outputs, no zenml server needed
+
+    an entry is keyed by the hash of the input data, the step/strategy name,
+    its parameters and the source code of the module implementing it, so
+    changing one step only invalidates that step and the ones after it.
+    entries are evicted least recently used first once the total size goes
+    over max_bytes.
+    """
+
+    def __init__(self, cache_dir: str = ".step_cache", max_bytes: int = 2 * 1024**3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def data_hash(df: pd.DataFrame) -> str:
+        digest = hashlib.sha256()
+        digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+        if isinstance(df, pd.DataFrame):
+            digest.update(json.dumps([str(c) for c in df.columns]).encode())
+            digest.update(json.dumps([str(d) for d in df.dtypes]).encode())
+        else:
+            digest.update(str(df.name).encode())
+            digest.update(str(df.dtype).encode())
+        return digest.hexdigest()
+
+    @staticmethod
+    def code_version(*objects) -> str:
+        """
+        hash of the source files of the given classes/functions, or of file paths
+        given as strings (a step passes its own __file__ so editing the step body counts)
+        """
+        # hash the whole source file so helpers used by the strategy count as well
+        digest = hashlib.sha256()
+        for obj in objects:
+            source_file = obj if isinstance(obj, str) else inspect.getsourcefile(obj)
+            with open(source_file, "rb") as f:
+                digest.update(f.read())
+        return digest.hexdigest()
+
+    @staticmethod
+    def strategy_params(strategy) -> dict:
+        """
+        class name and constructor attributes of a strategy, nested strategies
+        included, so the cache key follows the object that actually runs.
+        fitted state (trailing underscore) and private attributes are left out
+        """
+        def describe(value):
+            if isinstance(value, (list, tuple)):
+                return [describe(item) for item in value]
+            if isinstance(value, dict):
+                return {str(key): describe(item) for key, item in value.items()}
+            if hasattr(value, "__dict__") and not isinstance(value, type):
+                return StepCache.strategy_params(value)
+            return value
+
+        params = {
+            name: describe(value) for name, value in vars(strategy).items()
+            if not name.startswith("_") and not name.endswith("_")
+        }
+        return {"class": type(strategy).__name__, **params}
+
+    def make_key(self, df: pd.DataFrame, name: str, params: dict, code: str) -> str:
+        payload = json.dumps(
+            {"data": self.data_hash(df), "name": name, "params": params, "code": code},
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def get(self, key: str):
+        path = self._entry_path(key)
+        if not os.path.exists(path):
+            return None
+
+        with open(path, "rb") as f:
+            value = pickle.load(f)
+
+        # bump the mtime so eviction treats this entry as recently used
+        os.utime(path)
+        return value
+
+    def put(self, key: str, value: Any):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._entry_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for file_name in os.listdir(self.cache_dir):
+            if not file_name.endswith(".pkl"):
+                continue
+            stat = os.stat(os.path.join(self.cache_dir, file_name))
+            entries.append((stat.st_mtime, stat.st_size, file_name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, file_name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            logging.info(f"evicting step cache entry {file_name}")
+            os.remove(os.path.join(self.cache_dir, file_name))
+            total -= size
+
+    def cached(self, df: pd.DataFrame, name: str, params: dict, code: str, compute: Callable[[], Any]):
+        """return the cached output for this input/step/params/code or compute and store it"""
+        key = self.make_key(df, name, params, code)
+        value = self.get(key)
+        if value is not None:
+            logging.info(f"step cache hit for {name}")
+            return value
+
+        logging.info(f"step cache miss for {name}, computing")
+        value = compute()
+        self.put(key, value)
+        return value
+
+
+def get_step_cache() -> StepCache:
+    """build the cache from STEP_CACHE_DIR / STEP_CACHE_MAX_BYTES, None if STEP_CACHE_DISABLE is set"""
+    if os.environ.get("STEP_CACHE_DISABLE"):
+        return None
+
+    return StepCache(
+        cache_dir=os.environ.get("STEP_CACHE_DIR", ".step_cache"),
+        max_bytes=int(os.environ.get("STEP_CACHE_MAX_BYTES", 2 * 1024**3)),
+    )
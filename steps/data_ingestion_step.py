@@ -1,14 +1,42 @@
+import os
 import pandas as pd
 from zenml import step
+from source.dtype_optimizer import DtypeOptimizer, concat_chunks
 from source.ingest_data import DataIngestorFactory
 
 
 @step
-def data_ingestion_step(file_path: str) -> pd.DataFrame:
-    file_extension = ".zip"
+def data_ingestion_step(file_path: str, chunksize: int = None, columns: list = None, optimize_dtypes: bool = False,
+                        dtype: dict = None) -> pd.DataFrame:
+    """
+    dtype(dict)- column -> dtype for chunked reads, inferred from the first rows
+    when not given so every chunk parses a column the same way
+    """
+    file_extension = os.path.splitext(file_path)[1]
 
-    data_ingestor = DataIngestorFactory.get_data_ingestor(file_extension)
+    data_ingestor = DataIngestorFactory.get_data_ingestor(file_extension, chunksize=chunksize, columns=columns, dtype=dtype)
+    optimizer = DtypeOptimizer() if optimize_dtypes else None
 
-    df = data_ingestor.ingest(file_path)
+    if chunksize is None or file_extension != ".zip":
+        df = data_ingestor.ingest(file_path)
 
-    return df
\ No newline at end of file
+    else:
+        if data_ingestor.dtype is None:
+            data_ingestor.dtype = data_ingestor.infer_dtypes(file_path)
+
+        # consume the zip member chunk by chunk instead of extracting it to disk,
+        # with optimize_dtypes every chunk is shrunk before it is kept
+        chunks = []
+        for chunk in data_ingestor.iter_chunks(file_path):
+            chunks.append(optimizer.shrink_chunk(chunk) if optimizer else chunk)
+
+        if not chunks:
+            raise ValueError("the csv file in the zip file has no rows")
+        # whole number columns pinned to float64 for the read go back to int64
+        df = data_ingestor.restore_integers(concat_chunks(chunks))
+
+    if optimizer is not None:
+        # integer downcasting needs the min and max of the whole column
+        df = optimizer.optimize(df)
+
+    return df
@@ -1,10 +1,30 @@
 from typing import Tuple
 import pandas as pd
-from source.data_splitter import DataSplitter, SimpleTrainTestSpliter
+from source.data_splitter import (
+    DataSplitter,
+    GroupedTrainTestSplitter,
+    SimpleTrainTestSpliter,
+    StratifiedTrainTestSplitter,
+    TimeBasedTrainTestSplitter,
+)
 from zenml import step
 
 @step
-def data_splitter_step(df: pd.DataFrame, target_column: str) -> Tuple[pd.DataFrame, pd.DataFrame, pd.Series, pd.Series]:
-    splitter = DataSplitter(strategy = SimpleTrainTestSpliter())
+def data_splitter_step(df: pd.DataFrame, target_column: str, strategy: str = "simple") -> Tuple[pd.DataFrame, pd.DataFrame, pd.Series, pd.Series]:
+    if strategy == "simple":
+        splitter = DataSplitter(strategy = SimpleTrainTestSpliter())
+
+    elif strategy == "stratified":
+        splitter = DataSplitter(strategy = StratifiedTrainTestSplitter())
+
+    elif strategy == "grouped":
+        splitter = DataSplitter(strategy = GroupedTrainTestSplitter())
+
+    elif strategy == "time":
+        splitter = DataSplitter(strategy = TimeBasedTrainTestSplitter())
+
+    else:
+        raise ValueError(f"unsupported data splitting strategy {strategy}")
+
     x_train, x_test, y_train, y_test = splitter.split(df, target_column)
     return x_train, x_test, y_train, y_test
\ No newline at end of file
@@ -1,5 +1,6 @@
 from zenml import step
-from source.feature_engineering import FeatureEngineer, LogTransformation, MinMaxScaler, OneHotEncoder, StandardScaler
+from source.feature_engineering import FeatureEngineer, LogTransformation, MinMaxScaling, OneHotEncoding, StandardScaling
+from source.step_cache import StepCache, get_step_cache
 import pandas as pd
 
 @step
@@ -11,16 +12,26 @@ def feature_engineering_step(df:pd.DataFrame, strategy: str = "log", features: l
         engineer = FeatureEngineer(LogTransformation(features=features))    
 
     elif strategy == "minmaxscaling":
-        engineer = FeatureEngineer(MinMaxScaler(features=features))
+        engineer = FeatureEngineer(MinMaxScaling(features=features))
 
     elif strategy == "standardscaling":
-        engineer = FeatureEngineer(StandardScaler(features=features))
+        engineer = FeatureEngineer(StandardScaling(features=features))
 
     elif strategy == "onehotencoding":
-        engineer = FeatureEngineer(OneHotEncoder(features=features))
+        engineer = FeatureEngineer(OneHotEncoding(features=features))
 
     else:
         raise ValueError(f"unsupported feature engineering strategy {strategy}")
 
-    transformed_df = engineer.apply_feature_engineering(df)
-    return transformed_df            
\ No newline at end of file
+    cache = get_step_cache()
+    if cache is None:
+        return engineer.apply_feature_engineering(df)
+
+    transformed_df = cache.cached(
+        df,
+        name="feature_engineering_step",
+        params={"strategy": StepCache.strategy_params(engineer.strategy)},
+        code=StepCache.code_version(FeatureEngineer, __file__),
+        compute=lambda: engineer.apply_feature_engineering(df),
+    )
+    return transformed_df            
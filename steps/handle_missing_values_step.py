@@ -1,5 +1,6 @@
 import pandas as pd
 from source.handle_missing_values import DropMissingValues, FillMissingValues, MissingValuesHandler
+from source.step_cache import StepCache, get_step_cache
 
 from zenml import step
 
@@ -14,5 +15,15 @@ def handle_missing_values_step(df:pd.DataFrame, strategy:str = "mean") -> pd.Dat
     else:
         raise ValueError(f"Unsupported missing value handling strategy ")
 
-    cleaned_df = handler.execute_strategy(df)
+    cache = get_step_cache()
+    if cache is None:
+        return handler.execute_strategy(df)
+
+    cleaned_df = cache.cached(
+        df,
+        name="handle_missing_values_step",
+        params={"strategy": StepCache.strategy_params(handler.strategy)},
+        code=StepCache.code_version(type(handler.strategy), __file__),
+        compute=lambda: handler.execute_strategy(df),
+    )
     return cleaned_df        
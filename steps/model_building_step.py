@@ -2,8 +2,6 @@ import logging
 import pandas as pd 
 from typing import Annotated
 
-import mlflow
-import mlflow.sklearn
 from sklearn.base import RegressorMixin
 from sklearn.compose import ColumnTransformer
 from sklearn.impute import SimpleImputer
@@ -14,15 +12,16 @@ from sklearn.preprocessing import OneHotEncoder
 
 from zenml import step, ArtifactConfig
 from zenml.client import Client
+from source.log_config import configure_logging
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+configure_logging()
 
-# get active experiment tracker from zenml 
+# get active experiment tracker from zenml, without one the model is trained but not tracked
 experiment_tracker = Client().active_stack.experiment_tracker
 from zenml import Model
 
 if experiment_tracker is None:
-    raise ValueError("Experiment Tracker is not set in the active ZenML stack.")
+    logging.warning("Experiment Tracker is not set in the active ZenML stack, mlflow tracking is disabled.")
 
 model = Model(
     name="price_predictor",
@@ -31,7 +30,7 @@ model = Model(
     description="price prediction model for houses"
 )
 
-@step(enable_cache=False, experiment_tracker=experiment_tracker.name, model=model)
+@step(enable_cache=False, experiment_tracker=experiment_tracker.name if experiment_tracker else None, model=model)
 def model_building_step(
     x_train: pd.DataFrame,
     y_train: pd.Series
@@ -57,12 +56,14 @@ def model_building_step(
         ("onehot", OneHotEncoder(handle_unknown="ignore"))
     ])
 
-    # bundle preprocessing for both columns
+    # bundle preprocessing for both columns, sparse_threshold=1 keeps the one hot
+    # output as csr all the way into LinearRegression instead of densifying it
     preprocessor = ColumnTransformer(
         transformers=[
             ("num", numerical_tranform, numerical_col),
             ("cat", categorical_transform, categorical_col)
-        ]
+        ],
+        sparse_threshold=1.0,
     )
 
     # define model training pipeline
@@ -71,6 +72,16 @@ def model_building_step(
         ("model", LinearRegression()),
     ])
     
+    if experiment_tracker is None:
+        logging.info("Building and training the linear regression model")
+        pipeline.fit(x_train, y_train)
+        logging.info("model training completed")
+        return pipeline
+
+    # mlflow is only imported when there is a tracker to log to
+    import mlflow
+    import mlflow.sklearn
+
     if not mlflow.active_run():
         mlflow.start_run() 
 
@@ -5,8 +5,9 @@ from source.model_evaluator import ModelEvaluator, RegressionModelEvaluation
 from zenml import step
 from sklearn.pipeline import Pipeline
 from typing import Optional
+from source.log_config import configure_logging
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+configure_logging()
 
 
 @step(enable_cache=False)
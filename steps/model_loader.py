@@ -16,7 +16,7 @@ def model_loader(model_name: str) -> Pipeline:
     # Load the model by name and version
     model = Model(name=model_name, version="production")
 
-    # Load the pipeline artifact (assuming it was saved as "sklearn_pipeline")
-    model_pipeline: Pipeline = model.load_artifact("sklearn_pipeline")
+    # Load the pipeline artifact, model_building_step saves it as "sklearn-pipeline"
+    model_pipeline: Pipeline = model.load_artifact("sklearn-pipeline")
 
     return model_pipeline
\ No newline at end of file
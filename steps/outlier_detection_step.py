@@ -1,12 +1,15 @@
 import logging
 import pandas as pd
 from source.outlier_detection import OutlierDetector, ZScoreOutlierDetection, IQROutlierDetection
+from source.log_config import summarize
+from source.step_cache import StepCache, get_step_cache
 from zenml import step
 
 @step
 def outlier_detection_step(df:pd.DataFrame, column_name:str) -> pd.DataFrame:
 
-    logging.info(f"start outlier detection step with dataset {df}")
+    # lazy summary, the frame is never turned into a string
+    logging.info("start outlier detection step with dataset %s", summarize(df))
     if df is None:
         logging.info("No dataset provided")
         raise ValueError("No dataset provided")
@@ -19,10 +22,22 @@ def outlier_detection_step(df:pd.DataFrame, column_name:str) -> pd.DataFrame:
         logging.info(f"column {column_name} not found in dataset")
         raise ValueError(f"column {column_name} not found in dataset")
 
-    df_numeric = df.select_dtypes(include=[int, float])
+    # "number" also keeps the int8/int16/float32 columns of a dtype optimised frame
+    df_numeric = df.select_dtypes(include="number")
 
     outlier_detector = OutlierDetector(ZScoreOutlierDetection(threshold=3))
-    outliers = outlier_detector.detect(df_numeric)
-    df_cleaned = outlier_detector.handle_outliers(df_numeric, method="remove", axis=1)
+    method = "remove"
+
+    cache = get_step_cache()
+    if cache is None:
+        return outlier_detector.handle_outliers(df_numeric, method=method)
+
+    df_cleaned = cache.cached(
+        df_numeric,
+        name="outlier_detection_step",
+        params={"method": method, "strategy": StepCache.strategy_params(outlier_detector.strategy)},
+        code=StepCache.code_version(OutlierDetector, __file__),
+        compute=lambda: outlier_detector.handle_outliers(df_numeric, method=method),
+    )
 
     return df_cleaned    
\ No newline at end of file
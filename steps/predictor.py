@@ -2,9 +2,57 @@ import json
 
 import numpy as np
 import pandas as pd
+from sklearn.pipeline import Pipeline
 from zenml import step
 from zenml.integrations.mlflow.services import MLFlowDeploymentService
 
+from source.inference_engine import CompiledLinearPipeline
+from source.request_decoding import InputSchema
+
+# Define the columns the model expects
+EXPECTED_COLUMNS = [
+    "Order",
+    "PID",
+    "MS SubClass",
+    "Lot Frontage",
+    "Lot Area",
+    "Overall Qual",
+    "Overall Cond",
+    "Year Built",
+    "Year Remod/Add",
+    "Mas Vnr Area",
+    "BsmtFin SF 1",
+    "BsmtFin SF 2",
+    "Bsmt Unf SF",
+    "Total Bsmt SF",
+    "1st Flr SF",
+    "2nd Flr SF",
+    "Low Qual Fin SF",
+    "Gr Liv Area",
+    "Bsmt Full Bath",
+    "Bsmt Half Bath",
+    "Full Bath",
+    "Half Bath",
+    "Bedroom AbvGr",
+    "Kitchen AbvGr",
+    "TotRms AbvGrd",
+    "Fireplaces",
+    "Garage Yr Blt",
+    "Garage Cars",
+    "Garage Area",
+    "Wood Deck SF",
+    "Open Porch SF",
+    "Enclosed Porch",
+    "3Ssn Porch",
+    "Screen Porch",
+    "Pool Area",
+    "Misc Val",
+    "Mo Sold",
+    "Yr Sold",
+]
+
+INPUT_SCHEMA = InputSchema(EXPECTED_COLUMNS)
+
 
 @step(enable_cache=False)
 def predictor(
@@ -25,63 +73,33 @@ def predictor(
     if not service.is_running:
         raise RuntimeError("MLflow prediction service is not running. Please start it manually before running this step.")
 
-    # Load the input data from JSON string
-    data = json.loads(input_data)
-
-    # Extract the actual data and expected columns
-    data.pop("columns", None)  # Remove 'columns' if it's present
-    data.pop("index", None)  # Remove 'index' if it's present
-
-    # Define the columns the model expects
-    expected_columns = [
-        "Order",
-        "PID",
-        "MS SubClass",
-        "Lot Frontage",
-        "Lot Area",
-        "Overall Qual",
-        "Overall Cond",
-        "Year Built",
-        "Year Remod/Add",
-        "Mas Vnr Area",
-        "BsmtFin SF 1",
-        "BsmtFin SF 2",
-        "Bsmt Unf SF",
-        "Total Bsmt SF",
-        "1st Flr SF",
-        "2nd Flr SF",
-        "Low Qual Fin SF",
-        "Gr Liv Area",
-        "Bsmt Full Bath",
-        "Bsmt Half Bath",
-        "Full Bath",
-        "Half Bath",
-        "Bedroom AbvGr",
-        "Kitchen AbvGr",
-        "TotRms AbvGrd",
-        "Fireplaces",
-        "Garage Yr Blt",
-        "Garage Cars",
-        "Garage Area",
-        "Wood Deck SF",
-        "Open Porch SF",
-        "Enclosed Porch",
-        "3Ssn Porch",
-        "Screen Porch",
-        "Pool Area",
-        "Misc Val",
-        "Mo Sold",
-        "Yr Sold",
-    ]
-
-    # Convert the data into a DataFrame with the correct columns
-    df = pd.DataFrame(data["data"], columns=expected_columns)
-
-    # Convert DataFrame to JSON list for prediction
-    data_array = df.to_numpy()
-
+    # Decode straight into a float64 matrix in the order the model expects,
+    # accepts both "split" and "records" orientations
+    data_array = INPUT_SCHEMA.decode_json(input_data)
 
     # Run the prediction
     prediction = service.predict(data_array)
 
-    return prediction
\ No newline at end of file
+    return prediction
+
+
+@step(enable_cache=False)
+def native_predictor(
+    model: Pipeline,
+    input_data: str,
+) -> np.ndarray:
+    """Run an inference request in process, without the MLflow HTTP service.
+
+    Args:
+        model (Pipeline): The fitted sklearn pipeline from model_building_step.
+        input_data (str): The input data as a JSON string in "split" orientation.
+
+    Returns:
+        np.ndarray: The model's prediction.
+    """
+    engine = CompiledLinearPipeline.from_pipeline(model)
+
+    data = json.loads(input_data)
+    df = pd.DataFrame(data["data"], columns=data["columns"])
+
+    return engine.predict_frame(df)